@@ -1,12 +1,23 @@
 
-import ccxt
 import pandas as pd
 import numpy as np
 import ta
 from datetime import datetime
 import time
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpec
+from concurrent.futures import ProcessPoolExecutor
+
+from lazy_imports import lazy_module, use_agg
+from monte_carlo import run_monte_carlo, print_monte_carlo_report
+from result_cache import DAY_MS, ResultCache, function_version, pinned_range
+from timeframes import timeframe_to_seconds
+
+# Графики и биржа - только когда нужны (walk_forward, portfolio_backtest и
+# headless-прогоны импортируют этот модуль ради движка)
+ccxt = lazy_module('ccxt')
+plt = lazy_module('matplotlib.pyplot', setup=use_agg)
+mdates = lazy_module('matplotlib.dates')
+mcollections = lazy_module('matplotlib.collections')
+gridspec = lazy_module('matplotlib.gridspec')
 
 # === КОНФИГУРАЦИЯ ===
 INITIAL_BALANCE = 100.0
@@ -14,17 +25,43 @@ RISK_PER_TRADE = 0.03
 MAX_LEVERAGE = 7
 COMMISSION = 0.0006
 MIN_RISK_REWARD = 2.0
+MONTE_CARLO_SIMULATIONS = 10000  # 0 - отключить Monte Carlo после бэктеста
+RESULT_CACHE_DIR = 'backtest_cache'  # None - отключить кэш результатов
+RESULT_CACHE_MAX_MB = 500  # Предел размера кэша (давно не использованное удаляется)
+RESULT_CACHE_MAX_AGE_DAYS = 30  # Записи, не использованные дольше, удаляются
+HEADLESS = False  # True - только расчёты, без графиков
+# Графики только для этих прогонов (стратегия, пара, таймфрейм); None - для всех
+RENDER_CHARTS = [
+    ('4h Aggressive Turtle', 'SOL/USDT', '4h'),
+    ('12h Momentum Breakout', 'SOL/USDT', '12h'),
+    ('1d Strong Trend Following', 'SOL/USDT', '1d'),
+]
+PLOT_MAX_POINTS = 2000  # Длинные ряды цен прореживаются (LTTB) до этого числа точек
 
-exchange = ccxt.okx({'enableRateLimit': True})
+exchange = None
 
-def fetch_historical_data(symbol, timeframe, days=180):
-    """Загрузка исторических данных"""
+def get_exchange():
+    """Биржа создаётся при первой загрузке данных"""
+    global exchange
+    if exchange is None:
+        exchange = ccxt.okx({'enableRateLimit': True})
+    return exchange
+
+def fetch_historical_data(symbol, timeframe, days=180, end_ms=None):
+    """
+    Загрузка исторических данных
+    
+    end_ms - конец диапазона (мс эпохи, не включая): свечи за days дней до
+    него; None - до текущего момента, вместе с незакрытой свечой
+    """
     print(f"📥 Загрузка {symbol} {timeframe} за {days} дней...")
     
-    since = exchange.milliseconds() - days * 24 * 60 * 60 * 1000
+    exchange = get_exchange()
+    until = end_ms if end_ms is not None else exchange.milliseconds()
+    since = until - days * DAY_MS
     all_ohlcv = []
     
-    while since < exchange.milliseconds():
+    while since < (end_ms if end_ms is not None else exchange.milliseconds()):
         try:
             ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=1000)
             if not ohlcv:
@@ -37,6 +74,8 @@ def fetch_historical_data(symbol, timeframe, days=180):
             time.sleep(5)
             continue
     
+    if end_ms is not None:
+        all_ohlcv = [candle for candle in all_ohlcv if candle[0] < end_ms]
     df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
     print(f"✅ Загружено {len(df)} свечей\n")
@@ -299,129 +338,229 @@ def strategy_range_trading(df):
     
     return df
 
+# === ДВИЖОК БЭКТЕСТА ===
+def _resolve_exit(close, start, is_long, entry, stop_loss, take_profit):
+    """
+    Ищет бар закрытия позиции, открытой на баре start.
+    
+    Trailing stop монотонен (только подтягивается), поэтому стоп на каждом баре
+    равен накопленному максимуму (минимуму для SHORT) всех его уровней -
+    это считается векторно блоками, без построчного прохода по DataFrame.
+    
+    Returns:
+        (индекс бара выхода, доходность в долях) или None если позиция не закрылась
+    """
+    n = len(close)
+    begin = start + 1
+    chunk = 64
+    
+    while begin < n:
+        end = min(begin + chunk, n)
+        prices = close[begin:end]
+        
+        if is_long:
+            profit = (prices - entry) / entry
+            trail = np.where(profit > 0.05, entry * 1.015, -np.inf)
+            trail = np.maximum(trail, np.where(profit > 0.10, entry + (prices - entry) * 0.7, -np.inf))
+            stops = np.maximum(np.maximum.accumulate(trail), stop_loss)
+            hit = (prices <= stops) | (prices >= take_profit)
+        else:
+            profit = (entry - prices) / entry
+            trail = np.where(profit > 0.05, entry * 0.985, np.inf)
+            trail = np.minimum(trail, np.where(profit > 0.10, entry - (entry - prices) * 0.7, np.inf))
+            stops = np.minimum(np.minimum.accumulate(trail), stop_loss)
+            hit = (prices >= stops) | (prices <= take_profit)
+        
+        if hit.any():
+            k = int(hit.argmax())
+            return begin + k, float(profit[k])
+        
+        # Переносим подтянутый стоп в следующий блок
+        stop_loss = float(stops[-1])
+        begin = end
+        chunk = min(chunk * 2, 4096)
+    
+    return None
+
+
+def simulate_trades(df, min_risk_reward=None, initial_balance=None, risk_per_trade=None,
+                    max_leverage=None, commission=None):
+    """
+    Симуляция сделок по колонкам signal / sl_distance / tp_distance
+    
+    Одна позиция за раз, вход и выход по цене закрытия, trailing stop
+    при +5% и +10%. Параметры движка по умолчанию берутся из конфигурации.
+    
+    Returns:
+        (список сделок, итоговый баланс)
+    """
+    if min_risk_reward is None:
+        min_risk_reward = MIN_RISK_REWARD
+    if initial_balance is None:
+        initial_balance = INITIAL_BALANCE
+    if risk_per_trade is None:
+        risk_per_trade = RISK_PER_TRADE
+    if max_leverage is None:
+        max_leverage = MAX_LEVERAGE
+    if commission is None:
+        commission = COMMISSION
+    
+    close = df['close'].to_numpy(dtype=float)
+    signals = df['signal'].to_numpy()
+    sl_distances = df['sl_distance'].to_numpy(dtype=float)
+    tp_distances = df['tp_distance'].to_numpy(dtype=float)
+    timestamps = df['timestamp']
+    
+    balance = initial_balance
+    trades = []
+    next_bar = 0  # Первый бар, на котором можно открыть новую позицию
+    
+    for i in np.flatnonzero(signals != 0):
+        if i < next_bar:
+            continue
+        
+        entry_price = close[i]
+        sl_distance = sl_distances[i]
+        tp_distance = tp_distances[i]
+        
+        if tp_distance / sl_distance < min_risk_reward:
+            continue
+        
+        risk_amount = balance * risk_per_trade
+        position_size_base = risk_amount / sl_distance
+        leverage_used = min(max_leverage, (position_size_base * entry_price) / balance)
+        position_size = (risk_amount * leverage_used) / sl_distance
+        
+        is_long = signals[i] > 0
+        if is_long:
+            stop_loss = entry_price - sl_distance
+            take_profit = entry_price + tp_distance
+        else:
+            stop_loss = entry_price + sl_distance
+            take_profit = entry_price - tp_distance
+        
+        exit_info = _resolve_exit(close, i, is_long, entry_price, stop_loss, take_profit)
+        if exit_info is None:
+            # Позиция осталась открытой до конца истории
+            break
+        
+        j, profit_pct = exit_info
+        exit_price = close[j]
+        
+        if is_long:
+            pnl = (exit_price - entry_price) * position_size
+        else:
+            pnl = (entry_price - exit_price) * position_size
+        pnl -= position_size * entry_price * commission
+        pnl -= position_size * exit_price * commission
+        balance += pnl
+        
+        trades.append({
+            'entry_time': timestamps.iloc[i],
+            'exit_time': timestamps.iloc[j],
+            'type': 'LONG' if is_long else 'SHORT',
+            'entry': entry_price,
+            'exit': exit_price,
+            'size': position_size,
+            'leverage': leverage_used,
+            'pnl': pnl,
+            'balance': balance,
+            'return_pct': profit_pct * 100
+        })
+        
+        # На баре выхода можно сразу открыть новую позицию
+        next_bar = j
+    
+    return trades, balance
+
+
+def calculate_stats(trades_df, final_balance, initial_balance=None):
+    """
+    Статистика по сделкам
+    
+    Добавляет в trades_df колонки просадки и серий (нужны для графиков).
+    """
+    if initial_balance is None:
+        initial_balance = INITIAL_BALANCE
+    
+    total = len(trades_df)
+    wins = len(trades_df[trades_df['pnl'] > 0])
+    losses = total - wins
+    wr = (wins / total * 100) if total > 0 else 0
+    
+    total_pnl = trades_df['pnl'].sum()
+    avg_win = trades_df[trades_df['pnl'] > 0]['pnl'].mean() if wins > 0 else 0
+    avg_loss = trades_df[trades_df['pnl'] < 0]['pnl'].mean() if losses > 0 else 0
+    
+    win_sum = trades_df[trades_df['pnl'] > 0]['pnl'].sum()
+    loss_sum = abs(trades_df[trades_df['pnl'] < 0]['pnl'].sum())
+    pf = win_sum / loss_sum if loss_sum > 0 else float('inf')
+    
+    roi = ((final_balance - initial_balance) / initial_balance) * 100
+    
+    # Просадка
+    trades_df['cum_balance'] = trades_df['balance']
+    trades_df['peak'] = trades_df['cum_balance'].cummax()
+    trades_df['dd'] = (trades_df['cum_balance'] - trades_df['peak']) / trades_df['peak'] * 100
+    
+    # Серии
+    trades_df['win'] = trades_df['pnl'] > 0
+    trades_df['streak'] = (trades_df['win'] != trades_df['win'].shift()).cumsum()
+    win_streaks = trades_df[trades_df['win']].groupby('streak').size()
+    loss_streaks = trades_df[~trades_df['win']].groupby('streak').size()
+    
+    return {
+        'total': total,
+        'wins': wins,
+        'losses': losses,
+        'wr': wr,
+        'pnl': total_pnl,
+        'roi': roi,
+        'pf': pf,
+        'max_dd': trades_df['dd'].min(),
+        'avg_leverage': trades_df['leverage'].mean(),
+        'avg_win': avg_win,
+        'avg_loss': avg_loss,
+        'best': trades_df['pnl'].max(),
+        'worst': trades_df['pnl'].min(),
+        'avg_return': trades_df[trades_df['return_pct'] > 0]['return_pct'].mean() if wins > 0 else 0,
+        'max_win_streak': win_streaks.max() if len(win_streaks) > 0 else 0,
+        'max_loss_streak': loss_streaks.max() if len(loss_streaks) > 0 else 0,
+        'final': final_balance
+    }
+
+
+def engine_settings():
+    """Текущие настройки движка (часть ключа кэша результатов)"""
+    return {
+        'initial_balance': INITIAL_BALANCE,
+        'risk_per_trade': RISK_PER_TRADE,
+        'max_leverage': MAX_LEVERAGE,
+        'commission': COMMISSION,
+        'min_risk_reward': MIN_RISK_REWARD,
+        'monte_carlo_simulations': MONTE_CARLO_SIMULATIONS
+    }
+
+
+EMPTY_STATS = {'total': 0, 'wins': 0, 'wr': 0, 'pnl': 0, 'roi': 0, 'pf': 0,
+               'max_dd': 0, 'avg_leverage': 0}
+
+
 # === БЭКТЕСТ С ГРАФИКАМИ ===
-def backtest_with_charts(df, strategy_name, symbol, timeframe):
-    """Бэктест с визуализацией сделок"""
+def backtest_with_charts(df, strategy_name, symbol, timeframe, headless=False, render_queue=None):
+    """
+    Бэктест с визуализацией сделок
+    
+    headless=True - без графика; render_queue - график не рисуется сразу,
+    а ставится в очередь (RenderQueue.render_all после всех расчётов).
+    """
     print(f"\n{'='*100}")
     print(f"🎯 {strategy_name}")
     print(f"📊 {symbol} | {timeframe}")
     print(f"📅 {df['timestamp'].min().strftime('%Y-%m-%d')} → {df['timestamp'].max().strftime('%Y-%m-%d')}")
     print(f"{'='*100}\n")
     
-    balance = INITIAL_BALANCE
-    trades = []
-    position = None
-    
-    for i in range(len(df)):
-        row = df.iloc[i]
-        signal = row['signal']
-        
-        # Закрытие позиции
-        if position is not None:
-            current_price = row['close']
-            
-            if position['type'] == 'LONG':
-                profit_pct = (current_price - position['entry']) / position['entry']
-                
-                # Trailing stop
-                if profit_pct > 0.05:
-                    position['stop_loss'] = max(position['stop_loss'], position['entry'] * 1.015)
-                if profit_pct > 0.10:
-                    position['stop_loss'] = max(position['stop_loss'], 
-                                               position['entry'] + (current_price - position['entry']) * 0.7)
-                
-                if current_price <= position['stop_loss'] or current_price >= position['take_profit']:
-                    pnl = (current_price - position['entry']) * position['size']
-                    pnl -= position['size'] * position['entry'] * COMMISSION
-                    pnl -= position['size'] * current_price * COMMISSION
-                    balance += pnl
-                    
-                    trades.append({
-                        'entry_time': position['entry_time'],
-                        'exit_time': row['timestamp'],
-                        'type': position['type'],
-                        'entry': position['entry'],
-                        'exit': current_price,
-                        'size': position['size'],
-                        'leverage': position['leverage'],
-                        'pnl': pnl,
-                        'balance': balance,
-                        'return_pct': profit_pct * 100
-                    })
-                    
-                    position = None
-            
-            elif position['type'] == 'SHORT':
-                profit_pct = (position['entry'] - current_price) / position['entry']
-                
-                if profit_pct > 0.05:
-                    position['stop_loss'] = min(position['stop_loss'], position['entry'] * 0.985)
-                if profit_pct > 0.10:
-                    position['stop_loss'] = min(position['stop_loss'],
-                                               position['entry'] - (position['entry'] - current_price) * 0.7)
-                
-                if current_price >= position['stop_loss'] or current_price <= position['take_profit']:
-                    pnl = (position['entry'] - current_price) * position['size']
-                    pnl -= position['size'] * position['entry'] * COMMISSION
-                    pnl -= position['size'] * current_price * COMMISSION
-                    balance += pnl
-                    
-                    trades.append({
-                        'entry_time': position['entry_time'],
-                        'exit_time': row['timestamp'],
-                        'type': position['type'],
-                        'entry': position['entry'],
-                        'exit': current_price,
-                        'size': position['size'],
-                        'leverage': position['leverage'],
-                        'pnl': pnl,
-                        'balance': balance,
-                        'return_pct': profit_pct * 100
-                    })
-                    
-                    position = None
-        
-        # Открытие позиции
-        if position is None and signal != 0:
-            entry_price = row['close']
-            sl_distance = row['sl_distance']
-            tp_distance = row['tp_distance']
-            
-            if tp_distance / sl_distance < MIN_RISK_REWARD:
-                continue
-            
-            risk_amount = balance * RISK_PER_TRADE
-            position_size_base = risk_amount / sl_distance
-            leverage_used = min(MAX_LEVERAGE, (position_size_base * entry_price) / balance)
-            position_size = (risk_amount * leverage_used) / sl_distance
-            
-            if signal == 1:  # LONG
-                stop_loss = entry_price - sl_distance
-                take_profit = entry_price + tp_distance
-                
-                position = {
-                    'type': 'LONG',
-                    'entry': entry_price,
-                    'stop_loss': stop_loss,
-                    'take_profit': take_profit,
-                    'size': position_size,
-                    'leverage': leverage_used,
-                    'entry_time': row['timestamp']
-                }
-            
-            elif signal == -1:  # SHORT
-                stop_loss = entry_price + sl_distance
-                take_profit = entry_price - tp_distance
-                
-                position = {
-                    'type': 'SHORT',
-                    'entry': entry_price,
-                    'stop_loss': stop_loss,
-                    'take_profit': take_profit,
-                    'size': position_size,
-                    'leverage': leverage_used,
-                    'entry_time': row['timestamp']
-                }
+    trades, balance = simulate_trades(df)
     
     # === СТАТИСТИКА ===
     print(f"\n{'='*100}")
@@ -430,108 +569,123 @@ def backtest_with_charts(df, strategy_name, symbol, timeframe):
     
     if trades:
         trades_df = pd.DataFrame(trades)
+        s = calculate_stats(trades_df, balance)
         
-        total = len(trades)
-        wins = len(trades_df[trades_df['pnl'] > 0])
-        losses = total - wins
-        wr = (wins / total * 100) if total > 0 else 0
-        
-        total_pnl = trades_df['pnl'].sum()
-        avg_win = trades_df[trades_df['pnl'] > 0]['pnl'].mean() if wins > 0 else 0
-        avg_loss = trades_df[trades_df['pnl'] < 0]['pnl'].mean() if losses > 0 else 0
-        
-        best = trades_df['pnl'].max()
-        worst = trades_df['pnl'].min()
-        
-        win_sum = trades_df[trades_df['pnl'] > 0]['pnl'].sum()
-        loss_sum = abs(trades_df[trades_df['pnl'] < 0]['pnl'].sum())
-        pf = win_sum / loss_sum if loss_sum > 0 else float('inf')
-        
-        final = balance
-        roi = ((final - INITIAL_BALANCE) / INITIAL_BALANCE) * 100
-        
-        avg_leverage = trades_df['leverage'].mean()
-        avg_return = trades_df[trades_df['return_pct'] > 0]['return_pct'].mean() if wins > 0 else 0
-        
-        # Просадка
-        trades_df['cum_balance'] = trades_df['balance']
-        trades_df['peak'] = trades_df['cum_balance'].cummax()
-        trades_df['dd'] = (trades_df['cum_balance'] - trades_df['peak']) / trades_df['peak'] * 100
-        max_dd = trades_df['dd'].min()
-        
-        # Серии
-        trades_df['win'] = trades_df['pnl'] > 0
-        trades_df['streak'] = (trades_df['win'] != trades_df['win'].shift()).cumsum()
-        win_streaks = trades_df[trades_df['win']].groupby('streak').size()
-        loss_streaks = trades_df[~trades_df['win']].groupby('streak').size()
-        max_win_streak = win_streaks.max() if len(win_streaks) > 0 else 0
-        max_loss_streak = loss_streaks.max() if len(loss_streaks) > 0 else 0
-        
-        print(f"💰 Баланс: {INITIAL_BALANCE:.2f} → {final:.2f} USD")
-        print(f"📈 PnL: {total_pnl:+.2f} USD ({roi:+.1f}%)")
-        print(f"⚡ Среднее плечо: {avg_leverage:.1f}x")
-        print(f"\n📊 Сделок: {total} | ✅ {wins} ({wr:.1f}%) | ❌ {losses}")
-        print(f"💵 Ср. прибыль: +{avg_win:.2f} USD | Ср. убыток: {avg_loss:.2f} USD")
-        print(f"🎯 Лучшая: +{best:.2f} USD | Худшая: {worst:.2f} USD")
-        print(f"📊 Profit Factor: {pf:.2f}")
-        print(f"📈 Средний возврат: {avg_return:.1f}%")
-        print(f"📉 Макс. просадка: {max_dd:.2f}%")
-        print(f"🔥 Макс. серия побед: {max_win_streak} | Макс. серия поражений: {max_loss_streak}")
-        
-        if total < 30:
-            print(f"\n⚠️  ВНИМАНИЕ: Малая выборка ({total} сделок) - результаты могут быть нерепрезентативными!")
-        
-        # === ГРАФИК ===
-        plot_results(df, trades_df, strategy_name, symbol, timeframe)
+        print(f"💰 Баланс: {INITIAL_BALANCE:.2f} → {s['final']:.2f} USD")
+        print(f"📈 PnL: {s['pnl']:+.2f} USD ({s['roi']:+.1f}%)")
+        print(f"⚡ Среднее плечо: {s['avg_leverage']:.1f}x")
+        print(f"\n📊 Сделок: {s['total']} | ✅ {s['wins']} ({s['wr']:.1f}%) | ❌ {s['losses']}")
+        print(f"💵 Ср. прибыль: +{s['avg_win']:.2f} USD | Ср. убыток: {s['avg_loss']:.2f} USD")
+        print(f"🎯 Лучшая: +{s['best']:.2f} USD | Худшая: {s['worst']:.2f} USD")
+        print(f"📊 Profit Factor: {s['pf']:.2f}")
+        print(f"📈 Средний возврат: {s['avg_return']:.1f}%")
+        print(f"📉 Макс. просадка: {s['max_dd']:.2f}%")
+        print(f"🔥 Макс. серия побед: {s['max_win_streak']} | Макс. серия поражений: {s['max_loss_streak']}")
+        
+        if s['total'] < 30:
+            print(f"\n⚠️  ВНИМАНИЕ: Малая выборка ({s['total']} сделок) - результаты могут быть нерепрезентативными!")
         
-        return trades_df, {
-            'total': total,
-            'wins': wins,
-            'wr': wr,
-            'pnl': total_pnl,
-            'roi': roi,
-            'pf': pf,
-            'max_dd': max_dd,
-            'avg_leverage': avg_leverage
-        }
+        report_trades(df, trades_df, strategy_name, symbol, timeframe, headless, render_queue)
+        
+        return trades_df, {key: s[key] for key in EMPTY_STATS}
     else:
         print("⚠️ Нет сделок")
-        return None, {'total': 0, 'wins': 0, 'wr': 0, 'pnl': 0, 'roi': 0, 'pf': 0, 
-                      'max_dd': 0, 'avg_leverage': 0}
+        return None, dict(EMPTY_STATS)
+
+
+def report_trades(df, trades_df, strategy_name, symbol, timeframe, headless=False, render_queue=None):
+    """Monte Carlo и график по сделкам - и для свежего бэктеста, и для взятого из кэша"""
+    # === MONTE CARLO ===
+    if MONTE_CARLO_SIMULATIONS:
+        mc = run_monte_carlo(trades_df, MONTE_CARLO_SIMULATIONS, initial_balance=INITIAL_BALANCE)
+        if mc:
+            print_monte_carlo_report(mc)
+    
+    # === ГРАФИК ===
+    if render_queue is not None:
+        render_queue.add(df, trades_df, strategy_name, symbol, timeframe)
+    elif not headless:
+        plot_results(df, trades_df, strategy_name, symbol, timeframe)
 
 # === ВИЗУАЛИЗАЦИЯ ===
+def lttb_downsample(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: прореживание ряда с сохранением формы
+    
+    Returns:
+        Индексы выбранных точек (первая и последняя всегда включены)
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        
+        # Средняя точка следующей корзины (для последней - последняя точка ряда)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        xs = x[start:end]
+        ys = y[start:end]
+        area = np.abs((x[a] - avg_x) * (ys - y[a]) - (x[a] - xs) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    
+    selected[-1] = n - 1
+    return selected
+
+
 def plot_results(df, trades_df, strategy_name, symbol, timeframe):
     """Создание графика с сделками"""
     fig = plt.figure(figsize=(16, 10))
-    gs = GridSpec(4, 1, height_ratios=[3, 1, 1, 1], hspace=0.3)
+    gs = gridspec.GridSpec(4, 1, height_ratios=[3, 1, 1, 1], hspace=0.3)
     
     # График 1: Цена + Сделки
     ax1 = fig.add_subplot(gs[0])
-    ax1.plot(df['timestamp'], df['close'], label='Цена', linewidth=1, color='gray', alpha=0.7)
-    
-    # Отображение сделок
-    for _, trade in trades_df.iterrows():
-        color = 'green' if trade['pnl'] > 0 else 'red'
-        marker = '^' if trade['type'] == 'LONG' else 'v'
-        
-        # Вход
-        ax1.scatter(trade['entry_time'], trade['entry'], color='blue', s=100, 
-                   marker=marker, zorder=5, edgecolors='black', linewidths=1.5)
-        
-        # Выход
-        ax1.scatter(trade['exit_time'], trade['exit'], color=color, s=100, 
-                   marker='o', zorder=5, edgecolors='black', linewidths=1.5)
-        
-        # Линия сделки
-        ax1.plot([trade['entry_time'], trade['exit_time']], 
-                [trade['entry'], trade['exit']], 
-                color=color, alpha=0.5, linewidth=2)
+    price = df[['timestamp', 'close']]
+    if len(price) > PLOT_MAX_POINTS:
+        idx = lttb_downsample(price['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64),
+                              price['close'].to_numpy(), PLOT_MAX_POINTS)
+        price = price.iloc[idx]
+    ax1.plot(price['timestamp'], price['close'], label='Цена', linewidth=1, color='gray', alpha=0.7)
+    
+    # Отображение сделок (по одному вызову на группу, а не на каждую сделку)
+    profit = trades_df['pnl'].to_numpy() > 0
+    is_long = (trades_df['type'] == 'LONG').to_numpy()
+    
+    for mask, marker, label in [(is_long, '^', 'Вход LONG'), (~is_long, 'v', 'Вход SHORT')]:
+        ax1.scatter(trades_df['entry_time'][mask], trades_df['entry'][mask], color='blue', s=100,
+                    marker=marker, zorder=5, edgecolors='black', linewidths=1.5, label=label)
+    
+    for mask, color, label in [(profit, 'green', 'Выход (profit)'), (~profit, 'red', 'Выход (loss)')]:
+        ax1.scatter(trades_df['exit_time'][mask], trades_df['exit'][mask], color=color, s=100,
+                    marker='o', zorder=5, edgecolors='black', linewidths=1.5, label=label)
+    
+    # Линии сделок
+    segments = np.stack([
+        np.column_stack([mdates.date2num(trades_df['entry_time']), trades_df['entry']]),
+        np.column_stack([mdates.date2num(trades_df['exit_time']), trades_df['exit']])
+    ], axis=1)
+    ax1.add_collection(mcollections.LineCollection(segments, colors=np.where(profit, 'green', 'red'),
+                                      alpha=0.5, linewidths=2))
     
     ax1.set_title(f'{strategy_name} | {symbol} {timeframe}', fontsize=14, fontweight='bold')
     ax1.set_ylabel('Цена (USDT)', fontsize=11)
     ax1.grid(alpha=0.3)
-    ax1.legend(['Цена', 'Вход LONG', 'Вход SHORT', 'Выход (profit)', 'Выход (loss)'], 
-              loc='upper left', fontsize=9)
+    ax1.legend(loc='upper left', fontsize=9)
     
     # График 2: Баланс
     ax2 = fig.add_subplot(gs[1])
@@ -548,8 +702,7 @@ def plot_results(df, trades_df, strategy_name, symbol, timeframe):
     
     # График 3: PnL по сделкам
     ax3 = fig.add_subplot(gs[2])
-    colors = ['green' if x > 0 else 'red' for x in trades_df['pnl']]
-    ax3.bar(range(len(trades_df)), trades_df['pnl'], color=colors, alpha=0.7)
+    ax3.bar(range(len(trades_df)), trades_df['pnl'], color=np.where(profit, 'green', 'red'), alpha=0.7)
     ax3.axhline(0, color='black', linestyle='-', linewidth=0.5)
     ax3.set_ylabel('PnL (USD)', fontsize=11)
     ax3.set_xlabel('Номер сделки', fontsize=11)
@@ -567,7 +720,56 @@ def plot_results(df, trades_df, strategy_name, symbol, timeframe):
     filename = f"{strategy_name.replace(' ', '_')}_{symbol.replace('/', '_')}_{timeframe}.png"
     plt.savefig(filename, dpi=150, bbox_inches='tight')
     print(f"\n📊 График сохранён: {filename}")
-    plt.close()
+    plt.close(fig)
+    return filename
+
+
+def _render_job(job):
+    return plot_results(*job)
+
+
+class RenderQueue:
+    """
+    Отложенная отрисовка графиков бэктеста
+    
+    Бэктесты только регистрируют графики, а рисуются они пачкой в пуле
+    процессов после всех расчётов. В очередь попадают лишь колонки,
+    нужные для графика, и только выбранные прогоны: select - список
+    (стратегия, пара, таймфрейм) или функция(стратегия, пара, таймфрейм)
+    -> bool; None - все прогоны.
+    """
+    
+    def __init__(self, max_workers=None, select=None):
+        if select is not None and not callable(select):
+            runs = {tuple(run) for run in select}
+            select = lambda strategy_name, symbol, timeframe: (strategy_name, symbol, timeframe) in runs
+        self.max_workers = max_workers
+        self.select = select
+        self.jobs = []
+    
+    def wants(self, strategy_name, symbol, timeframe):
+        return self.select is None or self.select(strategy_name, symbol, timeframe)
+    
+    def add(self, df, trades_df, strategy_name, symbol, timeframe):
+        """Ставит график в очередь, если прогон выбран; возвращает, поставлен ли"""
+        if not self.wants(strategy_name, symbol, timeframe):
+            return False
+        self.jobs.append((df[['timestamp', 'close']].copy(), trades_df, strategy_name, symbol, timeframe))
+        return True
+    
+    def render_all(self):
+        """Рисует все графики из очереди, возвращает имена файлов"""
+        if not self.jobs:
+            return []
+        
+        jobs, self.jobs = self.jobs, []
+        print(f"\n🎨 Отрисовка графиков: {len(jobs)}...")
+        
+        if self.max_workers == 1 or len(jobs) == 1:
+            return [_render_job(job) for job in jobs]
+        
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(_render_job, jobs))
 
 # === ГЛАВНАЯ ФУНКЦИЯ ===
 
@@ -578,7 +780,7 @@ def plot_results(df, trades_df, strategy_name, symbol, timeframe):
 
 
 # === ГЛАВНАЯ ФУНКЦИЯ ===
-def main():
+def main(headless=HEADLESS, render_charts=RENDER_CHARTS):
     print("=" * 100)
     print("🚀 ТЕСТИРОВАНИЕ СТРАТЕГИЙ НА ИСТОРИЧЕСКИХ ДАННЫХ")
     print("💰 Депозит: $100 | Риск: 3% | Плечо: до 7x")
@@ -598,16 +800,41 @@ def main():
     
     all_results = []
     
+    # Пересчитываются только комбинации с изменёнными данными, кодом или настройками
+    result_cache = ResultCache(RESULT_CACHE_DIR, enabled=RESULT_CACHE_DIR is not None,
+                               max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+                               max_age_days=RESULT_CACHE_MAX_AGE_DAYS)
+    # Данные до последней закрытой свечи: повторный запуск видит те же свечи и попадает в кэш
+    now_ms = int(time.time() * 1000)
+    engine_version = function_version(simulate_trades, _resolve_exit, calculate_stats, backtest_with_charts)
+    
+    # Графики выбранных прогонов рисуются в пуле процессов после всех бэктестов
+    render_queue = None if headless else RenderQueue(select=render_charts)
+    
     for symbol, timeframe, strategy_func, strategy_name, days in test_configs:
         try:
-            # Загрузка данных
-            df = fetch_historical_data(symbol, timeframe, days)
+            # Загрузка данных (закреплённый диапазон, из кэша при повторе)
+            start_ms, end_ms = pinned_range(timeframe_to_seconds(timeframe), days, now_ms)
+            df = result_cache.ohlcv(symbol, timeframe, start_ms, end_ms,
+                                    lambda: fetch_historical_data(symbol, timeframe, days, end_ms=end_ms))
             
             # Применение стратегии
-            df = strategy_func(df)
+            df, signals_key = result_cache.strategy_signals(strategy_func, df)
             
             # Бэктест
-            trades_df, stats = backtest_with_charts(df, strategy_name, symbol, timeframe)
+            trades_df, stats, cached = result_cache.backtest(
+                signals_key, engine_settings(),
+                lambda: backtest_with_charts(df, strategy_name, symbol, timeframe,
+                                             headless=headless, render_queue=render_queue),
+                engine_version
+            )
+            if cached:
+                print(f"📦 {strategy_name} | {symbol} {timeframe}: результат из кэша "
+                      f"(ROI {stats['roi']:+.1f}%, сделок {stats['total']})")
+                # Monte Carlo и график из кэша не берутся - строятся по сохранённым сделкам
+                if trades_df is not None:
+                    report_trades(df, trades_df, strategy_name, symbol, timeframe,
+                                  headless=headless, render_queue=render_queue)
             
             all_results.append({
                 'symbol': symbol,
@@ -622,6 +849,13 @@ def main():
             print(f"❌ Ошибка {symbol} {timeframe}: {e}\n")
             continue
     
+    if render_queue is not None:
+        render_queue.render_all()
+    
+    if result_cache.enabled:
+        print(f"\n📦 Кэш результатов: {result_cache.hits} попаданий, {result_cache.misses} пересчётов")
+        result_cache.evict()
+    
     # === ИТОГОВАЯ СВОДКА ===
     print("\n" + "=" * 100)
     print("📊 ИТОГОВАЯ СВОДКА ПО ВСЕМ ТЕСТАМ")
@@ -690,13 +924,16 @@ def optimize_strategy(df, strategy_func, param_grid):
     best_roi = -float('inf')
     best_trades = None
     
+    # Сигналы от R:R не зависят - считаем один раз
+    optimized_df = strategy_func(df)
+    
     # Пример простого перебора параметров
     for risk_reward in [1.5, 2.0, 2.5, 3.0]:
         global MIN_RISK_REWARD
         MIN_RISK_REWARD = risk_reward
         
-        optimized_df = strategy_func(df)
-        trades_df, stats = backtest_with_charts(optimized_df, f"Optimized RR={risk_reward}", "OPT", "4h")
+        trades_df, stats = backtest_with_charts(optimized_df, f"Optimized RR={risk_reward}", "OPT", "4h",
+                                                headless=True)
         
         if stats['roi'] > best_roi and stats['total'] > 10:
             best_roi = stats['roi']
@@ -717,7 +954,7 @@ def analyze_market_regimes(df):
     vol_avg = df['volatility'].mean()
     
     # Тренд
-    df['trend'] = df['close'].rolling(50).apply(lambda x: (x[-1] - x[0]) / x[0] * 100)
+    df['trend'] = df['close'].rolling(50).apply(lambda x: (x[-1] - x[0]) / x[0] * 100, raw=True)
     current_trend = df['trend'].iloc[-1]
     
     print(f"📈 Текущая волатильность: {current_vol:.1f}% (средняя: {vol_avg:.1f}%)")
@@ -736,7 +973,7 @@ if __name__ == "__main__":
     try:
         # Проверка подключения к бирже
         print("🔌 Проверка подключения к OKX...")
-        exchange.load_markets()
+        get_exchange().load_markets()
         print("✅ Подключение успешно!")
         
         # Запуск основного тестирования
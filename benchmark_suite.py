@@ -0,0 +1,468 @@
+"""
+Benchmark Suite - Замеры производительности горячих путей
+
+Что измеряется:
+- функции стратегий бота на живом окне (100 свечей) и стратегии backtest_bot
+- MarketRegimeMonitor.analyze_market_regime
+- GridBotStrategy.detect_range / create_grid
+- plot_signal и полный проход check_signal (Telegram и хранилище подменены)
+- движок бэктеста (simulate_trades + calculate_stats) на 1k/10k/100k/1M свечей
+- время импорта модулей-точек входа в свежем процессе (python -X importtime)
+
+Данные - синтетические (synthetic_data) или архивные (CSV/pickle), сеть не нужна.
+Результаты сохраняются в JSON вместе с описанием машины; при наличии
+baseline медианы сравниваются и замедления сверх порога помечаются.
+
+Запуск:
+    python benchmark_suite.py                      # все замеры
+    python benchmark_suite.py --quick              # без 1M свечей
+    python benchmark_suite.py --save-baseline      # сохранить как baseline
+    python benchmark_suite.py --filter engine      # только движок
+    python benchmark_suite.py --importtime sol_signal_bot  # что стоит импорт
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = 'benchmark_results'
+BASELINE_FILE = os.path.join(RESULTS_DIR, 'baseline.json')
+REGRESSION_THRESHOLD = 0.15  # +15% к медиане baseline - регрессия
+
+ENGINE_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+LIVE_WINDOW = 100
+# Точки входа, время запуска которых отслеживается (перезапуски контейнера, CLI бэктеста)
+IMPORT_TARGETS = ['sol_signal_bot', 'backtest_bot', 'bot_replay']
+BENCH_SYMBOL = 'SOL/USDT'  # check_signal ведёт статистику только по парам из symbols бота
+
+
+# === ЗАМЕР ===
+def measure(func: Callable, repeat: int = 5, min_time: float = 0.2, warmup: int = 1) -> Dict:
+    """
+    Время одного вызова func
+
+    Вызов повторяется, пока серия не займёт min_time (но не меньше 1 раза),
+    серий - repeat. В результат идёт время одного вызова в мс.
+    """
+    for _ in range(warmup):
+        func()
+
+    # Подбираем число вызовов в серии по первому вызову
+    started = time.perf_counter()
+    func()
+    single = time.perf_counter() - started
+    number = max(1, int(min_time / single)) if single > 0 else 1000
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1000)
+
+    return {
+        'median_ms': statistics.median(samples),
+        'min_ms': min(samples),
+        'mean_ms': statistics.mean(samples),
+        'stdev_ms': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def machine_metadata() -> Dict:
+    """Описание машины и версий - без него результаты разных запусков не сравнить"""
+    import matplotlib
+    import ta
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'ta': getattr(ta, '__version__', 'unknown'),
+        'matplotlib': matplotlib.__version__,
+        'git_commit': commit,
+    }
+
+
+# === ВРЕМЯ ИМПОРТА ===
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Строки вывода -X importtime в записи
+    {'module', 'self_ms', 'cumulative_ms', 'depth'} (depth 0 - импорт верхнего уровня)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append({
+                'module': name.strip(),
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def import_profile(module: str) -> List[Dict]:
+    """
+    Импорт module в свежем интерпретаторе с -X importtime
+
+    Запуск идёт во временном каталоге: модуль бота при импорте пишет
+    bot.log и bot_data/ в текущий каталог.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))}
+    with tempfile.TemporaryDirectory() as cwd:
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                   capture_output=True, text=True, cwd=cwd, env=env, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {completed.stderr.strip().splitlines()[-1:]}")
+    return parse_importtime(completed.stderr)
+
+
+def measure_import(module: str, repeat: int = 3) -> Dict:
+    """Время импорта module (накопительное) - медиана по repeat свежим процессам"""
+    samples = []
+    for _ in range(repeat):
+        rows = import_profile(module)
+        samples.append(next(r['cumulative_ms'] for r in rows if r['module'] == module and r['depth'] == 0))
+    return {
+        'median_ms': statistics.median(samples),
+        'min_ms': min(samples),
+        'mean_ms': statistics.mean(samples),
+        'stdev_ms': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat,
+        'number': 1,
+    }
+
+
+def print_import_report(module: str, top: int = 20):
+    """Самые дорогие модули при импорте module: по собственному времени и по пакетам"""
+    rows = import_profile(module)
+    total = next(r['cumulative_ms'] for r in rows if r['module'] == module and r['depth'] == 0)
+    print(f"📦 import {module}: {total:.0f} мс, модулей: {len(rows)}")
+
+    # Пакет верхнего уровня -> суммарное собственное время его модулей
+    packages = defaultdict(float)
+    for row in rows:
+        packages[row['module'].split('.')[0]] += row['self_ms']
+    print(f"\n{'Пакет':<32} | {'мс':>8} | {'%':>5}")
+    print("-" * 52)
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<32} | {ms:>8.1f} | {ms / total * 100:>5.1f}")
+
+    print(f"\n{'Модуль (собственное время)':<48} | {'мс':>8}")
+    print("-" * 60)
+    for row in sorted(rows, key=lambda r: -r['self_ms'])[:top]:
+        print(f"{row['module']:<48} | {row['self_ms']:>8.1f}")
+
+
+# === ДАННЫЕ ===
+def load_archive(path: str) -> pd.DataFrame:
+    """OHLCV из CSV или pickle (timestamp в мс или строкой)"""
+    df = pd.read_pickle(path) if path.endswith('.pkl') else pd.read_csv(path)
+    if not np.issubdtype(df['timestamp'].dtype, np.datetime64):
+        unit = 'ms' if np.issubdtype(df['timestamp'].dtype, np.number) else None
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit=unit)
+    return df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].reset_index(drop=True)
+
+
+def engine_frame(df: pd.DataFrame, density: float = 0.02, seed: int = 0) -> pd.DataFrame:
+    """
+    Кадр для движка бэктеста с сигналами заданной плотности
+
+    Стратегии backtest_bot на миллионе свечей считались бы часами, а
+    движку важны только колонки сигналов - берём случайные сигналы со
+    стопами от ATR, как у turtle (1.8 / 5.5 ATR).
+    """
+    rng = np.random.default_rng(seed)
+    frame = df[['timestamp', 'close']].copy()
+    atr = (df['high'] - df['low']).rolling(14, min_periods=1).mean().to_numpy()
+
+    signal = np.zeros(len(df), dtype=np.int64)
+    hits = rng.random(len(df)) < density
+    signal[hits] = rng.choice([-1, 1], size=hits.sum())
+
+    frame['signal'] = signal
+    frame['sl_distance'] = atr * 1.8
+    frame['tp_distance'] = atr * 5.5
+    return frame
+
+
+def _find_window(df: pd.DataFrame, window: int, predicate: Callable[[pd.DataFrame], bool],
+                 step: int = 5) -> Optional[pd.DataFrame]:
+    """Первое окно, на котором выполняется условие (например, есть сигнал)"""
+    for end in range(window, len(df) + 1, step):
+        view = df.iloc[end - window:end].reset_index(drop=True)
+        if predicate(view.copy()):
+            return view
+    return None
+
+
+# === НАБОР ЗАМЕРОВ ===
+def build_benchmarks(df: pd.DataFrame, engine_sizes: List[int]) -> Dict[str, Dict]:
+    """
+    Список замеров: имя -> {'func': вызов, 'bars': размер входа}
+
+    Каждый вызов получает свежую копию данных: стратегии дописывают
+    индикаторы в переданный DataFrame.
+    """
+    import backtest_bot
+    import sol_signal_bot as bot
+    from grid_bot_strategy import GridBotStrategy
+    from market_regime_monitor import MarketRegimeMonitor
+    from synthetic_data import generate_ohlcv
+
+    benchmarks = {}
+    live = df.iloc[-LIVE_WINDOW:].reset_index(drop=True)
+
+    def add(name, func, bars, repeat=5):
+        benchmarks[name] = {'func': func, 'bars': bars, 'repeat': repeat}
+
+    # Стратегии бота - так они вызываются в check_signal
+    live_strategies = {
+        '4h_turtle': bot.strategy_4h_turtle,
+        '4h_hybrid': bot.strategy_4h_hybrid,
+        '12h_momentum': bot.strategy_12h_momentum,
+        '1d_trend': bot.strategy_1d_trend,
+        'range_trading': bot.strategy_range_trading,
+    }
+    for name, func in live_strategies.items():
+        add(f'live.{name}', lambda func=func: func(live.copy()), LIVE_WINDOW)
+
+    # Стратегии бэктеста - проход по истории
+    history = df.iloc[-1000:].reset_index(drop=True)
+    backtest_strategies = {
+        '4h_turtle': backtest_bot.strategy_4h_turtle,
+        '12h_momentum': backtest_bot.strategy_12h_momentum,
+        '1d_trend': backtest_bot.strategy_1d_trend,
+        'range_trading': backtest_bot.strategy_range_trading,
+    }
+    for name, func in backtest_strategies.items():
+        add(f'backtest.{name}', lambda func=func: func(history), len(history), repeat=3)
+
+    monitor = MarketRegimeMonitor()
+    add('regime.analyze_market_regime', lambda: monitor.analyze_market_regime(live), LIVE_WINDOW)
+
+    # Для сетки нужен боковик - ищем окно, где detect_range его находит
+    grid = GridBotStrategy()
+    ranging = _find_window(df, LIVE_WINDOW, lambda w: grid.detect_range(w) is not None)
+    if ranging is None:
+        ranging = _find_window(generate_ohlcv(5000, '4h', seed=11, annual_drift=0.0), LIVE_WINDOW,
+                               lambda w: grid.detect_range(w) is not None)
+    if ranging is not None:
+        range_info = grid.detect_range(ranging.copy())
+        add('grid.detect_range', lambda: grid.detect_range(ranging.copy()), LIVE_WINDOW)
+        add('grid.create_grid', lambda: grid.create_grid(range_info, 1000), 0)
+
+    # График и check_signal - на окне, где стратегия 4h даёт сигнал, проходящий фильтр R:R
+    strategy_4h = bot.get_strategy('4h')[1]
+
+    def passes_filters(window):
+        signal, params = strategy_4h(window)
+        return signal is not None and params['tp_distance'] / params['sl_distance'] >= bot.MIN_RISK_REWARD
+
+    with_signal = _find_window(df, LIVE_WINDOW, passes_filters)
+    if with_signal is not None:
+        signal, params = strategy_4h(with_signal.copy())
+        add('bot.plot_signal', lambda: bot.plot_signal(with_signal.copy(), signal, BENCH_SYMBOL, '4h', params),
+            LIVE_WINDOW, repeat=3)
+        add('bot.check_signal', lambda: _check_signal_pass(bot, with_signal), LIVE_WINDOW, repeat=3)
+    add('bot.check_signal_no_signal', lambda: _check_signal_pass(bot, live), LIVE_WINDOW)
+
+    # Движок бэктеста на разных объёмах
+    for size in engine_sizes:
+        if size <= len(df):
+            source = df.iloc[:size]
+        else:
+            source = generate_ohlcv(size, '1m', seed=size)
+        frame = engine_frame(source)
+        add(f'engine.{size}', lambda frame=frame: _engine_pass(backtest_bot, frame), size, repeat=3)
+
+    return benchmarks
+
+
+def _check_signal_pass(bot, window: pd.DataFrame):
+    """Один проход check_signal без кулдауна (иначе сигнал будет только в первый раз)"""
+    bot.last_signal_time.clear()
+    bot.check_signal(window.copy(), BENCH_SYMBOL, '4h')
+
+
+def _engine_pass(backtest_bot, frame: pd.DataFrame):
+    trades, balance = backtest_bot.simulate_trades(frame)
+    if trades:
+        backtest_bot.calculate_stats(pd.DataFrame(trades), balance)
+
+
+def run_benchmarks(df: pd.DataFrame, engine_sizes: List[int] = ENGINE_SIZES,
+                   name_filter: Optional[str] = None) -> Dict:
+    """
+    Запуск всех замеров
+
+    Telegram, хранилище сигналов и логи бота на время замеров подменяются,
+    чтобы мерить вычисления, а не сеть и диск.
+
+    Returns:
+        {'meta': описание машины, 'results': {имя: статистика}}
+    """
+    import sol_signal_bot as bot
+
+    saved_persistence = bot.data_persistence
+    saved_level = logging.getLogger().level
+    results = {}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        try:
+            bot.set_telegram_sender(lambda msg, img=None, kind=None: None)
+            bot.data_persistence = bot.DataPersistence(data_dir=data_dir)
+            logging.getLogger().setLevel(logging.CRITICAL)
+
+            benchmarks = build_benchmarks(df, engine_sizes)
+            for name, spec in benchmarks.items():
+                if name_filter and name_filter not in name:
+                    continue
+                result = measure(spec['func'], repeat=spec['repeat'])
+                result['bars'] = spec['bars']
+                results[name] = result
+                print(f"⏱️  {name:<32} {result['median_ms']:>11.3f} мс")
+        finally:
+            bot.set_telegram_sender(None)
+            bot.data_persistence.close()
+            bot.data_persistence = saved_persistence
+            logging.getLogger().setLevel(saved_level)
+
+    for module in IMPORT_TARGETS:
+        name = f'import.{module}'
+        if name_filter and name_filter not in name:
+            continue
+        result = measure_import(module)
+        result['bars'] = 0
+        results[name] = result
+        print(f"⏱️  {name:<32} {result['median_ms']:>11.3f} мс")
+
+    return {'meta': machine_metadata(), 'results': results}
+
+
+# === BASELINE ===
+def compare_to_baseline(report: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """Сравнение медиан с baseline; regression=True если медленнее порога"""
+    rows = []
+    for name, result in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        ratio = result['median_ms'] / base['median_ms'] if base['median_ms'] > 0 else float('inf')
+        rows.append({
+            'name': name,
+            'baseline_ms': base['median_ms'],
+            'current_ms': result['median_ms'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+            'improvement': ratio < 1 - threshold,
+        })
+    return rows
+
+
+def print_comparison(rows: List[Dict], baseline_meta: Dict):
+    """Вывод сравнения с baseline"""
+    print(f"\n📐 Сравнение с baseline ({baseline_meta.get('timestamp')}, коммит {baseline_meta.get('git_commit')})")
+    print(f"{'Замер':<32} | {'Baseline, мс':>12} | {'Сейчас, мс':>11} | {'x':>6}")
+    print("-" * 72)
+    for row in rows:
+        mark = ' 🔴' if row['regression'] else ' 🟢' if row['improvement'] else ''
+        print(f"{row['name']:<32} | {row['baseline_ms']:>12.3f} | {row['current_ms']:>11.3f} | "
+              f"{row['ratio']:>6.2f}{mark}")
+
+    regressions = [r['name'] for r in rows if r['regression']]
+    if regressions:
+        print(f"\n🔴 Регрессии: {', '.join(regressions)}")
+    else:
+        print("\n✅ Регрессий нет")
+
+
+def save_report(report: Dict, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарки стратегий, индикаторов и движка бэктеста')
+    parser.add_argument('--archive', help='OHLCV из CSV/pickle вместо синтетических данных')
+    parser.add_argument('--bars', type=int, default=5000, help='Длина синтетической истории 4h')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quick', action='store_true', help='Без движка на 1M свечей')
+    parser.add_argument('--filter', help='Только замеры, в имени которых есть подстрока')
+    parser.add_argument('--output', help='Файл результатов (по умолчанию benchmark_results/<время>.json)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline для сравнения')
+    parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как baseline')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--importtime', metavar='MODULE', help='Только отчёт о времени импорта модуля')
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        print_import_report(args.importtime)
+        return 0
+
+    if args.archive:
+        df = load_archive(args.archive)
+    else:
+        from synthetic_data import generate_ohlcv
+        df = generate_ohlcv(args.bars, '4h', seed=args.seed)
+
+    engine_sizes = [s for s in ENGINE_SIZES if not (args.quick and s >= 1_000_000)]
+    report = run_benchmarks(df, engine_sizes, args.filter)
+    report['meta']['data'] = args.archive or f'synthetic 4h x {args.bars} (seed={args.seed})'
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    save_report(report, output)
+    print(f"\n💾 Результаты: {output}")
+
+    exit_code = 0
+    if args.save_baseline:
+        save_report(report, args.baseline)
+        print(f"📌 Baseline сохранён: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        rows = compare_to_baseline(report, baseline, args.threshold)
+        print_comparison(rows, baseline.get('meta', {}))
+        exit_code = 1 if any(r['regression'] for r in rows) else 0
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
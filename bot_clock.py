@@ -0,0 +1,147 @@
+"""
+Bot Clock - Часы бота с возможностью подмены
+
+По умолчанию время системное. Для прогона бота по истории ставится
+SimulatedClock: sleep() не ждёт, а сдвигает время вперёд, поэтому
+main_loop со всеми паузами, кулдаунами и расписанием проходит недели
+архивных свечей за то время, которое нужно процессору.
+
+Здесь же замер стадий бота (stage_timer) - реальное время выполнения
+(perf_counter), независимо от того, какие часы установлены.
+"""
+
+import threading
+import time as _time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Dict
+
+from profiling import tracer
+
+
+class SystemClock:
+    """Обычные часы: системное время и настоящий sleep"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def time(self) -> float:
+        return _time.time()
+
+    def sleep(self, seconds: float):
+        _time.sleep(seconds)
+
+
+class SimulatedClock:
+    """Часы для прогона по истории: sleep мгновенно сдвигает время"""
+
+    def __init__(self, start: datetime):
+        self._now = start
+        self.slept = 0.0
+
+    def now(self) -> datetime:
+        return self._now
+
+    def time(self) -> float:
+        # Время архива наивное в UTC (как у pandas), а не местное время хоста
+        if self._now.tzinfo is None:
+            return self._now.replace(tzinfo=timezone.utc).timestamp()
+        return self._now.timestamp()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self._now += timedelta(seconds=seconds)
+            self.slept += seconds
+
+    def advance_to(self, moment: datetime):
+        """Перевести часы вперёд (назад время не идёт)"""
+        if moment > self._now:
+            self.sleep((moment - self._now).total_seconds())
+
+
+_clock = SystemClock()
+
+
+def install(clock):
+    """Установить часы, возвращает предыдущие"""
+    global _clock
+    previous = _clock
+    _clock = clock
+    return previous
+
+
+def get_clock():
+    return _clock
+
+
+def now() -> datetime:
+    return _clock.now()
+
+
+def time() -> float:
+    return _clock.time()
+
+
+def sleep(seconds: float):
+    _clock.sleep(seconds)
+
+
+# === ЗАМЕР СТАДИЙ ===
+class StageTimer:
+    """
+    Накопительная статистика времени по стадиям
+
+    Вложенные стадии считаются включительно (время check_signal
+    содержит время strategy и chart). Стадии пишут потоки конвейера -
+    накопители меняются под блокировкой.
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed: float):
+        with self._lock:
+            entry = self.stats.get(name)
+            if entry is None:
+                entry = self.stats[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            entry['count'] += 1
+            entry['total'] += elapsed
+            if elapsed > entry['max']:
+                entry['max'] = elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        """Стадия; при включённом profiling.tracer - ещё и спан с вложенностью"""
+        started = _time.perf_counter()
+        try:
+            with tracer.span(name):
+                yield
+        finally:
+            self.record(name, _time.perf_counter() - started)
+
+    def timed(self, name: str):
+        """Декоратор: вся функция - одна стадия"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Статистика по стадиям, среднее в миллисекундах"""
+        with self._lock:
+            return {
+                name: {**entry, 'mean_ms': entry['total'] / entry['count'] * 1000}
+                for name, entry in self.stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+
+stage_timer = StageTimer()
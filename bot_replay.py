@@ -0,0 +1,245 @@
+"""
+Bot Replay - Прогон всего бота по архивным свечам на симулированных часах
+
+В отличие от replay_harness (только функции стратегий), здесь работает
+main_loop целиком: расписание таймфреймов, кулдауны check_signal,
+проверки режима рынка, health check, сводки и ежедневные отчёты.
+
+Что подменяется:
+- часы (bot_clock.SimulatedClock) - все паузы мгновенные
+- биржа (ReplayDataProvider) - отдаёт только свечи, закрытые к моменту часов
+- Telegram (MessageRecorder) - сообщения записываются, а не отправляются
+- хранилище сигналов - во временной папке
+
+Результат: все сообщения, которые бот отправил бы, и время по стадиям.
+"""
+
+import contextlib
+import io
+import logging
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import bot_clock
+import sol_signal_bot as bot
+from bot_clock import SimulatedClock, stage_timer
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class ReplayDataProvider:
+    """
+    Биржа из архива: fetch_ohlcv как у DataProvider
+
+    Живая биржа отдаёт и текущую незакрытую свечу, но её промежуточных
+    значений в архиве нет (финальные OHLC заглядывали бы в будущее),
+    поэтому возвращаются только закрытые свечи.
+    """
+
+    def __init__(self, candles: Dict[Tuple[str, str], pd.DataFrame], clock: SimulatedClock,
+                 latency: float = 0.0):
+        """
+        Args:
+            candles: {(symbol, timeframe): OHLCV DataFrame}
+            clock: Часы, по которым определяется "сейчас"
+            latency: Задержка ответа в секундах (сдвигает часы)
+        """
+        self.clock = clock
+        self.latency = latency
+        self.calls = 0
+        self._data = {}
+        for (symbol, timeframe), df in candles.items():
+            open_ms = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+            values = df[OHLCV_COLUMNS].to_numpy(dtype=float)
+            values[:, 0] = open_ms
+            close_ms = open_ms + timeframe_to_seconds(timeframe) * 1000
+            self._data[(symbol, timeframe)] = (close_ms, values)
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 100) -> List[list]:
+        self.calls += 1
+        if self.latency:
+            self.clock.sleep(self.latency)
+
+        stored = self._data.get((symbol, timeframe))
+        if stored is None:
+            return []
+
+        close_ms, values = stored
+        # Архивные timestamp в UTC без зоны, часы бота тоже наивные
+        now_ms = pd.Timestamp(self.clock.now()).value // 1_000_000
+        end = int(np.searchsorted(close_ms, now_ms, side='right'))
+        rows = values[max(0, end - limit):end].tolist()
+        for row in rows:
+            row[0] = int(row[0])
+        return rows
+
+
+class MessageRecorder:
+    """
+    Вместо Telegram: запоминает сообщения с временем часов бота
+
+    Вид сообщения (subscriptions.MESSAGE_KINDS) передаёт send_telegram
+    """
+
+    def __init__(self, clock: SimulatedClock):
+        self.clock = clock
+        self.messages = []
+
+    def __call__(self, msg: str, img=None, kind: Optional[str] = None):
+        self.messages.append({
+            'time': self.clock.now(),
+            'kind': kind,
+            'text': msg,
+            'image_bytes': len(img.getvalue()) if img is not None else 0,
+        })
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.messages, columns=['time', 'kind', 'text', 'image_bytes'])
+
+
+def replay_bot(
+    candles: Dict[Tuple[str, str], pd.DataFrame],
+    start: datetime,
+    end: datetime,
+    symbols: Optional[List[str]] = None,
+    latency: float = 0.0,
+    seed: int = 0,
+    verbose: bool = False,
+    provider=None
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Прогон main_loop от start до end по часам бота
+
+    Args:
+        candles: {(symbol, timeframe): OHLCV} - архив с запасом истории до start
+        start: Начальный момент часов
+        end: Момент остановки
+        symbols: Пары (по умолчанию - все пары из архива в порядке bot.symbols)
+        latency: Задержка каждого запроса к бирже в секундах
+        seed: Seed для случайных пауз main_loop
+        verbose: Не глушить print/логи бота
+        provider: Свой источник свечей вместо ReplayDataProvider по candles
+            (например, DataProvider(exchange=StubExchange(...)))
+
+    Returns:
+        (DataFrame сообщений, сводка: стадии, время, вызовы биржи)
+    """
+    if symbols is None:
+        archived = {symbol for symbol, _ in candles}
+        symbols = [s for s in bot.symbols if s in archived] or sorted(archived)
+
+    clock = SimulatedClock(start)
+    if provider is None:
+        provider = ReplayDataProvider(candles, clock, latency)
+    recorder = MessageRecorder(clock)
+
+    saved = {
+        'clock': bot_clock.install(clock),
+        'provider': bot.data_provider,
+        'symbols': bot.symbols,
+        'persistence': bot.data_persistence,
+        'random': random.getstate(),
+        'log_level': bot.logger.level,
+    }
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        try:
+            random.seed(seed)
+            bot.set_data_provider(provider)
+            bot.set_telegram_sender(recorder)
+            bot.symbols = list(symbols)
+            bot.data_persistence = bot.DataPersistence(data_dir=data_dir)
+            bot.reset_runtime_state()
+            stage_timer.reset()
+
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            if not verbose:
+                bot.logger.setLevel(logging.ERROR)
+
+            started = time.perf_counter()
+            with output:
+                bot.main_loop(run_until=end)
+            wall = time.perf_counter() - started
+            latency = bot.latency_tracker.summary()
+        finally:
+            bot.data_persistence.close()
+            bot_clock.install(saved['clock'])
+            bot.set_data_provider(saved['provider'])
+            bot.set_telegram_sender(None)
+            bot.symbols = saved['symbols']
+            bot.data_persistence = saved['persistence']
+            random.setstate(saved['random'])
+            bot.logger.setLevel(saved['log_level'])
+            bot.reset_runtime_state()
+
+    simulated = (clock.now() - start).total_seconds()
+    summary = {
+        'symbols': len(symbols),
+        'simulated_hours': simulated / 3600,
+        'wall_seconds': wall,
+        'speedup': simulated / wall if wall > 0 else float('inf'),
+        'exchange_calls': getattr(provider, 'calls', None),
+        'stages': stage_timer.summary(),
+        'latency': latency,
+    }
+    return recorder.to_frame(), summary
+
+
+def print_bot_replay_report(messages: pd.DataFrame, summary: Dict):
+    """Вывод результатов прогона бота"""
+    print(f"\n{'='*80}")
+    print(f"🤖 ПРОГОН БОТА: {summary['symbols']} пар | {summary['simulated_hours']:.1f}ч симуляции "
+          f"за {summary['wall_seconds']:.1f}с (x{summary['speedup']:.0f})")
+    print(f"{'='*80}")
+    calls = f"Запросов к бирже: {summary['exchange_calls']} | " if summary['exchange_calls'] is not None else ""
+    print(f"📡 {calls}Сообщений: {len(messages)}")
+
+    if len(messages):
+        for kind, count in messages['kind'].value_counts().items():
+            print(f"  {kind:<14} {count}")
+
+    print(f"\n{'Стадия':<14} | {'Вызовов':>8} | {'Всего, с':>9} | {'Среднее, мс':>11} | {'Макс, мс':>9}")
+    print("-" * 64)
+    stages = sorted(summary['stages'].items(), key=lambda item: -item[1]['total'])
+    for name, entry in stages:
+        print(f"{name:<14} | {entry['count']:>8} | {entry['total']:>9.2f} | "
+              f"{entry['mean_ms']:>11.2f} | {entry['max'] * 1000:>9.2f}")
+
+    if summary.get('latency'):
+        print("\n⏱ От закрытия свечи по часам бота (сек)")
+        print(f"{'ТФ':<4} | {'Стадия':<9} | {'N':>4} | {'p50':>8} | {'p95':>8} | {'Макс':>8} | {'SLO':>6} | {'Превыш.':>7}")
+        print("-" * 72)
+        for timeframe, by_stage in summary['latency'].items():
+            for stage, entry in by_stage.items():
+                slo = f"{entry['slo']:.0f}" if entry['slo'] is not None else '—'
+                print(f"{timeframe:<4} | {stage:<9} | {entry['count']:>4} | {entry['p50']:>8.0f} | "
+                      f"{entry['p95']:>8.0f} | {entry['max']:>8.0f} | {slo:>6} | {entry['breaches']:>7}")
+
+
+# Пример использования
+if __name__ == "__main__":
+    from datetime import timedelta
+
+    from backtest_bot import fetch_historical_data
+
+    replay_symbols = ['SOL/USDT', 'BTC/USDT', 'ETH/USDT']
+    candles = {
+        (symbol, timeframe): fetch_historical_data(symbol, timeframe, 120)
+        for symbol in replay_symbols for timeframe in bot.timeframes
+    }
+
+    # Последние 4 недели; до начала остаётся история для окон стратегий
+    end = min(df['timestamp'].iloc[-1] for df in candles.values()).to_pydatetime()
+    start = end - timedelta(weeks=4)
+
+    messages, summary = replay_bot(candles, start, end, replay_symbols)
+    print_bot_replay_report(messages, summary)
@@ -0,0 +1,333 @@
+"""
+Chart Renderer - Графики сигналов в пуле процессов с переиспользуемыми фигурами
+
+plot_signal на каждый сигнал создавал фигуру 12x8 через pyplot, собирал
+цвета объёмов циклом по df.iloc[i], строил ~500 отдельных прямоугольников
+и кодировал PNG (с лишним проходом отрисовки ради bbox_inches='tight')
+в основном цикле. Здесь:
+- фигура с линиями, маркером, уровнями и коллекцией объёмов создаётся
+  один раз на процесс и берётся из пула, на сигнал меняются только данные
+- объёмы - одна PolyCollection, вершины и цвета считаются векторно
+- отрисовка идёт в ProcessPoolExecutor, основной цикл получает Future
+- меньший PNG: dpi и палитра (квантование Pillow до palette_colors цветов)
+
+В процесс передаются только NumPy массивы и числа, а не DataFrame.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from lazy_imports import lazy_module
+
+# matplotlib нужен только при первом графике (и в рабочих процессах)
+mdates = lazy_module('matplotlib.dates')
+backend_agg = lazy_module('matplotlib.backends.backend_agg')
+mcollections = lazy_module('matplotlib.collections')
+mfigure = lazy_module('matplotlib.figure')
+
+logger = logging.getLogger(__name__)
+
+FIGSIZE = (12, 8)
+DEFAULT_DPI = 100
+
+# 'green' и 'red' с alpha=0.6
+UP_COLOR = (0.0, 0.5019607843137255, 0.0, 0.6)
+DOWN_COLOR = (1.0, 0.0, 0.0, 0.6)
+# Площадь маркера scatter(s=200) в пунктах^2 -> размер маркера линии
+MARKER_SIZE = 200 ** 0.5
+
+
+# === ДАННЫЕ ДЛЯ ОТРИСОВКИ ===
+def chart_payload(df, signal_type: str, symbol: str, timeframe: str, params: Dict) -> Dict:
+    """Свечи и уровни сигнала в виде, который дёшево передать в другой процесс"""
+    entry = float(params['entry'])
+    sl_distance = float(params['sl_distance'])
+    tp_distance = float(params['tp_distance'])
+    direction = 1 if signal_type == 'LONG' else -1
+    return {
+        'time': np.asarray(df['timestamp'].values, dtype='datetime64[ms]'),
+        'open': df['open'].to_numpy(dtype=np.float64),
+        'close': df['close'].to_numpy(dtype=np.float64),
+        'volume': df['volume'].to_numpy(dtype=np.float64),
+        'signal_type': signal_type,
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'entry': entry,
+        'sl': entry - direction * sl_distance,
+        'tp': entry + direction * tp_distance,
+    }
+
+
+# === ФИГУРА ===
+class SignalFigure:
+    """Фигура графика сигнала: артисты создаются один раз, render меняет данные"""
+
+    def __init__(self):
+        self.figure = mfigure.Figure(figsize=FIGSIZE)
+        self.canvas = backend_agg.FigureCanvasAgg(self.figure)
+        self.price_ax, self.volume_ax = self.figure.subplots(
+            2, 1, gridspec_kw={'height_ratios': [3, 1]})
+        ax1, ax2 = self.price_ax, self.volume_ax
+
+        self.close_line, = ax1.plot([], [], label='Close', linewidth=1.5)
+        self.marker, = ax1.plot([], [], linestyle='none', markersize=MARKER_SIZE, zorder=5,
+                                markeredgecolor='black', markeredgewidth=2)
+        self.sl_line = ax1.axhline(0, color='red', linestyle='--', alpha=0.7)
+        self.tp_line = ax1.axhline(0, color='green', linestyle='--', alpha=0.7)
+        self.entry_line = ax1.axhline(0, color='yellow', linestyle=':', alpha=0.8)
+        ax1.set_ylabel('Price (USDT)', fontsize=11)
+        ax1.grid(alpha=0.3)
+
+        self.volume = mcollections.PolyCollection(np.empty((0, 4, 2)), linewidths=0)
+        ax2.add_collection(self.volume)
+        ax2.set_ylabel('Volume', fontsize=11)
+        ax2.set_xlabel('Time', fontsize=11)
+        ax2.grid(alpha=0.3)
+
+        for ax in (ax1, ax2):
+            ax.xaxis_date()
+        # Раскладка постоянна - вместо tight_layout/bbox_inches на каждый график
+        self.figure.subplots_adjust(left=0.08, right=0.98, top=0.95, bottom=0.07, hspace=0.18)
+
+    def update(self, payload: Dict):
+        x = mdates.date2num(payload['time'])
+        close = payload['close']
+        volume = payload['volume']
+        signal_type = payload['signal_type']
+        entry, sl, tp = payload['entry'], payload['sl'], payload['tp']
+        step = float(np.median(np.diff(x))) if len(x) > 1 else 1.0
+
+        # Цена, сигнал и уровни
+        self.close_line.set_data(x, close)
+        self.marker.set_data(x[-1:], close[-1:])
+        self.marker.set_marker('^' if signal_type == 'LONG' else 'v')
+        self.marker.set_markerfacecolor('lime' if signal_type == 'LONG' else 'red')
+        self.marker.set_label(f'{signal_type} Signal')
+        for line, price, name in ((self.sl_line, sl, 'SL'), (self.tp_line, tp, 'TP'),
+                                  (self.entry_line, entry, 'Entry')):
+            line.set_ydata([price, price])
+            line.set_label(f'{name}: {price:.2f}')
+
+        low = min(float(close.min()), sl, tp, entry)
+        high = max(float(close.max()), sl, tp, entry)
+        margin = (high - low) * 0.05 or abs(high) * 0.01 or 1.0
+        self.price_ax.set_ylim(low - margin, high + margin)
+        self.price_ax.set_title(f"{payload['symbol']} | {payload['timeframe']} | {signal_type} Signal",
+                                fontsize=14, fontweight='bold')
+        # Легенда копирует стиль маркера при создании - пересоздаём
+        self.price_ax.legend(loc='upper left', fontsize=9)
+
+        # Объёмы: прямоугольники шириной 0.8 бара, цвет по close >= open
+        half = 0.4 * step
+        verts = np.zeros((len(x), 4, 2))
+        verts[:, 0:2, 0] = (x - half)[:, None]
+        verts[:, 2:4, 0] = (x + half)[:, None]
+        verts[:, 1:3, 1] = volume[:, None]
+        self.volume.set_verts(verts)
+        self.volume.set_facecolor(np.where((close >= payload['open'])[:, None], UP_COLOR, DOWN_COLOR))
+        self.volume_ax.set_ylim(0, float(volume.max()) * 1.05 if len(volume) and volume.max() > 0 else 1.0)
+
+        if len(x):
+            pad = max(step, (x[-1] - x[0]) * 0.02)
+            for ax in (self.price_ax, self.volume_ax):
+                ax.set_xlim(x[0] - pad, x[-1] + pad)
+
+    def encode(self, dpi: int = DEFAULT_DPI, palette_colors: int = 0) -> bytes:
+        """PNG; palette_colors > 0 - палитровый PNG (нужен Pillow)"""
+        buffer = BytesIO()
+        if palette_colors:
+            try:
+                from PIL import Image
+            except ImportError:
+                palette_colors = 0
+        if not palette_colors:
+            self.figure.savefig(buffer, format='png', dpi=dpi)
+            return buffer.getvalue()
+
+        self.figure.set_dpi(dpi)
+        self.canvas.draw()
+        width, height = self.canvas.get_width_height()
+        image = Image.frombuffer('RGBA', (width, height), self.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+        quantize = getattr(Image, 'Quantize', Image)
+        image.convert('RGB').quantize(colors=palette_colors, method=quantize.FASTOCTREE).save(
+            buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+
+
+class FigurePool:
+    """Свободные SignalFigure процесса; фигура занята на время одного render"""
+
+    def __init__(self):
+        self._free: List[SignalFigure] = []
+        self.created = 0
+
+    def render(self, payload: Dict, dpi: int = DEFAULT_DPI, palette_colors: int = 0) -> bytes:
+        try:
+            figure = self._free.pop()
+        except IndexError:
+            figure = SignalFigure()
+            self.created += 1
+        try:
+            figure.update(payload)
+            return figure.encode(dpi, palette_colors)
+        finally:
+            self._free.append(figure)
+
+
+# Пул фигур текущего процесса (в рабочих процессах - свой)
+_figures = FigurePool()
+
+
+def render_payload(payload: Dict, dpi: int = DEFAULT_DPI, palette_colors: int = 0) -> bytes:
+    """Отрисовать график в текущем процессе (точка входа рабочего процесса)"""
+    return _figures.render(payload, dpi, palette_colors)
+
+
+def _warm_up():
+    """Создать фигуру заранее, чтобы первый сигнал не ждал импорта шрифтов и осей"""
+    _figures._free.append(SignalFigure())
+    _figures.created += 1
+
+
+# === ПУЛ ПРОЦЕССОВ ===
+class ChartRenderer:
+    """Отрисовка графиков сигналов в пуле процессов"""
+
+    def __init__(self, workers: int = 2, dpi: int = DEFAULT_DPI, palette_colors: int = 0,
+                 start_method: Optional[str] = None):
+        """
+        Args:
+            workers: Рабочих процессов (0 - рисовать в вызывающем потоке)
+            dpi: Разрешение PNG (100 - как раньше, 70-80 - заметно меньше файл)
+            palette_colors: >0 - палитровый PNG из стольких цветов (меньше в 2-4 раза)
+            start_method: Способ запуска процессов (по умолчанию fork, где он есть).
+                spawn заново выполняет скрипт __main__ в каждом процессе, а у бота
+                код уровня модуля не защищён - поэтому fork, и процессы стоит
+                запустить через start() до фоновых потоков
+        """
+        if start_method is None:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.workers = workers
+        self.dpi = dpi
+        self.palette_colors = palette_colors
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_warm_up,
+                )
+            return self._executor
+
+    def start(self):
+        """
+        Запустить процессы сейчас, не дожидаясь их готовности (с fork они
+        создаются все сразу при первой задаче, matplotlib грузится уже в них)
+        """
+        if self.workers > 0:
+            self._get_executor().submit(abs, 0)
+
+    def render(self, df, signal_type: str, symbol: str, timeframe: str, params: Dict) -> bytes:
+        """Отрисовать синхронно в текущем процессе"""
+        return render_payload(chart_payload(df, signal_type, symbol, timeframe, params),
+                              self.dpi, self.palette_colors)
+
+    def submit(self, df, signal_type: str, symbol: str, timeframe: str, params: Dict) -> Future:
+        """Поставить график в пул; Future с PNG в байтах"""
+        payload = chart_payload(df, signal_type, symbol, timeframe, params)
+        if self.workers > 0:
+            try:
+                future = self._get_executor().submit(render_payload, payload, self.dpi, self.palette_colors)
+                self._pending.add(future)
+                future.add_done_callback(self._pending.discard)
+                return future
+            except (BrokenProcessPool, RuntimeError) as e:
+                # Процесс пула упал - пересоздаём пул к следующему сигналу, этот рисуем здесь
+                logger.error(f"Chart pool unavailable, rendering inline: {e}")
+                with self._lock:
+                    self._executor = None
+
+        future = Future()
+        try:
+            future.set_result(render_payload(payload, self.dpi, self.palette_colors))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def pending(self) -> int:
+        """Графиков в очереди и в работе"""
+        return len(self._pending)
+
+    def close(self, wait: bool = True):
+        """Дождаться графиков в работе (и их callback'ов) и остановить процессы"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# Пример использования
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+
+    rng = np.random.default_rng(7)
+    n = 500
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='4h'),
+        'open': np.r_[close[0], close[:-1]],
+        'close': close,
+        'volume': rng.lognormal(10, 0.5, n),
+    })
+    params = {'entry': close[-1], 'sl_distance': close[-1] * 0.02, 'tp_distance': close[-1] * 0.05}
+
+    import matplotlib.pyplot as plt
+
+    def legacy_plot():
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=FIGSIZE, gridspec_kw={'height_ratios': [3, 1]})
+        ax1.plot(df['timestamp'], df['close'])
+        colors = ['green' if df.iloc[i]['close'] >= df.iloc[i]['open'] else 'red' for i in range(len(df))]
+        ax2.bar(df['timestamp'], df['volume'], color=colors, alpha=0.6, width=0.8)
+        plt.tight_layout()
+        img = BytesIO()
+        plt.savefig(img, format='png', dpi=100, bbox_inches='tight')
+        plt.close(fig)
+        return img.getvalue()
+
+    def timed(label, func, repeat=5):
+        func()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            data = func()
+        print(f"⏱ {label}: {(time.perf_counter() - started) / repeat * 1000:.0f} мс, {len(data) / 1024:.0f} КБ")
+
+    timed("pyplot на каждый сигнал (как было, упрощённо)", legacy_plot)
+    for dpi, colors in ((100, 0), (80, 0), (100, 64), (80, 64)):
+        renderer = ChartRenderer(workers=0, dpi=dpi, palette_colors=colors)
+        timed(f"пул фигур dpi={dpi} палитра={colors or '-'}",
+              lambda: renderer.render(df, 'LONG', 'SOL/USDT', '4h', params))
+
+    renderer = ChartRenderer(workers=2)
+    renderer.start()
+    started = time.perf_counter()
+    futures = [renderer.submit(df, 'LONG' if i % 2 else 'SHORT', f'PAIR{i}/USDT', '4h', params)
+               for i in range(12)]
+    submitted = time.perf_counter() - started
+    sizes = [len(future.result()) for future in futures]
+    print(f"🚀 12 графиков: submit {submitted * 1000:.1f} мс, готовы за "
+          f"{time.perf_counter() - started:.2f}с, {sum(sizes) / 1024:.0f} КБ")
+    renderer.close()
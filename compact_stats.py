@@ -0,0 +1,239 @@
+"""
+Compact Stats - Статистика сигналов и ошибок фиксированного размера
+
+stats[symbol][timeframe]['Signals'] хранил словарь на каждый сигнал за
+всё время работы процесса, HealthMonitor.errors рос так же. Здесь:
+- SignalRing - кольцевой буфер на структурированном NumPy массиве
+  (~33 байта на сигнал вместо ~1 КБ словаря с datetime и float)
+- PairStats - счётчики LONG/SHORT/Total и последние сигналы пары
+- ErrorLog - deque последних ошибок (__slots__) и общий счётчик
+- memory_usage - RSS процесса и объём буферов для health check
+
+Память в установившемся режиме не зависит от времени работы.
+"""
+
+import logging
+import os
+import sys
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних сигналов хранить на пару/таймфрейм
+SIGNAL_HISTORY = 100
+# Сколько последних ошибок хранить в мониторинге
+ERROR_HISTORY = 100
+
+SIDES = {'LONG': 1, 'SHORT': -1}
+SIDE_NAMES = {code: name for name, code in SIDES.items()}
+
+SIGNAL_DTYPE = np.dtype([
+    ('time', 'datetime64[ms]'),
+    ('side', 'i1'),
+    ('entry', 'f8'),
+    ('sl', 'f8'),
+    ('tp', 'f8'),
+])
+
+
+# === СИГНАЛЫ ===
+class SignalRing:
+    """Кольцевой буфер последних сигналов: запись O(1), память постоянная"""
+
+    __slots__ = ('capacity', '_data', '_next', '_size')
+
+    def __init__(self, capacity: int = SIGNAL_HISTORY):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=SIGNAL_DTYPE)
+        self._next = 0
+        self._size = 0
+
+    def append(self, time: datetime, side: str, entry: float, sl: float, tp: float):
+        self._data[self._next] = (np.datetime64(time, 'ms'), SIDES[side], entry, sl, tp)
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def array(self) -> np.ndarray:
+        """Сигналы от старых к новым (копия)"""
+        if self._size < self.capacity:
+            return self._data[:self._size].copy()
+        return np.concatenate([self._data[self._next:], self._data[:self._next]])
+
+    def to_records(self) -> List[Dict]:
+        """Сигналы в прежнем формате словарей - только для вывода"""
+        return [
+            {
+                'time': row['time'].astype(datetime),
+                'type': SIDE_NAMES[int(row['side'])],
+                'entry': float(row['entry']),
+                'sl': float(row['sl']),
+                'tp': float(row['tp']),
+            }
+            for row in self.array()
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+
+class PairStats:
+    """
+    Статистика пары/таймфрейма
+
+    Счётчики - за всё время, буфер - последние SIGNAL_HISTORY сигналов.
+    Поддерживает st['LONG'], st['SHORT'], st['Total'] и st['Signals'],
+    как прежний словарь.
+    """
+
+    __slots__ = ('long', 'short', 'signals')
+
+    def __init__(self, capacity: int = SIGNAL_HISTORY):
+        self.long = 0
+        self.short = 0
+        self.signals = SignalRing(capacity)
+
+    def record(self, time: datetime, side: str, entry: float, sl: float, tp: float):
+        if side == 'LONG':
+            self.long += 1
+        else:
+            self.short += 1
+        self.signals.append(time, side, entry, sl, tp)
+
+    @property
+    def total(self) -> int:
+        return self.long + self.short
+
+    def __getitem__(self, key: str):
+        if key == 'LONG':
+            return self.long
+        if key == 'SHORT':
+            return self.short
+        if key == 'Total':
+            return self.total
+        if key == 'Signals':
+            return self.signals.to_records()
+        raise KeyError(key)
+
+
+def make_stats(symbols: Iterable[str], timeframes: Iterable[str],
+               capacity: int = SIGNAL_HISTORY) -> Dict[str, Dict[str, PairStats]]:
+    """stats[symbol][timeframe] -> PairStats"""
+    timeframes = list(timeframes)
+    return {s: {tf: PairStats(capacity) for tf in timeframes} for s in symbols}
+
+
+# === ОШИБКИ ===
+class ErrorRecord:
+    __slots__ = ('timestamp', 'type', 'message')
+
+    def __init__(self, timestamp: datetime, error_type: str, message: str):
+        self.timestamp = timestamp
+        self.type = error_type
+        self.message = message
+
+    def to_dict(self) -> Dict:
+        return {'timestamp': self.timestamp, 'type': self.type, 'message': self.message}
+
+
+class ErrorLog:
+    """Последние ошибки в deque фиксированной длины и счётчик за всё время"""
+
+    __slots__ = ('_errors', 'total')
+
+    def __init__(self, capacity: int = ERROR_HISTORY):
+        self._errors = deque(maxlen=capacity)
+        self.total = 0
+
+    def append(self, timestamp: datetime, error_type: str, message: str):
+        self._errors.append(ErrorRecord(timestamp, error_type, message))
+        self.total += 1
+
+    def count_since(self, since: datetime) -> int:
+        """Ошибок позже since - с конца, пока не встретится старая: O(k)"""
+        count = 0
+        for error in reversed(self._errors):
+            if error.timestamp <= since:
+                break
+            count += 1
+        return count
+
+    def last(self) -> Optional[ErrorRecord]:
+        return self._errors[-1] if self._errors else None
+
+    def __len__(self) -> int:
+        return len(self._errors)
+
+    def __iter__(self):
+        return iter(self._errors)
+
+
+# === ПАМЯТЬ ===
+def process_rss_bytes() -> Optional[int]:
+    """Текущий RSS процесса; на системах без /proc - пиковый, если доступен"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux - КБ, macOS - байты
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def memory_usage(stats: Optional[Dict[str, Dict[str, PairStats]]] = None,
+                 errors: Optional[ErrorLog] = None) -> Dict:
+    """
+    Память процесса и статистики
+
+    Returns:
+        {'rss_mb', 'stats_kb', 'signals_buffered', 'errors_buffered'}
+    """
+    stats_bytes = 0
+    buffered = 0
+    for per_symbol in (stats or {}).values():
+        for pair in per_symbol.values():
+            stats_bytes += pair.signals.nbytes
+            buffered += len(pair.signals)
+
+    rss = process_rss_bytes()
+    return {
+        'rss_mb': round(rss / 2**20, 1) if rss is not None else None,
+        'stats_kb': round(stats_bytes / 1024, 1),
+        'signals_buffered': buffered,
+        'errors_buffered': len(errors) if errors is not None else 0,
+    }
+
+
+# Пример использования
+if __name__ == "__main__":
+    from datetime import timedelta
+
+    stats = make_stats(['SOL/USDT', 'BTC/USDT'], ['4h', '12h', '1d'])
+    errors = ErrorLog()
+    start = datetime(2024, 1, 1)
+
+    before = memory_usage(stats, errors)
+    for n in range(1_000_000):
+        moment = start + timedelta(minutes=n)
+        stats['SOL/USDT']['4h'].record(moment, 'LONG' if n % 3 else 'SHORT', 100.0, 95.0, 110.0)
+        if n % 10 == 0:
+            errors.append(moment, 'api', 'timeout')
+    after = memory_usage(stats, errors)
+
+    st = stats['SOL/USDT']['4h']
+    print(f"📊 Сигналов: {st['Total']} (LONG {st['LONG']}, SHORT {st['SHORT']}), в буфере: {len(st.signals)}")
+    print(f"🧠 До: {before}")
+    print(f"🧠 После: {after}")
+    print(f"⚠️ Ошибок за последний час: {errors.count_since(moment - timedelta(hours=1))}")
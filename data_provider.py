@@ -1,19 +1,37 @@
-import ccxt
 import pandas as pd
 from datetime import datetime, timedelta
 import time
 import logging
 from typing import List, Optional, Dict, Any
 
+import bot_clock
+import metrics
+from lazy_imports import lazy_module
+
+# ccxt с классами бирж импортируется ~0.4с - только когда понадобится биржа
+ccxt = lazy_module('ccxt')
+
+EXCHANGES = ('okx', 'binance', 'bybit')
+
+EXCHANGE_REQUESTS = metrics.counter('signal_bot_exchange_requests', 'Запросы к бирже',
+                                    ['exchange', 'endpoint', 'status'])
+EXCHANGE_SECONDS = metrics.histogram('signal_bot_exchange_request_seconds', 'Время запроса к бирже',
+                                     ['exchange', 'endpoint'], buckets=metrics.NETWORK_BUCKETS)
+CACHE_REQUESTS = metrics.counter('signal_bot_cache_requests', 'Обращения к кэшу свечей',
+                                 ['cache', 'result'])
+_cache_hits = CACHE_REQUESTS.labels('provider', 'hit')
+_cache_misses = CACHE_REQUESTS.labels('provider', 'miss')
+
 logger = logging.getLogger(__name__)
 
 class DataProvider:
-    def __init__(self, use_exchange: str = 'okx'):
+    def __init__(self, use_exchange: str = 'okx', exchange: Optional[Any] = None):
         """
         Инициализация провайдера данных
         
         Args:
             use_exchange: 'okx', 'binance' или 'bybit'
+            exchange: Готовый объект с интерфейсом ccxt (например, StubExchange) вместо биржи
         """
         self.cache = {}
         self.cache_duration = {
@@ -23,18 +41,22 @@ class DataProvider:
         }
         self.last_request_time = 0
         
-        # Инициализация биржи для реальных данных
-        if use_exchange == 'okx':
-            self.exchange = ccxt.okx({'enableRateLimit': True})
-        elif use_exchange == 'binance':
-            self.exchange = ccxt.binance({'enableRateLimit': True})
-        elif use_exchange == 'bybit':
-            self.exchange = ccxt.bybit({'enableRateLimit': True})
-        else:
-            self.exchange = ccxt.okx({'enableRateLimit': True})
+        # Биржа для реальных данных создаётся при первом запросе
+        if exchange is not None:
+            use_exchange = exchange.id
+        elif use_exchange not in EXCHANGES:
+            use_exchange = 'okx'
+        self.exchange_id = use_exchange
+        self._exchange = exchange
         
         logger.info(f"DataProvider инициализирован с биржей: {use_exchange.upper()}")
     
+    @property
+    def exchange(self):
+        if self._exchange is None:
+            self._exchange = getattr(ccxt, self.exchange_id)({'enableRateLimit': True})
+        return self._exchange
+    
     def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 100) -> List[list]:
         """
         Получает OHLCV данные с биржи в реальном времени
@@ -52,28 +74,37 @@ class DataProvider:
         # Проверка кэша
         if cache_key in self.cache:
             cached_data, timestamp = self.cache[cache_key]
-            if time.time() - timestamp < self.cache_duration.get(timeframe, 300):
+            if bot_clock.time() - timestamp < self.cache_duration.get(timeframe, 300):
                 logger.info(f"📦 Кэш: {symbol} {timeframe}")
+                _cache_hits.inc()
                 return cached_data
+        _cache_misses.inc()
     
         try:
             # Rate limiting
-            time_since_last = time.time() - self.last_request_time
+            time_since_last = bot_clock.time() - self.last_request_time
             if time_since_last < 1:
-                time.sleep(1 - time_since_last)
+                bot_clock.sleep(1 - time_since_last)
         
             # Получаем данные с биржи
             logger.info(f"📥 Загрузка {symbol} {timeframe} (limit={limit}) с {self.exchange.id.upper()}...")
             
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            status = 'error'
+            started = time.perf_counter()
+            try:
+                ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+                status = 'ok'
+            finally:
+                EXCHANGE_SECONDS.labels(self.exchange_id, 'fetch_ohlcv').observe(time.perf_counter() - started)
+                EXCHANGE_REQUESTS.labels(self.exchange_id, 'fetch_ohlcv', status).inc()
             
             if not ohlcv:
                 logger.error(f"❌ Пустой ответ для {symbol} {timeframe}")
                 return []
             
             # Кэшируем данные
-            self.cache[cache_key] = (ohlcv, time.time())
-            self.last_request_time = time.time()
+            self.cache[cache_key] = (ohlcv, bot_clock.time())
+            self.last_request_time = bot_clock.time()
             
             logger.info(f"✅ Получено {len(ohlcv)} свечей {symbol} {timeframe}")
             return ohlcv
@@ -1,12 +1,19 @@
 import ccxt
 import logging
+from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
 class ExchangeManager:
-    def __init__(self):
+    def __init__(self, exchanges: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            exchanges: {exchange_id: готовый объект с интерфейсом ccxt} - например,
+                StubExchange для нагрузочных тестов; None - настоящие биржи
+        """
+        self.provided_exchanges = exchanges
         self.exchanges: List[Dict[str, Any]] = []  # List of dicts with 'exchange' and 'status'
         self.current_exchange: Optional[ccxt.Exchange] = None
         self.fallback_exchange: Optional[ccxt.Exchange] = None
@@ -145,12 +152,17 @@ class ExchangeManager:
     def _init_exchanges(self):
         """Инициализирует все доступные биржи"""
         exchange_ids = ['bybit', 'okx', 'kucoin']  # Пробуем Bybit первым, так как он обычно стабилен
+        if self.provided_exchanges is not None:
+            exchange_ids = list(self.provided_exchanges)
         
         for exchange_id in exchange_ids:
             try:
-                config = self._get_exchange_config(exchange_id)
-                exchange_class = getattr(ccxt, exchange_id)
-                exchange = exchange_class(config)
+                if self.provided_exchanges is not None:
+                    exchange = self.provided_exchanges[exchange_id]
+                else:
+                    config = self._get_exchange_config(exchange_id)
+                    exchange_class = getattr(ccxt, exchange_id)
+                    exchange = exchange_class(config)
                 
                 # Test connection with a public endpoint
                 exchange.fetch_ticker('SOL/USDT')  # Более легкий запрос, чем fetch_time()
@@ -193,7 +205,8 @@ class ExchangeManager:
                 return self.current_exchange
             except Exception as e:
                 logger.warning(f"Ошибка соединения с {self.current_exchange.id}: {str(e)}")
-                return self.switch_to_fallback()
+                self.switch_to_fallback()
+                return self.current_exchange
                 
         # Если нет активной биржи, пробуем публичный API
         try:
@@ -223,5 +236,14 @@ class ExchangeManager:
             return True
         return False
 
-# Глобальный экземпляр менеджера бирж
-exchange_manager = ExchangeManager()
+# Глобальный экземпляр менеджера бирж создаётся при первом обращении:
+# конструктор подключается к биржам и не должен срабатывать при импорте
+_exchange_manager: Optional[ExchangeManager] = None
+
+def __getattr__(name: str):
+    global _exchange_manager
+    if name == 'exchange_manager':
+        if _exchange_manager is None:
+            _exchange_manager = ExchangeManager()
+        return _exchange_manager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
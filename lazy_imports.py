@@ -0,0 +1,113 @@
+"""
+Lazy Imports - Отложенный импорт тяжёлых зависимостей
+
+matplotlib (~0.4с), ccxt (~0.4с с классами бирж) и flask (~0.1с)
+импортировались при загрузке модулей бота и бэктеста даже в запусках,
+где не рисуется ни один график и не поднимается HTTP. lazy_module
+возвращает заглушку, которая импортирует модуль при первом обращении
+к атрибуту:
+
+    plt = lazy_module('matplotlib.pyplot', setup=use_agg)
+    ...
+    fig = plt.figure()  # matplotlib импортируется здесь
+
+Для подмодулей (matplotlib.dates) родитель тоже не импортируется до
+первого обращения - в отличие от importlib.util.LazyLoader, которому
+нужен загруженный родительский пакет, чтобы найти подмодуль.
+
+Что именно стоит импорт, показывает benchmark_suite.py --importtime MODULE
+(разбор вывода python -X importtime).
+"""
+
+import importlib
+import logging
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Имя -> заглушка, для отчёта о том, что реально загрузилось
+_registry: Dict[str, 'LazyModule'] = {}
+
+
+class LazyModule(ModuleType):
+    """Заглушка модуля: настоящий импорт при первом обращении к атрибуту"""
+
+    def __init__(self, name: str, setup: Optional[Callable[[], None]] = None):
+        super().__init__(name)
+        self.__dict__['_lazy_setup'] = setup
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_seconds'] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is not None:
+            return module
+        with self.__dict__['_lazy_lock']:
+            module = self.__dict__['_lazy_module']
+            if module is None:
+                started = time.perf_counter()
+                setup = self.__dict__['_lazy_setup']
+                if setup is not None:
+                    setup()
+                module = importlib.import_module(self.__name__)
+                self.__dict__['_lazy_seconds'] = time.perf_counter() - started
+                self.__dict__['_lazy_module'] = module
+                logger.debug(f"Lazy import {self.__name__}: {self.__dict__['_lazy_seconds'] * 1000:.0f} мс")
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_module(name: str, setup: Optional[Callable[[], None]] = None):
+    """
+    Модуль name, импортируемый при первом обращении к атрибуту
+
+    Args:
+        name: Полное имя модуля ('ccxt', 'matplotlib.dates')
+        setup: Вызывается один раз перед импортом (например, use_agg)
+
+    Returns:
+        Уже загруженный модуль или LazyModule
+    """
+    if name in sys.modules and setup is None:
+        return sys.modules[name]
+    proxy = _registry.get(name)
+    if proxy is None:
+        proxy = _registry[name] = LazyModule(name, setup)
+    return proxy
+
+
+def use_agg():
+    """Backend без дисплея - до первого импорта matplotlib.pyplot"""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def lazy_status() -> Dict[str, Optional[float]]:
+    """{модуль: секунды импорта или None, если так и не понадобился}"""
+    return {name: proxy.__dict__['_lazy_seconds'] for name, proxy in _registry.items()}
+
+
+# Пример использования
+if __name__ == "__main__":
+    started = time.perf_counter()
+    plt = lazy_module('matplotlib.pyplot', setup=use_agg)
+    ccxt = lazy_module('ccxt')
+    print(f"⚡ Заглушки за {(time.perf_counter() - started) * 1000:.2f} мс: {plt!r}, {ccxt!r}")
+
+    fig = plt.figure()
+    plt.close(fig)
+    print(f"📊 {lazy_status()}")
@@ -16,6 +16,8 @@ from typing import Dict, Optional, Tuple
 import logging
 from datetime import datetime
 
+from profiling import traced
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,6 +36,7 @@ class MarketRegimeMonitor:
         self.trend_strength_threshold = trend_strength_threshold
         self.range_threshold = range_threshold
         
+    @traced()
     def analyze_market_regime(self, df: pd.DataFrame) -> Dict:
         """
         Анализирует режим рынка
@@ -105,6 +108,7 @@ class MarketRegimeMonitor:
             logger.error(f"Error analyzing market regime: {e}")
             return {'regime': 'ERROR', 'confidence': 0}
     
+    @traced('regime_indicators')
     def _calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """Рассчитывает технические индикаторы"""
         df = df.copy()
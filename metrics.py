@@ -0,0 +1,325 @@
+"""
+Metrics - Счётчики и гистограммы в формате Prometheus для /metrics
+
+Состояние бота уходило только в Telegram раз в 5 минут. Здесь метрики,
+которые обновляются на каждом запросе к бирже, попадании в кэш, расчёте
+стратегии и отправке в Telegram, а Flask отдаёт их в текстовом формате
+Prometheus (exposition format 0.0.4).
+
+Обновление без блокировок: у каждого потока своя копия значений
+(шард), поток пишет только в свою, а при чтении /metrics шарды
+суммируются. Инкремент - это get_ident, поиск в словаре и сложение
+в списке (~0.5 мкс). Дочерние метрики с метками лучше получить один
+раз через labels() и держать в переменной.
+
+    REQUESTS = counter('bot_requests_total', 'Запросы', ['endpoint'])
+    REQUESTS.labels('fetch_ohlcv').inc()
+    with LATENCY.labels('okx').time():
+        ...
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы гистограмм (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NETWORK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CYCLE_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class _Shards:
+    """Значения по потокам: каждый поток пишет только в свой список"""
+
+    __slots__ = ('_size', '_shards')
+
+    def __init__(self, size: int):
+        self._size = size
+        self._shards: Dict[int, List[float]] = {}
+
+    def local(self) -> List[float]:
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            # setdefault атомарен под GIL - гонка двух потоков с одним ident невозможна
+            shard = self._shards.setdefault(ident, [0] * self._size)
+        return shard
+
+    def totals(self) -> List[float]:
+        result = [0] * self._size
+        for shard in list(self._shards.values()):
+            for i, value in enumerate(shard):
+                result[i] += value
+        return result
+
+
+# === ДОЧЕРНИЕ МЕТРИКИ (одна комбинация меток) ===
+class CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1):
+        self._shards.local()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+    def samples(self, name: str) -> Iterable[Tuple[str, Tuple, float]]:
+        yield name, (), self.value()
+
+
+class GaugeChild:
+    """Текущее значение: set() или функция, вызываемая при чтении /metrics"""
+
+    __slots__ = ('_value', '_function', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+    def samples(self, name: str) -> Iterable[Tuple[str, Tuple, float]]:
+        try:
+            value = self.value()
+        except Exception as e:
+            logger.debug(f"Gauge {name} callback failed: {e}")
+            return
+        if value is not None:
+            yield name, (), value
+
+
+class HistogramChild:
+    """Корзины le, сумма и количество наблюдений"""
+
+    __slots__ = ('_bounds', '_shards')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # Корзины, +Inf и сумма
+        self._shards = _Shards(len(bounds) + 2)
+
+    def observe(self, value: float):
+        shard = self._shards.local()
+        shard[bisect.bisect_left(self._bounds, value)] += 1
+        shard[-1] += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """(накопительные счётчики по корзинам, включая +Inf; сумма; количество)"""
+        totals = self._shards.totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1], running
+
+    def samples(self, name: str) -> Iterable[Tuple[str, Tuple, float]]:
+        cumulative, total, count = self.snapshot()
+        for bound, value in zip(self._bounds + (math.inf,), cumulative):
+            yield name + '_bucket', (('le', _format_value(bound)),), value
+        yield name + '_sum', (), total
+        yield name + '_count', (), count
+
+
+# === СЕМЕЙСТВА МЕТРИК ===
+class Metric:
+    """Метрика с метками; без меток методы дочерней вызываются напрямую"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._default = None if self.labelnames else self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: метки {self.labelnames}, получено {key}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def __getattr__(self, attr: str):
+        # inc/observe/set/time у метрики без меток
+        default = self.__dict__.get('_default')
+        if default is None:
+            raise AttributeError(attr)
+        return getattr(default, attr)
+
+    def collect(self) -> Iterable[Tuple[str, Tuple, float]]:
+        children = [((), self._default)] if self._default is not None else list(self._children.items())
+        for key, child in children:
+            labels = tuple(zip(self.labelnames, key))
+            for name, extra, value in child.samples(self.name):
+                yield name, labels + extra, value
+
+
+class Counter(Metric):
+    """Растущий счётчик; имя дополняется суффиксом _total"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None):
+        if not name.endswith('_total'):
+            name += '_total'
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return CounterChild()
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return GaugeChild()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional['Registry'] = None):
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+
+# === РЕЕСТР И ВЫВОД ===
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, help_text=True)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.collect():
+                if labels:
+                    label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(text: str, help_text: bool = False) -> str:
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text if help_text else text.replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return Counter(name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return Gauge(name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return Histogram(name, documentation, labelnames, buckets)
+
+
+# Пример использования
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    registry = Registry()
+    requests_total = Counter('demo_requests_total', 'Запросы', ['endpoint'], registry=registry)
+    latency = Histogram('demo_latency_seconds', 'Задержка', ['endpoint'], registry=registry)
+    depth = Gauge('demo_queue_depth', 'Глубина очереди', registry=registry)
+    depth.set_function(lambda: 3)
+
+    fetch = requests_total.labels('fetch_ohlcv')
+    fetch_latency = latency.labels('fetch_ohlcv')
+
+    def work(n):
+        for i in range(n):
+            fetch.inc()
+            fetch_latency.observe((i % 100) / 1000)
+
+    started = time.perf_counter()
+    work(200_000)
+    single = (time.perf_counter() - started) / 200_000 * 1e6
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, [100_000] * 8))
+
+    print(f"⚡ inc + observe: {single:.2f} мкс")
+    print(f"📊 Всего: {fetch.value():.0f} (ожидалось {200_000 + 800_000})")
+    print(registry.render()[:600])
@@ -0,0 +1,167 @@
+"""
+Monte Carlo - Анализ устойчивости результатов бэктеста
+
+Статистика бэктеста (просадка, серии, итоговый баланс) получена на одном
+пути - в одном порядке сделок. Здесь тысячи альтернативных путей строятся
+из тех же сделок:
+- bootstrap: выборка сделок с возвращением
+- shuffle: перестановка сделок (тот же набор, другой порядок) - итоговый
+  баланс при этом не меняется, меняются только просадки и серии
+
+Размер позиции в бэктесте пропорционален балансу, поэтому сделка
+описывается доходностью pnl / баланс до сделки, а путь капитала -
+произведением (1 + r). Все пути считаются векторно блоками в NumPy.
+"""
+
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Ограничение на размер блока (пути × сделки), чтобы не раздувать память
+MAX_BLOCK_ELEMENTS = 2_000_000
+
+
+def trade_returns(trades_df: pd.DataFrame) -> np.ndarray:
+    """Доходность каждой сделки относительно баланса перед ней"""
+    pnl = trades_df['pnl'].to_numpy(dtype=float)
+    balance_after = trades_df['balance'].to_numpy(dtype=float)
+    return pnl / (balance_after - pnl)
+
+
+def path_metrics(returns: np.ndarray, initial_balance: float) -> Dict[str, np.ndarray]:
+    """
+    Метрики для матрицы путей (пути × сделки)
+
+    Returns:
+        Dict с массивами final, max_dd (в %), loss_streak и кривыми equity
+    """
+    equity = initial_balance * np.cumprod(1 + returns, axis=1)
+
+    # Начальный баланс тоже считается пиком
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), initial_balance)
+    max_dd = ((equity - peak) / peak).min(axis=1) * 100
+
+    # Длина серии убытков: счётчик убытков минус его значение на последней прибыльной сделке
+    losses = returns <= 0
+    count = np.cumsum(losses, axis=1)
+    reset = np.maximum.accumulate(np.where(losses, 0, count), axis=1)
+    loss_streak = (count - reset).max(axis=1)
+
+    return {
+        'final': equity[:, -1],
+        'max_dd': max_dd,
+        'loss_streak': loss_streak,
+        'equity': equity
+    }
+
+
+def run_monte_carlo(
+    trades_df: pd.DataFrame,
+    simulations: int = 10000,
+    method: str = 'bootstrap',
+    initial_balance: Optional[float] = None,
+    band_paths: int = 2000,
+    seed: Optional[int] = None
+) -> Optional[Dict]:
+    """
+    Monte Carlo по сделкам бэктеста
+
+    Args:
+        trades_df: Сделки из backtest_with_charts (колонки pnl и balance)
+        simulations: Количество путей
+        method: 'bootstrap' (с возвращением) или 'shuffle' (перестановка)
+        initial_balance: Начальный баланс (по умолчанию восстанавливается из первой сделки)
+        band_paths: Сколько путей использовать для перцентильных полос equity
+        seed: Seed генератора
+
+    Returns:
+        Dict с распределениями или None если сделок меньше двух
+    """
+    if method not in ('shuffle', 'bootstrap'):
+        raise ValueError(f"Неизвестный метод: {method}")
+
+    if trades_df is None or len(trades_df) < 2:
+        return None
+
+    returns = trade_returns(trades_df)
+    n_trades = len(returns)
+    if initial_balance is None:
+        initial_balance = float(trades_df['balance'].iloc[0] - trades_df['pnl'].iloc[0])
+
+    rng = np.random.default_rng(seed)
+    block = max(1, min(simulations, MAX_BLOCK_ELEMENTS // n_trades))
+
+    finals, max_dds, streaks = [], [], []
+    bands = None
+    done = 0
+
+    while done < simulations:
+        size = min(block, simulations - done)
+
+        if method == 'shuffle':
+            paths = rng.permuted(np.broadcast_to(returns, (size, n_trades)), axis=1)
+        else:
+            paths = returns[rng.integers(0, n_trades, size=(size, n_trades))]
+
+        metrics = path_metrics(paths, initial_balance)
+        finals.append(metrics['final'])
+        max_dds.append(metrics['max_dd'])
+        streaks.append(metrics['loss_streak'])
+
+        if bands is None:
+            bands = np.percentile(metrics['equity'][:band_paths], PERCENTILES, axis=0)
+
+        done += size
+
+    finals = np.concatenate(finals)
+    max_dds = np.concatenate(max_dds)
+    streaks = np.concatenate(streaks)
+
+    actual = path_metrics(returns[np.newaxis, :], initial_balance)
+
+    def distribution(values):
+        return dict(zip((f'p{p}' for p in PERCENTILES), np.percentile(values, PERCENTILES)))
+
+    return {
+        'method': method,
+        'simulations': simulations,
+        'trades': n_trades,
+        'initial_balance': initial_balance,
+        'final': distribution(finals),
+        'max_dd': distribution(max_dds),
+        'loss_streak': distribution(streaks),
+        'prob_loss': float((finals < initial_balance).mean() * 100),
+        'actual': {
+            'final': float(actual['final'][0]),
+            'max_dd': float(actual['max_dd'][0]),
+            'loss_streak': int(actual['loss_streak'][0]),
+        },
+        # Доля путей с просадкой хуже исторической
+        'prob_worse_dd': float((max_dds < actual['max_dd'][0]).mean() * 100),
+        'bands': pd.DataFrame(bands.T, columns=[f'p{p}' for p in PERCENTILES]),
+    }
+
+
+def print_monte_carlo_report(mc: Dict):
+    """Вывод результатов Monte Carlo"""
+    print(f"\n🎲 MONTE CARLO ({mc['method']}, {mc['simulations']} путей, {mc['trades']} сделок)")
+    print(f"{'Метрика':<22} | {'Факт':>9} | " + " | ".join(f"{'P' + str(p):>9}" for p in PERCENTILES))
+    print("-" * 100)
+
+    rows = [
+        ('Итоговый баланс', 'final', '{:>9.2f}'),
+        ('Макс. просадка %', 'max_dd', '{:>9.1f}'),
+        ('Серия поражений', 'loss_streak', '{:>9.0f}'),
+    ]
+    for label, key, fmt in rows:
+        values = " | ".join(fmt.format(mc[key][f'p{p}']) for p in PERCENTILES)
+        print(f"{label:<22} | {fmt.format(mc['actual'][key])} | {values}")
+
+    print(f"📉 Вероятность убытка: {mc['prob_loss']:.1f}%")
+    print(f"⚠️  Путей с просадкой хуже фактической: {mc['prob_worse_dd']:.1f}%")
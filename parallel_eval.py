@@ -0,0 +1,261 @@
+"""
+Parallel Eval - Индикаторы, стратегии и режим рынка в пуле процессов
+
+Индикаторы и стратегии - pandas/ta под GIL: потоки стадии индикаторов
+конвейера ждут друг друга, и при сотнях пар пределом становится одно
+ядро. Здесь расчёт уходит в процессы:
+
+- свечи передаются массивом float64 (n, 6) - timestamp в мс и OHLCV:
+  один буфер вместо списка списков или DataFrame, пиклится за микросекунды
+- submit(kind, timeframe, candles) - одна пара, Future с ответом
+- evaluate_many(jobs) - пачка пар через общую память
+  (multiprocessing.shared_memory): все массивы пишутся в один сегмент,
+  процессам уходят только смещения, пачка делится на куски по процессам
+- в процессе свечи снова становятся DataFrame и вызывается
+  evaluator(kind, timeframe, df) - функция, заданная при создании пула.
+  С fork она наследуется, а не пиклится, поэтому подходит и функция бота
+  из __main__. Ответ компактный: (результат evaluator, секунды расчёта)
+
+Процессы создаются через fork до запуска фоновых потоков (как у ChartRenderer).
+Если пул упал, расчёт идёт в вызывающем потоке, пул пересоздаётся.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CANDLE_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+CANDLE_FIELDS = len(CANDLE_COLUMNS)
+
+
+# === СВЕЧИ <-> МАССИВ ===
+def pack_candles(ohlcv) -> np.ndarray:
+    """Свечи [timestamp мс, open, high, low, close, volume] -> непрерывный массив float64 (n, 6)"""
+    if isinstance(ohlcv, pd.DataFrame):
+        candles = np.empty((len(ohlcv), CANDLE_FIELDS), dtype=np.float64)
+        candles[:, 0] = ohlcv['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        for i, column in enumerate(CANDLE_COLUMNS[1:], start=1):
+            candles[:, i] = ohlcv[column].to_numpy(dtype=np.float64)
+        return candles
+    # Миллисекунды эпохи (~1.7e12) в float64 точны до 2^53
+    return np.ascontiguousarray(np.asarray(ohlcv, dtype=np.float64).reshape(-1, CANDLE_FIELDS))
+
+
+def candles_frame(candles: np.ndarray) -> pd.DataFrame:
+    """Массив (n, 6) -> DataFrame как у ohlcv_to_dataframe (данные копируются)"""
+    df = pd.DataFrame({column: candles[:, i].copy() for i, column in enumerate(CANDLE_COLUMNS)})
+    df['timestamp'] = pd.to_datetime(candles[:, 0].astype(np.int64), unit='ms')
+    return df
+
+
+# === РАБОЧИЙ ПРОЦЕСС ===
+# evaluator процесса - задаётся initializer'ом пула
+_evaluator: Optional[Callable] = None
+
+
+def _init_worker(evaluator: Callable):
+    global _evaluator
+    _evaluator = evaluator
+
+
+def _evaluate(kind: str, timeframe: str, candles: np.ndarray) -> Tuple[object, float]:
+    started = time.perf_counter()
+    result = _evaluator(kind, timeframe, candles_frame(candles))
+    return result, time.perf_counter() - started
+
+
+def _evaluate_chunk(segment: str, specs: List[Tuple[str, str, int, int]]) -> List[Tuple[object, float]]:
+    """Кусок пачки: (kind, timeframe, смещение в float64, строк) в сегменте общей памяти"""
+    shm = shared_memory.SharedMemory(name=segment)
+    try:
+        buffer = np.ndarray((shm.size // 8,), dtype=np.float64, buffer=shm.buf)
+        results = []
+        for kind, timeframe, offset, rows in specs:
+            candles = buffer[offset:offset + rows * CANDLE_FIELDS].reshape(rows, CANDLE_FIELDS)
+            results.append(_evaluate(kind, timeframe, candles))
+        # Представления сегмента нужно отпустить до close()
+        del buffer, candles
+        return results
+    finally:
+        shm.close()
+
+
+# === ПУЛ ===
+class StrategyPool:
+    """Расчёт evaluator(kind, timeframe, df) в пуле процессов"""
+
+    def __init__(self, evaluator: Callable, workers: Optional[int] = None,
+                 start_method: Optional[str] = None, chunks_per_worker: int = 2):
+        """
+        Args:
+            evaluator: Функция(kind, timeframe, df) -> результат (пиклится обратно)
+            workers: Процессов (по умолчанию - по числу ядер; 0 - в вызывающем потоке)
+            start_method: По умолчанию fork, где он есть: spawn заново выполняет
+                __main__ бота, а с fork evaluator не нужно пиклить
+            chunks_per_worker: На сколько кусков на процесс делить пачку
+                evaluate_many (больше - ровнее загрузка, меньше - меньше накладных)
+        """
+        if start_method is None:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.evaluator = evaluator
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.start_method = start_method
+        self.chunks_per_worker = max(1, chunks_per_worker)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Общий трекер сегментов до создания процессов: иначе каждый процесс
+                # заведёт свой и при выходе будет "чистить" уже удалённые сегменты
+                resource_tracker.ensure_running()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self.evaluator,),
+                )
+            return self._executor
+
+    def _broken(self, error: Exception):
+        # Процесс пула упал - пересоздаём пул к следующему вызову, этот считаем здесь
+        logger.error(f"Strategy pool unavailable, evaluating inline: {error}")
+        with self._lock:
+            self._executor = None
+
+    def start(self):
+        """Запустить процессы сейчас (с fork - до фоновых потоков)"""
+        if self.workers > 0:
+            self._get_executor().submit(abs, 0)
+
+    def evaluate(self, kind: str, timeframe: str, candles: np.ndarray) -> Tuple[object, float]:
+        """Посчитать в вызывающем потоке: (результат, секунды)"""
+        started = time.perf_counter()
+        result = self.evaluator(kind, timeframe, candles_frame(candles))
+        return result, time.perf_counter() - started
+
+    def submit(self, kind: str, timeframe: str, candles: np.ndarray) -> Future:
+        """Одна пара в пул; Future с (результат, секунды расчёта)"""
+        if self.workers > 0:
+            try:
+                future = self._get_executor().submit(_evaluate, kind, timeframe, candles)
+                self._pending.add(future)
+                future.add_done_callback(self._pending.discard)
+                return future
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._broken(e)
+
+        future = Future()
+        try:
+            future.set_result(self.evaluate(kind, timeframe, candles))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def evaluate_many(self, jobs: Sequence[Tuple[str, str, np.ndarray]]) -> List[Tuple[object, float]]:
+        """
+        Пачка (kind, timeframe, candles) через один сегмент общей памяти
+
+        Returns:
+            [(результат, секунды)] в порядке jobs; ошибка evaluator поднимается
+        """
+        if not jobs:
+            return []
+        arrays = [np.asarray(candles, dtype=np.float64) for _, _, candles in jobs]
+        if self.workers <= 0:
+            return [self.evaluate(kind, timeframe, candles) for (kind, timeframe, _), candles in zip(jobs, arrays)]
+
+        total = sum(candles.size for candles in arrays)
+        shm = shared_memory.SharedMemory(create=True, size=max(8, total * 8))
+        try:
+            buffer = np.ndarray((total,), dtype=np.float64, buffer=shm.buf)
+            specs, offset = [], 0
+            for (kind, timeframe, _), candles in zip(jobs, arrays):
+                buffer[offset:offset + candles.size] = candles.ravel()
+                specs.append((kind, timeframe, offset, len(candles)))
+                offset += candles.size
+            del buffer
+
+            size = math.ceil(len(specs) / (self.workers * self.chunks_per_worker))
+            chunks = [specs[i:i + size] for i in range(0, len(specs), size)]
+            try:
+                executor = self._get_executor()
+                futures = [executor.submit(_evaluate_chunk, shm.name, chunk) for chunk in chunks]
+                results = []
+                for future in futures:
+                    results.extend(future.result())
+                return results
+            except BrokenProcessPool as e:
+                self._broken(e)
+                return [self.evaluate(kind, timeframe, candles)
+                        for (kind, timeframe, _), candles in zip(jobs, arrays)]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def pending(self) -> int:
+        """Расчётов в очереди и в работе (submit)"""
+        return len(self._pending)
+
+    def close(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# Пример использования
+if __name__ == "__main__":
+    def rolling_score(kind, timeframe, df):
+        """Нагрузка уровня стратегии: десяток скользящих окон по 2000 свечам"""
+        close = df['close']
+        score = 0.0
+        for window in range(10, 60, 5):
+            mean = close.rolling(window).mean()
+            std = close.rolling(window).std()
+            score += float(((close - mean) / std).iloc[-1])
+        return 'LONG' if score > 0 else 'SHORT', {'score': score}
+
+    rng = np.random.default_rng(3)
+    n, pairs = 2000, 48
+    stamps = 1_700_000_000_000 + np.arange(n) * 14_400_000
+    jobs = []
+    for i in range(pairs):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        ohlcv = np.column_stack([stamps, close, close * 1.01, close * 0.99, close, rng.lognormal(10, 0.5, n)])
+        jobs.append(('strategy', '4h', pack_candles(ohlcv)))
+
+    started = time.perf_counter()
+    serial = [StrategyPool(rolling_score, workers=0).evaluate(*job) for job in jobs]
+    serial_time = time.perf_counter() - started
+    print(f"⏱ {pairs} пар в одном процессе: {serial_time:.2f}с")
+
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        pool = StrategyPool(rolling_score, workers=workers)
+        pool.start()
+        pool.evaluate_many(jobs[:workers])  # процессы прогреты
+        started = time.perf_counter()
+        results = pool.evaluate_many(jobs)
+        batch = time.perf_counter() - started
+        started = time.perf_counter()
+        futures = [pool.submit(*job) for job in jobs]
+        single = [future.result() for future in futures]
+        submitted = time.perf_counter() - started
+        pool.close()
+        same = all(a[0] == b[0] == c[0] for a, b, c in zip(serial, results, single))
+        print(f"🚀 процессов {workers}: общая память {batch:.2f}с (x{serial_time / batch:.1f}), "
+              f"submit {submitted:.2f}с | совпадает: {same}")
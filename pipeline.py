@@ -0,0 +1,294 @@
+"""
+Pipeline - Конвейер стадий с ограниченными очередями между ними
+
+main_loop делал для каждой пары загрузку свечей, сборку DataFrame,
+check_signal, график и Telegram подряд в одном вложенном цикле: пока
+идёт запрос к бирже, процессор простаивает, пока считаются индикаторы -
+простаивает сеть, и время прохода - сумма всех стадий. Здесь:
+
+- Stage(name, func, workers, queue_size) - функция item -> item (None -
+  элемент дальше не идёт), свой пул потоков под профиль стадии: сети -
+  несколько, стадиям с общим состоянием бота - один
+- между стадиями queue.Queue(maxsize): если следующая стадия не
+  успевает, put блокируется и предыдущая ждёт (backpressure), а run()
+  ждёт на входе - элементы не копятся в памяти
+- run(items) подаёт элементы и ждёт, пока все выйдут; стадии работают
+  одновременно над разными элементами, так что проход занимает примерно
+  время самой медленной стадии, а не сумму
+- ошибка стадии не останавливает конвейер: элемент снимается,
+  вызывается on_error(stage, item, error)
+- inline=True - все стадии по очереди в вызывающем потоке (прогон по
+  истории на SimulatedClock остаётся детерминированным)
+- RateLimiter - общий для потоков стадии интервал между запросами
+  (вместо паузы после каждой пары)
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import bot_clock
+import metrics
+from profiling import tracer
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_STAGE_SECONDS = metrics.histogram('signal_bot_pipeline_stage_seconds',
+                                           'Обработка элемента стадией конвейера', ['stage'])
+PIPELINE_ITEMS = metrics.counter('signal_bot_pipeline_items', 'Элементы по итогу стадии',
+                                 ['stage', 'result'])
+PIPELINE_QUEUE_DEPTH = metrics.gauge('signal_bot_pipeline_queue_depth', 'Элементов в очереди перед стадией',
+                                     ['stage'])
+
+_STOP = object()
+
+
+class Stage:
+    """Стадия конвейера: функция, число потоков и размер входной очереди"""
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, queue_size: Optional[int] = None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        # По умолчанию - по два элемента на поток: поток не ждёт, память не растёт
+        self.queue_size = queue_size if queue_size is not None else 2 * self.workers
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+        self._seconds = PIPELINE_STAGE_SECONDS.labels(name)
+        self._results = {result: PIPELINE_ITEMS.labels(name, result) for result in ('passed', 'dropped', 'failed')}
+
+    def _record(self, result: str, elapsed: float):
+        with self._lock:
+            self.processed += 1
+            self.busy += elapsed
+            if result == 'dropped':
+                self.dropped += 1
+            elif result == 'failed':
+                self.failed += 1
+        self._seconds.observe(elapsed)
+        self._results[result].inc()
+
+
+class RateLimiter:
+    """Не чаще одного старта за interval (+ случайно до jitter) на все потоки"""
+
+    def __init__(self, interval: float, jitter: float = 0.0):
+        self.interval = interval
+        self.jitter = jitter
+        self._next = float('-inf')
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Занять ближайший слот и дождаться его по часам бота"""
+        with self._lock:
+            now = bot_clock.time()
+            start = max(now, self._next)
+            self._next = start + self.interval + random.uniform(0, self.jitter)
+        if start > now:
+            bot_clock.sleep(start - now)
+
+    def backoff(self, seconds: float):
+        """Отодвинуть следующий старт (пауза после ошибки)"""
+        with self._lock:
+            self._next = max(self._next, bot_clock.time() + seconds)
+
+
+class Pipeline:
+    """Стадии, соединённые ограниченными очередями"""
+
+    def __init__(self, stages: List[Stage], on_error: Optional[Callable] = None,
+                 inline: bool = False, name: str = 'pipeline'):
+        """
+        Args:
+            stages: Стадии по порядку
+            on_error: Функция(имя стадии, элемент, исключение) - из потока стадии
+            inline: Без потоков - все стадии в вызывающем потоке
+            name: Префикс имён потоков
+        """
+        self.stages = stages
+        self.on_error = on_error
+        self.inline = inline
+        self.name = name
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        # Элементов внутри конвейера и итоги текущего run() - под self._cond
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._completed: List = []
+
+    # === ЗАПУСК И ОСТАНОВКА ===
+    def start(self):
+        if self.inline or self._threads:
+            return
+        self._queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        for index, stage in enumerate(self.stages):
+            inbox = self._queues[index]
+            PIPELINE_QUEUE_DEPTH.labels(stage.name).set_function(inbox.qsize)
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,), daemon=True,
+                                          name=f"{self.name}-{stage.name}-{n}")
+                thread.start()
+                self._threads.append(thread)
+
+    def close(self, timeout: float = 10.0):
+        """Остановить потоки (элементы в очередях дообрабатываются)"""
+        if not self._threads:
+            return
+        for inbox, stage in zip(self._queues, self.stages):
+            for _ in range(stage.workers):
+                inbox.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        self._queues = []
+
+    # === ОБРАБОТКА ===
+    def run(self, items: Iterable) -> Dict:
+        """
+        Пропустить элементы через все стадии и дождаться их
+
+        Returns:
+            {'items', 'completed', 'dropped', 'failed', 'seconds', 'results'}:
+            failed - {стадия: ошибок}, results - элементы, прошедшие последнюю стадию
+        """
+        started = time.perf_counter()
+        before = [(stage.dropped, stage.failed) for stage in self.stages]
+        with self._cond:
+            self._completed = []
+
+        count = 0
+        if self.inline:
+            for item in items:
+                count += 1
+                for index in range(len(self.stages)):
+                    item = self._process(index, item)
+                    if item is None:
+                        break
+                else:
+                    self._completed.append(item)
+        else:
+            self.start()
+            for item in items:
+                count += 1
+                with self._cond:
+                    self._pending += 1
+                # Блокируется, пока первая стадия не разберёт очередь
+                self._queues[0].put(item)
+            with self._cond:
+                while self._pending:
+                    self._cond.wait()
+
+        dropped = sum(stage.dropped - d for stage, (d, _) in zip(self.stages, before))
+        failed = {stage.name: stage.failed - f for stage, (_, f) in zip(self.stages, before)
+                  if stage.failed > f}
+        with self._cond:
+            completed, self._completed = self._completed, []
+        return {
+            'items': count,
+            'completed': len(completed),
+            'dropped': dropped,
+            'failed': failed,
+            'seconds': time.perf_counter() - started,
+            'results': completed,
+        }
+
+    def _process(self, index: int, item):
+        """Одна стадия над элементом; None - элемент снят (отброшен или ошибка)"""
+        stage = self.stages[index]
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"pipeline.{stage.name}"):
+                result = stage.func(item)
+        except Exception as e:
+            stage._record('failed', time.perf_counter() - started)
+            if self.on_error is not None:
+                try:
+                    self.on_error(stage.name, item, e)
+                except Exception as callback_error:
+                    logger.error(f"Pipeline on_error failed: {callback_error}")
+            else:
+                logger.error(f"Pipeline stage {stage.name} failed: {e}")
+            return None
+        stage._record('passed' if result is not None else 'dropped', time.perf_counter() - started)
+        return result
+
+    def _work(self, index: int):
+        inbox = self._queues[index]
+        last = index == len(self.stages) - 1
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            result = self._process(index, item)
+            if result is not None and not last:
+                # Блокируется, пока следующая стадия не освободит место
+                self._queues[index + 1].put(result)
+                continue
+            with self._cond:
+                if result is not None:
+                    self._completed.append(result)
+                self._pending -= 1
+                if not self._pending:
+                    self._cond.notify_all()
+
+    # === СТАТИСТИКА ===
+    def stats(self, wall: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        По стадиям: потоки, обработано, отброшено, ошибок, занятое время и
+        загрузка (занятое время / (wall * потоки)) - узкое место ближе к 1
+        """
+        result = {}
+        for index, stage in enumerate(self.stages):
+            entry = {
+                'workers': stage.workers,
+                'processed': stage.processed,
+                'dropped': stage.dropped,
+                'failed': stage.failed,
+                'busy_seconds': stage.busy,
+                'queue_depth': self._queues[index].qsize() if self._queues else 0,
+            }
+            if wall:
+                entry['utilization'] = stage.busy / (wall * stage.workers)
+            result[stage.name] = entry
+        return result
+
+
+# Пример использования
+if __name__ == "__main__":
+    import numpy as np
+
+    def fetch(n):
+        time.sleep(0.05)  # сеть
+        return n
+
+    def compute(n):
+        values = np.random.default_rng(n).normal(size=200_000)
+        return float(np.sort(values)[-1])
+
+    def deliver(value):
+        time.sleep(0.02)  # очередь Telegram
+        return value
+
+    items = range(40)
+
+    started = time.perf_counter()
+    for n in items:
+        deliver(compute(fetch(n)))
+    serial = time.perf_counter() - started
+
+    pipeline = Pipeline([Stage('fetch', fetch, workers=4), Stage('compute', compute),
+                         Stage('deliver', deliver, workers=2)])
+    result = pipeline.run(items)
+    pipeline.close()
+    print(f"⏱ Подряд: {serial:.2f}с | конвейер: {result['seconds']:.2f}с "
+          f"({result['completed']}/{result['items']} элементов)")
+    for name, entry in pipeline.stats(result['seconds']).items():
+        print(f"   {name:<8} потоков {entry['workers']} | занято {entry['busy_seconds']:.2f}с | "
+              f"загрузка {entry['utilization']:.0%}")
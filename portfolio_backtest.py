@@ -0,0 +1,283 @@
+"""
+Portfolio Backtest - Бэктест портфеля с общим капиталом
+
+Объединяет потоки сигналов из многих источников (пара, таймфрейм, стратегия)
+в одну временную шкалу событий с общим балансом:
+- ограничение на число одновременно открытых позиций
+- одна позиция на источник (как в одиночном бэктесте)
+- кривая капитала, просадка и загрузка капитала (exposure)
+
+Для скорости по DataFrame не шагаем: сначала для каждого сигнала считается
+выход (он зависит только от цены, не от капитала), затем кандидаты всех
+источников сортируются по времени и обрабатываются как массивы событий.
+"""
+
+import heapq
+import logging
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest_bot import (
+    _resolve_exit, INITIAL_BALANCE, RISK_PER_TRADE, MAX_LEVERAGE, COMMISSION, MIN_RISK_REWARD
+)
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+def build_candidates(df: pd.DataFrame, timeframe: str, min_risk_reward: float = MIN_RISK_REWARD) -> Dict[str, np.ndarray]:
+    """
+    Кандидаты в сделки одного источника
+
+    Время события - закрытие свечи (timestamp + длительность таймфрейма),
+    чтобы сигналы разных таймфреймов не заглядывали в будущее друг друга.
+    Сделка без выхода (resolved=False) держит место до конца истории
+    источника, как break в simulate_trades.
+    """
+    close = df['close'].to_numpy(dtype=float)
+    signals = df['signal'].to_numpy()
+    sl_distances = df['sl_distance'].to_numpy(dtype=float)
+    tp_distances = df['tp_distance'].to_numpy(dtype=float)
+    close_times = (df['timestamp'].to_numpy(dtype='datetime64[ns]')
+                   + np.timedelta64(timeframe_to_seconds(timeframe), 's'))
+
+    idx = np.flatnonzero(signals != 0)
+    idx = idx[tp_distances[idx] / sl_distances[idx] >= min_risk_reward]
+
+    entry_idx, exit_idx, profit_pct, resolved = [], [], [], []
+    for i in idx:
+        is_long = signals[i] > 0
+        entry = close[i]
+        if is_long:
+            stop_loss, take_profit = entry - sl_distances[i], entry + tp_distances[i]
+        else:
+            stop_loss, take_profit = entry + sl_distances[i], entry - tp_distances[i]
+
+        exit_info = _resolve_exit(close, i, is_long, entry, stop_loss, take_profit)
+        entry_idx.append(i)
+        if exit_info is None:
+            # Открыта до конца истории: если её возьмут, источник занят до конца
+            exit_idx.append(len(close) - 1)
+            profit_pct.append(np.nan)
+            resolved.append(False)
+            continue
+        exit_idx.append(exit_info[0])
+        profit_pct.append(exit_info[1])
+        resolved.append(True)
+
+    entry_idx = np.asarray(entry_idx, dtype=np.int64)
+    exit_idx = np.asarray(exit_idx, dtype=np.int64)
+    resolved = np.asarray(resolved, dtype=bool)
+    exit_time = close_times[exit_idx]
+    # Позиция без выхода занимает и последний бар - вход на нём тоже отклоняется
+    exit_time[~resolved] += np.timedelta64(1, 'ns')
+
+    return {
+        'entry_time': close_times[entry_idx],
+        'exit_time': exit_time,
+        'side': np.sign(signals[entry_idx]).astype(np.int8),
+        'entry': close[entry_idx],
+        'exit': close[exit_idx],
+        'sl_distance': sl_distances[entry_idx],
+        'return_pct': np.asarray(profit_pct, dtype=float) * 100,
+        'resolved': resolved,
+    }
+
+
+def run_portfolio_backtest(
+    sources: Iterable[Tuple[str, str, str, pd.DataFrame]],
+    max_positions: int = 5,
+    initial_balance: float = INITIAL_BALANCE,
+    risk_per_trade: float = RISK_PER_TRADE,
+    max_leverage: float = MAX_LEVERAGE,
+    commission: float = COMMISSION,
+    min_risk_reward: float = MIN_RISK_REWARD
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict]:
+    """
+    Бэктест портфеля
+
+    Args:
+        sources: (symbol, timeframe, strategy_name, df с колонками signal/sl_distance/tp_distance)
+        max_positions: Максимум одновременно открытых позиций
+
+    Returns:
+        (сделки, временная шкала капитала/загрузки, статистика)
+    """
+    source_names = []
+    parts = []
+    for n, (symbol, timeframe, strategy_name, df) in enumerate(sources):
+        source_names.append((symbol, timeframe, strategy_name))
+        cand = build_candidates(df, timeframe, min_risk_reward)
+        cand['source'] = np.full(len(cand['entry']), n, dtype=np.int32)
+        parts.append(cand)
+
+    if not parts:
+        raise ValueError("Нет источников сигналов")
+
+    # Единый массив событий, отсортированный по времени входа
+    events = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    order = np.argsort(events['entry_time'], kind='stable')
+    events = {key: values[order] for key, values in events.items()}
+
+    entry_times = events['entry_time']
+    exit_times = events['exit_time']
+    sides = events['side']
+    entries = events['entry']
+    exits = events['exit']
+    sl_distances = events['sl_distance']
+    returns = events['return_pct']
+    source_ids = events['source']
+    resolved = events['resolved']
+
+    equity = initial_balance
+    open_heap = []          # (exit_time, номер события)
+    busy_sources = set()
+    notional = 0.0
+    sizes = {}
+
+    trades = []
+    timeline = [(entry_times[0] if len(entry_times) else np.datetime64('NaT'), equity, 0, 0.0)]
+    rejected = 0
+    max_open = 0
+    open_at_end = 0
+
+    def close_until(moment=None):
+        """Закрыть позиции с выходом не позже moment (None - все оставшиеся)"""
+        nonlocal equity, notional, open_at_end
+        while open_heap and (moment is None or open_heap[0][0] <= moment):
+            exit_time, k = heapq.heappop(open_heap)
+            size, leverage = sizes.pop(k)
+            if not resolved[k]:
+                # История источника кончилась при открытой позиции: место освобождается без сделки
+                open_at_end += 1
+                notional = sum(sz * entries[j] for j, (sz, _) in sizes.items())
+                timeline.append((exit_time, equity, len(open_heap), notional / equity if equity > 0 else 0.0))
+                continue
+            pnl = (exits[k] - entries[k]) * size * sides[k]
+            pnl -= size * entries[k] * commission
+            pnl -= size * exits[k] * commission
+            equity += pnl
+            # Открытых позиций не больше max_positions - считаем точно, без накопления ошибки
+            notional = sum(sz * entries[j] for j, (sz, _) in sizes.items())
+            busy_sources.discard(source_ids[k])
+
+            symbol, timeframe, strategy_name = source_names[source_ids[k]]
+            trades.append({
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'strategy': strategy_name,
+                'entry_time': pd.Timestamp(entry_times[k]),
+                'exit_time': pd.Timestamp(exit_time),
+                'type': 'LONG' if sides[k] > 0 else 'SHORT',
+                'entry': entries[k],
+                'exit': exits[k],
+                'size': size,
+                'leverage': leverage,
+                'pnl': pnl,
+                'balance': equity,
+                'return_pct': returns[k]
+            })
+            timeline.append((exit_time, equity, len(open_heap), notional / equity if equity > 0 else 0.0))
+
+    for k in range(len(entries)):
+        # Выходы на том же баре обрабатываются раньше входов
+        close_until(entry_times[k])
+
+        if source_ids[k] in busy_sources:
+            continue
+        if len(open_heap) >= max_positions:
+            rejected += 1
+            continue
+        if equity <= 0:
+            break
+
+        risk_amount = equity * risk_per_trade
+        position_size_base = risk_amount / sl_distances[k]
+        leverage_used = min(max_leverage, (position_size_base * entries[k]) / equity)
+        size = (risk_amount * leverage_used) / sl_distances[k]
+
+        sizes[k] = (size, leverage_used)
+        notional = sum(sz * entries[j] for j, (sz, _) in sizes.items())
+        busy_sources.add(source_ids[k])
+        heapq.heappush(open_heap, (exit_times[k], k))
+        max_open = max(max_open, len(open_heap))
+        timeline.append((entry_times[k], equity, len(open_heap), notional / equity))
+
+    close_until()
+
+    trades_df = pd.DataFrame(trades)
+    timeline_df = pd.DataFrame(timeline, columns=['time', 'equity', 'open_positions', 'exposure'])
+    timeline_df['peak'] = timeline_df['equity'].cummax()
+    timeline_df['drawdown'] = (timeline_df['equity'] - timeline_df['peak']) / timeline_df['peak'] * 100
+
+    stats = {
+        'sources': len(source_names),
+        'candidates': len(entries),
+        'total': len(trades_df),
+        'rejected_by_limit': rejected,
+        'open_at_end': open_at_end,
+        'wins': int((trades_df['pnl'] > 0).sum()) if len(trades_df) else 0,
+        'wr': float((trades_df['pnl'] > 0).mean() * 100) if len(trades_df) else 0,
+        'final': equity,
+        'roi': (equity - initial_balance) / initial_balance * 100,
+        'max_dd': timeline_df['drawdown'].min(),
+        'max_open_positions': max_open,
+        'avg_exposure': _time_weighted_mean(timeline_df, 'exposure'),
+        'max_exposure': timeline_df['exposure'].max(),
+    }
+
+    return trades_df, timeline_df, stats
+
+
+def _time_weighted_mean(timeline_df: pd.DataFrame, column: str) -> float:
+    """Среднее по времени для ступенчатого ряда"""
+    times = timeline_df['time'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    if len(times) < 2 or times[-1] == times[0]:
+        return float(timeline_df[column].mean()) if len(times) else 0.0
+    durations = np.diff(times)
+    return float(np.sum(timeline_df[column].to_numpy()[:-1] * durations) / (times[-1] - times[0]))
+
+
+def print_portfolio_report(trades_df: pd.DataFrame, stats: Dict):
+    """Вывод результатов бэктеста портфеля"""
+    print(f"\n{'='*100}")
+    print(f"💼 ПОРТФЕЛЬ: {stats['sources']} источников | макс. открыто позиций: {stats['max_open_positions']}")
+    print(f"{'='*100}")
+    print(f"💰 Баланс: {INITIAL_BALANCE:.2f} → {stats['final']:.2f} USD ({stats['roi']:+.1f}%)")
+    print(f"📊 Сделок: {stats['total']} из {stats['candidates']} сигналов | ✅ {stats['wins']} ({stats['wr']:.1f}%)")
+    print(f"🚫 Отклонено лимитом позиций: {stats['rejected_by_limit']}")
+    if stats['open_at_end']:
+        print(f"⏳ Открыто к концу истории (без выхода, не в сделках): {stats['open_at_end']}")
+    print(f"📉 Макс. просадка: {stats['max_dd']:.2f}%")
+    print(f"⚡ Загрузка капитала: средняя {stats['avg_exposure']:.2f}x | макс. {stats['max_exposure']:.2f}x")
+
+    if len(trades_df):
+        by_source = trades_df.groupby(['symbol', 'timeframe', 'strategy'])['pnl'].agg(['count', 'sum'])
+        print(f"\n{'Инструмент':<12} | {'TF':<4} | {'Стратегия':<30} | {'Сделок':<7} | {'PnL':<10}")
+        print("-" * 100)
+        for (symbol, timeframe, strategy_name), row in by_source.iterrows():
+            print(f"{symbol:<12} | {timeframe:<4} | {strategy_name:<30} | {int(row['count']):<7} | {row['sum']:>+9.2f}")
+
+
+# Пример использования
+if __name__ == "__main__":
+    from backtest_bot import (
+        fetch_historical_data, strategy_4h_turtle, strategy_12h_momentum, strategy_1d_trend
+    )
+
+    configs = [
+        ('SOL/USDT', '4h', strategy_4h_turtle, '4h Aggressive Turtle'),
+        ('BTC/USDT', '4h', strategy_4h_turtle, '4h Aggressive Turtle'),
+        ('ETH/USDT', '4h', strategy_4h_turtle, '4h Aggressive Turtle'),
+        ('SOL/USDT', '12h', strategy_12h_momentum, '12h Momentum Breakout'),
+        ('SOL/USDT', '1d', strategy_1d_trend, '1d Strong Trend Following'),
+    ]
+
+    sources = []
+    for symbol, timeframe, strategy_func, strategy_name in configs:
+        df = strategy_func(fetch_historical_data(symbol, timeframe, 365))
+        sources.append((symbol, timeframe, strategy_name, df))
+
+    trades_df, timeline_df, stats = run_portfolio_backtest(sources, max_positions=3)
+    print_portfolio_report(trades_df, stats)
@@ -0,0 +1,349 @@
+"""
+Profiling - Вложенные спаны и сэмплирующий профилировщик циклов бота
+
+stage_timer даёт плоские суммы по стадиям, но не показывает, куда уходит
+время внутри цикла: загрузка, проверка данных, сборка DataFrame,
+индикаторы, логика стратегии, график, Telegram. Здесь:
+
+- Tracer - спаны с вложенностью (стек на поток). Выключенный трейсер
+  стоит одну проверку флага: span() отдаёт общий пустой контекст,
+  traced() сразу вызывает функцию. Включённый копит время по путям
+  (fetch;check_signal;strategy;strategy_4h_hybrid;add_range_indicators)
+  и пишет их в folded-формате - готовый flamegraph по спанам.
+- SamplingProfiler - фоновый поток раз в interval снимает стек основного
+  потока (sys._current_frames) и пишет свёрнутые стеки "a;b;c N" -
+  формат flamegraph.pl, speedscope и inferno.
+- CycleProfiler - оба режима на заданное число циклов main_loop
+  (PROFILE_CYCLES), после чего файлы записываются и профилирование
+  выключается.
+
+    TRACE_SPANS=1 PROFILE_CYCLES=3 python sol_signal_bot.py
+    flamegraph.pl bot_data/profile.folded > profile.svg
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = os.path.join('bot_data', 'profile.folded')
+# Сэмплы, где основной поток просто ждёт, по умолчанию не пишутся
+IDLE_FUNCTIONS = frozenset({'sleep', 'wait', 'select', 'poll', 'acquire'})
+
+_NOOP = nullcontext()
+
+
+# === СПАНЫ ===
+class _ThreadState:
+    """Стек путей и накопленные спаны одного потока - пишет только он сам"""
+
+    __slots__ = ('stack', 'stats')
+
+    def __init__(self):
+        self.stack: List[Tuple[str, ...]] = []
+        # путь -> [вызовов, всего секунд, секунд во вложенных спанах]
+        self.stats: Dict[Tuple[str, ...], List[float]] = {}
+
+
+class _Span:
+    __slots__ = ('state', 'name', 'started')
+
+    def __init__(self, state: _ThreadState, name: str):
+        self.state = state
+        self.name = name
+
+    def __enter__(self):
+        stack = self.state.stack
+        stack.append(stack[-1] + (self.name,) if stack else (self.name,))
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        state = self.state
+        path = state.stack.pop()
+        entry = state.stats.get(path)
+        if entry is None:
+            entry = state.stats[path] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        if state.stack:
+            parent = state.stats.get(state.stack[-1])
+            if parent is None:
+                parent = state.stats[state.stack[-1]] = [0, 0.0, 0.0]
+            parent[2] += elapsed
+        return False
+
+
+class Tracer:
+    """Вложенные спаны; при enabled=False - почти бесплатны"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._states: List[_ThreadState] = []
+
+    def _state(self) -> _ThreadState:
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            state = self._local.state = _ThreadState()
+            with self._lock:
+                self._states.append(state)
+        return state
+
+    def span(self, name: str):
+        """Контекст спана; выключенный трейсер отдаёт общий пустой контекст"""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self._state(), name)
+
+    def traced(self, name: Optional[str] = None):
+        """Декоратор: вызов функции - спан (по умолчанию с именем функции)"""
+        def decorator(func: Callable):
+            span_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self._state(), span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            for state in self._states:
+                state.stats = {}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{путь через ';': {'count', 'total_ms', 'self_ms', 'mean_ms'}}"""
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        with self._lock:
+            states = list(self._states)
+        for state in states:
+            for path, entry in list(state.stats.items()):
+                total = merged.setdefault(path, [0, 0.0, 0.0])
+                for i in range(3):
+                    total[i] += entry[i]
+        result = {}
+        for path, (count, total, children) in sorted(merged.items()):
+            if not count:
+                continue
+            result[';'.join(path)] = {
+                'count': count,
+                'total_ms': total * 1000,
+                'self_ms': max(0.0, total - children) * 1000,
+                'mean_ms': total / count * 1000,
+            }
+        return result
+
+    def folded(self) -> List[str]:
+        """Собственное время путей в мкс в folded-формате (flamegraph по спанам)"""
+        return [f"{path} {int(entry['self_ms'] * 1000)}"
+                for path, entry in self.stats().items() if entry['self_ms'] > 0]
+
+    def report(self, top: int = 30) -> str:
+        """Дерево спанов, отсортированное по пути, для лога"""
+        lines = [f"{'Спан':<60} | {'вызовов':>7} | {'всего, мс':>10} | {'своё, мс':>9}"]
+        for path, entry in list(self.stats().items())[:top]:
+            depth = path.count(';')
+            label = '  ' * depth + path.rsplit(';', 1)[-1]
+            lines.append(f"{label:<60} | {entry['count']:>7} | {entry['total_ms']:>10.1f} | "
+                         f"{entry['self_ms']:>9.1f}")
+        return '\n'.join(lines)
+
+
+tracer = Tracer(enabled=os.environ.get('TRACE_SPANS', '').lower() in ('1', 'true', 'yes'))
+span = tracer.span
+traced = tracer.traced
+
+
+# === СЭМПЛИРОВАНИЕ ===
+# Обёртки декораторов спанов и стадий в стеке только мешают читать flamegraph
+WRAPPER_FILES = frozenset({'profiling.py', 'bot_clock.py'})
+
+
+def _frame_label(code) -> str:
+    filename = os.path.basename(code.co_filename)
+    if code.co_name == 'wrapper' and filename in WRAPPER_FILES:
+        return ''
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Фоновый поток снимает стек потока thread_id раз в interval секунд"""
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None,
+                 skip_idle: bool = True, max_depth: int = 128):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.skip_idle = skip_idle
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self.idle_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Подписи кадров кэшируются по code object - стек снимается без форматирования строк
+        self._labels: Dict[object, str] = {}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            if self.skip_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                self.idle_samples += 1
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = _frame_label(code)
+                if label:
+                    stack.append(label)
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[';'.join(stack)] += 1
+
+    def folded(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.samples.most_common()]
+
+    def write(self, path: str) -> int:
+        """Записать свёрнутые стеки; возвращает число сэмплов"""
+        _write_lines(path, self.folded())
+        return sum(self.samples.values())
+
+
+def _write_lines(path: str, lines: Iterable[str]):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+
+# === ПРОФИЛИРОВАНИЕ ЦИКЛОВ ===
+class CycleProfiler:
+    """
+    Сэмплирование и спаны на cycles циклов main_loop
+
+    next_cycle() вызывается в начале каждого цикла: первый вызов запускает
+    профилирование, вызов после cycles-го останавливает его и пишет файлы
+    (output и output со спанами: profile.folded / profile.spans.folded).
+    """
+
+    def __init__(self, cycles: int, output: str = DEFAULT_OUTPUT, interval: float = 0.005,
+                 trace: Optional[Tracer] = None):
+        self.cycles = cycles
+        self.output = output
+        self.tracer = trace or tracer
+        self.sampler = SamplingProfiler(interval)
+        self.completed = -1
+        self._tracer_was_enabled = self.tracer.enabled
+
+    @classmethod
+    def from_env(cls) -> Optional['CycleProfiler']:
+        """PROFILE_CYCLES, PROFILE_OUTPUT, PROFILE_INTERVAL; None - профилирование не заказано"""
+        cycles = int(os.environ.get('PROFILE_CYCLES', 0) or 0)
+        if cycles <= 0:
+            return None
+        return cls(cycles, os.environ.get('PROFILE_OUTPUT', DEFAULT_OUTPUT),
+                   float(os.environ.get('PROFILE_INTERVAL', 0.005)))
+
+    @property
+    def spans_output(self) -> str:
+        root, ext = os.path.splitext(self.output)
+        return f"{root}.spans{ext or '.folded'}"
+
+    def next_cycle(self) -> bool:
+        """Отметить начало цикла; False - профилирование закончено"""
+        self.completed += 1
+        if self.completed == 0:
+            self.tracer.reset()
+            self.tracer.enabled = True
+            self.sampler.start()
+            logger.info(f"Profiling {self.cycles} cycles -> {self.output}")
+            return True
+        if self.completed < self.cycles:
+            return True
+        self.finish()
+        return False
+
+    def finish(self):
+        """Остановить и записать результаты (повторный вызов ничего не делает)"""
+        if self.sampler._thread is None:
+            return
+        self.sampler.stop()
+        self.tracer.enabled = self._tracer_was_enabled
+        samples = self.sampler.write(self.output)
+        _write_lines(self.spans_output, self.tracer.folded())
+        logger.info(f"Profile written: {self.output} ({samples} samples, "
+                    f"{self.sampler.idle_samples} idle skipped), spans: {self.spans_output}\n"
+                    f"{self.tracer.report()}")
+
+
+# Пример использования
+if __name__ == "__main__":
+    import tempfile
+
+    import numpy as np
+
+    demo_tracer = Tracer()
+
+    @demo_tracer.traced('indicators')
+    def indicators(values):
+        return np.convolve(values, np.ones(20) / 20, mode='valid')
+
+    @demo_tracer.traced('strategy')
+    def strategy(values):
+        smooth = indicators(values)
+        with demo_tracer.span('logic'):
+            return float(np.sign(smooth[-1] - smooth[-2]))
+
+    values = np.random.default_rng(1).normal(size=5000).cumsum()
+
+    started = time.perf_counter()
+    for _ in range(20_000):
+        strategy(values)
+    disabled = time.perf_counter() - started
+
+    demo_tracer.enabled = True
+    started = time.perf_counter()
+    for _ in range(20_000):
+        strategy(values)
+    enabled = time.perf_counter() - started
+    print(f"⏱ 20к вызовов: спаны выключены {disabled:.2f}с, включены {enabled:.2f}с")
+    print(demo_tracer.report())
+
+    sampler = SamplingProfiler(interval=0.001)
+    sampler.start()
+    for _ in range(20_000):
+        strategy(values)
+    sampler.stop()
+    output = os.path.join(tempfile.gettempdir(), 'profile_demo.folded')
+    print(f"🔥 {sampler.write(output)} сэмплов -> {output}")
+    for line in sampler.folded()[:3]:
+        print(f"   {line[-120:]}")
@@ -0,0 +1,213 @@
+"""
+Replay Harness - Прогон live-стратегий по истории
+
+Функции стратегий из sol_signal_bot (то, что реально работает в проде)
+получают историю скользящим окном бар за баром, как в main_loop, а
+сигналы записываются. Так проверяется код бота, а не его копия из
+backtest_bot, которая со временем разошлась с оригиналом.
+
+Быстрый режим (по умолчанию):
+- индикаторы считаются один раз на всей истории (add_*_indicators) -
+  EMA/ATR/ADX рекуррентные, значение на баре зависит только от прошлого
+- стратегии получают срез iloc без копирования и precomputed=True,
+  поэтому ta на каждом окне не пересчитывается
+
+Точный режим (exact=True): стратегия получает копию окна и сама считает
+индикаторы, как в проде. Рекуррентные индикаторы на коротком окне
+стартуют заново, поэтому значения на первых барах окна немного отличаются
+от посчитанных на всей истории - точный режим воспроизводит это
+побитово, но работает на порядки медленнее.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+import sol_signal_bot as bot
+
+logger = logging.getLogger(__name__)
+
+REPLAY_COLUMNS = ['index', 'timestamp', 'signal', 'entry', 'sl_distance', 'tp_distance', 'atr', 'rr']
+
+# Live-стратегии и их копии из backtest_bot (у гибридной копии нет)
+LIVE_STRATEGIES = {
+    '4h Turtle': bot.strategy_4h_turtle,
+    '4h Hybrid': bot.strategy_4h_hybrid,
+    '12h Momentum': bot.strategy_12h_momentum,
+    '1d Trend': bot.strategy_1d_trend,
+    'Range Trading': bot.strategy_range_trading,
+}
+BACKTEST_COUNTERPARTS = {
+    '4h Turtle': 'strategy_4h_turtle',
+    '12h Momentum': 'strategy_12h_momentum',
+    '1d Trend': 'strategy_1d_trend',
+    'Range Trading': 'strategy_range_trading',
+}
+
+
+@contextmanager
+def quiet_bot_logs(level: int = logging.WARNING):
+    """Стратегии пишут в лог каждый сигнал - на тысячах баров это лишнее"""
+    previous = bot.logger.level
+    bot.logger.setLevel(level)
+    try:
+        yield
+    finally:
+        bot.logger.setLevel(previous)
+
+
+def replay_strategy(
+    df: pd.DataFrame,
+    strategy_func: Callable,
+    window: int = 100,
+    exact: bool = False,
+    start: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Прогон live-стратегии по истории
+
+    Args:
+        df: OHLCV история (timestamp, open, high, low, close, volume)
+        strategy_func: Стратегия из sol_signal_bot
+        window: Длина окна, которое видит стратегия (как limit в timeframes)
+        exact: Пересчитывать индикаторы на каждом окне (как в проде)
+        start: Первый бар, на котором спрашиваем стратегию (по умолчанию window - 1)
+
+    Returns:
+        DataFrame сигналов (REPLAY_COLUMNS), index - номер бара в df
+    """
+    frame = df.reset_index(drop=True)
+    if not exact:
+        indicators = bot.STRATEGY_INDICATORS.get(strategy_func)
+        if indicators is None:
+            raise ValueError(f"Нет функции индикаторов для {strategy_func.__name__}")
+        frame = indicators(frame.copy())
+
+    timestamps = frame['timestamp'].to_numpy()
+    first = max(window - 1, start or 0)
+    records = []
+
+    with quiet_bot_logs():
+        for i in range(first, len(frame)):
+            if exact:
+                signal, params = strategy_func(frame.iloc[i - window + 1:i + 1].copy())
+            else:
+                signal, params = strategy_func(frame.iloc[i - window + 1:i + 1], precomputed=True)
+
+            if not signal or not params:
+                continue
+
+            records.append((
+                i, timestamps[i], signal,
+                float(params['entry']), float(params['sl_distance']),
+                float(params['tp_distance']), float(params['atr']),
+                params['tp_distance'] / params['sl_distance']
+            ))
+
+    return pd.DataFrame.from_records(records, columns=REPLAY_COLUMNS)
+
+
+def to_signal_frame(df: pd.DataFrame, replay_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Сигналы replay в формате backtest_bot (signal 1/-1/0, sl_distance, tp_distance)
+
+    Результат можно сразу передать в simulate_trades / walk_forward / портфель.
+    """
+    result = df.reset_index(drop=True)[['timestamp', 'open', 'high', 'low', 'close', 'volume']].copy()
+    signal = np.zeros(len(result), dtype=np.int64)
+    sl_distance = np.zeros(len(result))
+    tp_distance = np.zeros(len(result))
+
+    idx = replay_df['index'].to_numpy(dtype=np.int64)
+    signal[idx] = np.where(replay_df['signal'].to_numpy() == 'LONG', 1, -1)
+    sl_distance[idx] = replay_df['sl_distance'].to_numpy()
+    tp_distance[idx] = replay_df['tp_distance'].to_numpy()
+
+    result['signal'] = signal
+    result['sl_distance'] = sl_distance
+    result['tp_distance'] = tp_distance
+    return result
+
+
+def compare_with_backtest(live_frame: pd.DataFrame, backtest_frame: pd.DataFrame) -> Dict:
+    """
+    Расхождения сигналов live-стратегии и её копии из backtest_bot
+
+    Args:
+        live_frame: Результат to_signal_frame
+        backtest_frame: Результат стратегии из backtest_bot на той же истории
+
+    Returns:
+        Dict со счётчиками и DataFrame баров, где сигналы различаются
+    """
+    live = live_frame['signal'].to_numpy()
+    backtest = backtest_frame['signal'].to_numpy()
+    differ = live != backtest
+
+    mismatches = pd.DataFrame({
+        'timestamp': live_frame['timestamp'].to_numpy()[differ],
+        'live': live[differ],
+        'backtest': backtest[differ],
+    })
+
+    return {
+        'live_signals': int((live != 0).sum()),
+        'backtest_signals': int((backtest != 0).sum()),
+        'both': int(((live != 0) & (live == backtest)).sum()),
+        'live_only': int(((live != 0) & (backtest == 0)).sum()),
+        'backtest_only': int(((live == 0) & (backtest != 0)).sum()),
+        'opposite': int(((live != 0) & (backtest != 0) & differ).sum()),
+        'mismatches': mismatches,
+    }
+
+
+def print_replay_report(name: str, symbol: str, timeframe: str, replay_df: pd.DataFrame,
+                        elapsed: float, bars: int, comparison: Optional[Dict] = None):
+    """Вывод результатов replay"""
+    longs = int((replay_df['signal'] == 'LONG').sum())
+    shorts = int((replay_df['signal'] == 'SHORT').sum())
+    passed = int((replay_df['rr'] >= bot.MIN_RISK_REWARD).sum())
+
+    print(f"\n🔄 REPLAY: {name} | {symbol} {timeframe} | {bars} свечей за {elapsed:.2f}с")
+    print(f"📊 Сигналов: {len(replay_df)} (LONG {longs} / SHORT {shorts}) | "
+          f"R:R ≥ {bot.MIN_RISK_REWARD}: {passed}")
+
+    if comparison:
+        print(f"🔍 Сравнение с backtest_bot: совпало {comparison['both']} | "
+              f"только live {comparison['live_only']} | только backtest {comparison['backtest_only']} | "
+              f"противоположные {comparison['opposite']}")
+
+
+# Пример использования
+if __name__ == "__main__":
+    import time
+
+    import backtest_bot
+    from backtest_bot import fetch_historical_data, simulate_trades, calculate_stats
+
+    symbol, timeframe = 'SOL/USDT', '4h'
+    df = fetch_historical_data(symbol, timeframe, 365)
+
+    for name in ('4h Turtle', '4h Hybrid', 'Range Trading'):
+        strategy_func = LIVE_STRATEGIES[name]
+
+        started = time.perf_counter()
+        replay_df = replay_strategy(df, strategy_func, window=bot.timeframes[timeframe])
+        elapsed = time.perf_counter() - started
+
+        live_frame = to_signal_frame(df, replay_df)
+        comparison = None
+        if name in BACKTEST_COUNTERPARTS:
+            backtest_func = getattr(backtest_bot, BACKTEST_COUNTERPARTS[name])
+            comparison = compare_with_backtest(live_frame, backtest_func(df))
+
+        print_replay_report(name, symbol, timeframe, replay_df, elapsed, len(df), comparison)
+
+        trades, balance = simulate_trades(live_frame)
+        if trades:
+            stats = calculate_stats(pd.DataFrame(trades), balance)
+            print(f"💰 Live-код в бэктесте: {stats['total']} сделок | WR {stats['wr']:.1f}% | "
+                  f"ROI {stats['roi']:+.1f}% | DD {stats['max_dd']:.1f}%")
@@ -0,0 +1,325 @@
+"""
+Result Cache - Кэш результатов стратегий и бэктестов на диске
+
+Ключ результата - хеш содержимого:
+- свечи (диапазон дат, количество и сами данные OHLCV)
+- версия функции стратегии (хеш исходного кода)
+- параметры стратегии
+- настройки движка бэктеста и версия его кода
+
+При повторном запуске пересчитываются только комбинации, у которых
+изменилась хотя бы одна часть ключа. Чтобы ключ не менялся от запуска к
+запуску, свечи берутся за закреплённый диапазон (pinned_range - до
+последней закрытой свечи) и сами кэшируются по (пара, таймфрейм, начало,
+конец). Старые и лишние записи удаляет evict() - по возрасту и по
+общему размеру, начиная с давно не использованных.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Увеличить при несовместимом изменении формата кэша
+CACHE_VERSION = 1
+
+SIGNAL_COLUMNS = ['signal', 'sl_distance', 'tp_distance']
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+CACHE_KINDS = ('ohlcv', 'signals', 'backtests')
+DAY_MS = 86400 * 1000
+
+
+def pinned_range(timeframe_seconds: int, days: int, now_ms: int) -> Tuple[int, int]:
+    """
+    Диапазон [start_ms, end_ms) в мс эпохи: days дней до начала текущей
+    (ещё не закрытой) свечи - одинаковый для всех запусков в пределах свечи
+    """
+    timeframe_ms = timeframe_seconds * 1000
+    end_ms = now_ms // timeframe_ms * timeframe_ms
+    return end_ms - days * DAY_MS, end_ms
+
+
+def _json_default(value):
+    """numpy-типы и Timestamp для json"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+def data_fingerprint(df: pd.DataFrame) -> Dict:
+    """Отпечаток свечей: диапазон + хеш данных"""
+    digest = hashlib.sha256()
+    for column in OHLCV_COLUMNS:
+        if column not in df.columns:
+            continue
+        if column == 'timestamp':
+            values = df[column].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        else:
+            values = df[column].to_numpy(dtype=np.float64)
+        digest.update(np.ascontiguousarray(values).tobytes())
+
+    return {
+        'start': str(df['timestamp'].iloc[0]) if len(df) else None,
+        'end': str(df['timestamp'].iloc[-1]) if len(df) else None,
+        'bars': len(df),
+        'sha256': digest.hexdigest()
+    }
+
+
+def function_version(*funcs: Callable) -> str:
+    """Хеш исходного кода функций (меняется при любой правке кода)"""
+    digest = hashlib.sha256()
+    for func in funcs:
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = func.__code__.co_code.hex()
+        digest.update(f"{func.__module__}.{func.__qualname__}\n{source}".encode())
+    return digest.hexdigest()[:16]
+
+
+def make_key(**parts) -> str:
+    """Ключ результата из произвольных частей"""
+    payload = json.dumps({'cache_version': CACHE_VERSION, **parts}, sort_keys=True, default=_json_default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Хранилище результатов: колонки сигналов в .npz, статистика в .json,
+    сделки в .pkl. Запись атомарная (временный файл + rename).
+    """
+
+    def __init__(self, cache_dir: str = 'backtest_cache', enabled: bool = True,
+                 max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        """
+        Args:
+            max_bytes: Предел общего размера для evict() (None - без предела)
+            max_age_days: Записи, не использованные дольше, удаляет evict()
+        """
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        if enabled:
+            for kind in CACHE_KINDS:
+                os.makedirs(os.path.join(cache_dir, kind), exist_ok=True)
+
+    def _path(self, kind: str, key: str, ext: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return os.path.join(self.cache_dir, kind, f"{key}{ext}")
+
+    def _atomic_write(self, path: str, writer: Callable):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            writer(tmp)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _touch(*paths: str):
+        """Время изменения - время последнего использования (для evict)"""
+        for path in paths:
+            if os.path.exists(path):
+                os.utime(path)
+
+    def ohlcv(self, symbol: str, timeframe: str, start_ms: int, end_ms: int,
+              fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Свечи [start_ms, end_ms) из кэша или через fetch()
+
+        Лишние свечи из fetch() (раньше start_ms или с end_ms) отбрасываются.
+        В кэш попадают только свечи на весь диапазон: пустой или обрезанный
+        ответ (сбой, лимит запросов) возвращается, но не сохраняется.
+        """
+        key = make_key(kind='ohlcv', symbol=symbol, timeframe=timeframe, start=start_ms, end=end_ms)
+        path = self._path('ohlcv', key, '.pkl')
+
+        if self.enabled and os.path.exists(path):
+            try:
+                df = pd.read_pickle(path)
+                self._touch(path)
+                self.hits += 1
+                logger.info(f"📦 Кэш свечей: {symbol} {timeframe} ({key[:10]})")
+                return df
+            except Exception as e:
+                logger.warning(f"Повреждённый кэш свечей {key[:10]}: {e}")
+
+        self.misses += 1
+        df = fetch()
+        timestamps = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        inside = (timestamps >= start_ms) & (timestamps < end_ms)
+        df = df[inside].reset_index(drop=True)
+        timestamps = timestamps[inside]
+
+        if self.enabled:
+            timeframe_ms = timeframe_to_seconds(timeframe) * 1000
+            if (len(timestamps) and timestamps[0] - start_ms < timeframe_ms
+                    and timestamps[-1] + timeframe_ms >= end_ms):
+                self._atomic_write(path, df.to_pickle)
+            else:
+                logger.warning(f"Свечи {symbol} {timeframe} не покрывают диапазон "
+                               f"({len(df)} шт.) - в кэш не сохранены")
+        return df
+
+    def signals_key(self, strategy_func: Callable, df: pd.DataFrame, params: Optional[Dict] = None) -> str:
+        return make_key(
+            kind='signals',
+            data=data_fingerprint(df),
+            strategy=function_version(strategy_func),
+            params=params or {}
+        )
+
+    def strategy_signals(self, strategy_func: Callable, df: pd.DataFrame,
+                         params: Optional[Dict] = None) -> Tuple[pd.DataFrame, str]:
+        """
+        Применяет стратегию или берёт её сигналы из кэша
+
+        При попадании в кэш возвращается исходный df с колонками
+        signal/sl_distance/tp_distance (без промежуточных индикаторов).
+
+        Returns:
+            (df с сигналами, ключ сигналов)
+        """
+        key = self.signals_key(strategy_func, df, params)
+        path = self._path('signals', key, '.npz')
+
+        if self.enabled and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    result = df.copy()
+                    for column in SIGNAL_COLUMNS:
+                        result[column] = data[column]
+                self._touch(path)
+                self.hits += 1
+                logger.info(f"📦 Кэш сигналов: {strategy_func.__name__} ({key[:10]})")
+                return result, key
+            except Exception as e:
+                logger.warning(f"Повреждённый кэш сигналов {key[:10]}: {e}")
+
+        self.misses += 1
+        result = strategy_func(df, **params) if params else strategy_func(df)
+
+        if self.enabled:
+            arrays = {column: result[column].to_numpy() for column in SIGNAL_COLUMNS}
+
+            def write_signals(tmp):
+                with open(tmp, 'wb') as f:
+                    np.savez(f, **arrays)
+
+            self._atomic_write(path, write_signals)
+
+        return result, key
+
+    def backtest(self, signals_key: str, engine_settings: Dict,
+                 run: Callable[[], Tuple[Optional[pd.DataFrame], Dict]],
+                 engine_version: str = '') -> Tuple[Optional[pd.DataFrame], Dict, bool]:
+        """
+        Результат бэктеста из кэша или через run()
+
+        Returns:
+            (trades_df, stats, был ли результат взят из кэша)
+        """
+        key = make_key(kind='backtest', signals=signals_key, engine=engine_settings,
+                       engine_version=engine_version)
+        stats_path = self._path('backtests', key, '.json')
+        trades_path = self._path('backtests', key, '.pkl')
+
+        if self.enabled and os.path.exists(stats_path):
+            try:
+                with open(stats_path, 'r') as f:
+                    stats = json.load(f)
+                trades_df = pd.read_pickle(trades_path) if os.path.exists(trades_path) else None
+                self._touch(stats_path, trades_path)
+                self.hits += 1
+                return trades_df, stats, True
+            except Exception as e:
+                logger.warning(f"Повреждённый кэш бэктеста {key[:10]}: {e}")
+
+        self.misses += 1
+        trades_df, stats = run()
+
+        if self.enabled:
+            def write_stats(tmp):
+                with open(tmp, 'w') as f:
+                    json.dump(stats, f, indent=2, default=_json_default)
+
+            if trades_df is not None:
+                self._atomic_write(trades_path, trades_df.to_pickle)
+            self._atomic_write(stats_path, write_stats)
+
+        return trades_df, stats, False
+
+    # === ОЧИСТКА ===
+    def _entries(self) -> List[Tuple[float, int, List[str]]]:
+        """Записи кэша: (последнее использование, байт, файлы) - файлы одного ключа вместе"""
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for kind in CACHE_KINDS:
+            directory = os.path.join(self.cache_dir, kind)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                stem = name.split('.', 1)[0]
+                groups.setdefault((kind, stem), []).append(os.path.join(directory, name))
+
+        entries = []
+        for paths in groups.values():
+            try:
+                stats = [os.stat(path) for path in paths]
+            except FileNotFoundError:
+                continue
+            entries.append((max(st.st_mtime for st in stats), sum(st.st_size for st in stats), paths))
+        return entries
+
+    def evict(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """
+        Удалить записи старше max_age_days, затем давно не использованные,
+        пока кэш больше max_bytes (по умолчанию - значения из конструктора)
+
+        Returns:
+            Удалено записей
+        """
+        if not self.enabled:
+            return 0
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        removed = 0
+        for used, size, paths in entries:
+            expired = cutoff is not None and used < cutoff
+            oversized = max_bytes is not None and total > max_bytes
+            if not (expired or oversized):
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"🧹 Кэш результатов: удалено {removed} записей, осталось {total / 1024 / 1024:.1f} МБ")
+        return removed
@@ -0,0 +1,272 @@
+"""
+Shard Coordinator - Пары (symbol, timeframe) делятся между инстансами бота
+
+Один процесс проверял все пары. Здесь несколько инстансов делят их через
+общую базу SQLite (локальный файл или общий диск с рабочими блокировками):
+
+- instances - инстанс раз в heartbeat_interval продлевает аренду
+  (lease_seconds); не продливший вовремя считается упавшим
+- rendezvous hashing: шард достаётся живому инстансу с наибольшим
+  hash(инстанс, шард). Уходит инстанс - переезжают только его шарды,
+  приходит - примерно 1/N шардов остальных
+- shard_leases - аренда шарда: инстанс берёт свой по хешу шард, только
+  если тот свободен или его аренда истекла, а чужие по хешу отпускает.
+  При перебалансировке шард не бывает своим у двух инстансов сразу
+  (при сверенных часах узлов)
+- sent_signals - общий кулдаун сигналов: claim_signal(key, cooldown)
+  проходит у одного инстанса, у остальных - нет. На стыке
+  перебалансировки сигнал всё равно уходит ровно один раз
+
+Все изменения - в транзакциях BEGIN IMMEDIATE, база в режиме WAL.
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import bot_clock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join('bot_data', 'shards.sqlite3')
+DEFAULT_LEASE = 120.0
+# Записи кулдауна хранятся неделю - дальше они ни на что не влияют
+DEDUP_RETENTION = 7 * 86400
+PRUNE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    instance_id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shard_leases (
+    shard TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sent_signals (
+    key TEXT PRIMARY KEY,
+    instance_id TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+"""
+
+
+# === РАСПРЕДЕЛЕНИЕ ШАРДОВ ===
+def shard_key(symbol: str, timeframe: str) -> str:
+    return f"{symbol}|{timeframe}"
+
+
+def _weight(instance_id: str, shard: str) -> int:
+    digest = hashlib.blake2b(f"{instance_id}|{shard}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def rendezvous_owner(shard: str, instances: Sequence[str]) -> Optional[str]:
+    """Владелец шарда по rendezvous hashing; None - живых инстансов нет"""
+    return max(instances, key=lambda instance_id: _weight(instance_id, shard), default=None)
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# === КООРДИНАТОР ===
+class ShardCoordinator:
+    """Аренда шардов и общий кулдаун сигналов для одного инстанса"""
+
+    def __init__(self, path: str, shards: Iterable[Tuple[str, str]], instance_id: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE, heartbeat_interval: Optional[float] = None,
+                 dedup_retention: float = DEDUP_RETENTION):
+        """
+        Args:
+            path: Файл SQLite, общий для всех инстансов
+            shards: Все пары (symbol, timeframe) - у инстансов должны совпадать
+            instance_id: Имя инстанса (по умолчанию хост-pid)
+            lease_seconds: Через сколько без heartbeat инстанс и его шарды свободны
+            heartbeat_interval: Период продления (по умолчанию четверть аренды)
+            dedup_retention: Сколько секунд хранить записи отправленных сигналов
+        """
+        self.path = path
+        self.shards = sorted({shard_key(symbol, timeframe) for symbol, timeframe in shards})
+        self.instance_id = instance_id or default_instance_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval or lease_seconds / 4
+        self.dedup_retention = dedup_retention
+        self.owned: FrozenSet[str] = frozenset()
+        self.live: Tuple[str, ...] = ()
+        self._valid_until = float('-inf')
+        self._pruned = float('-inf')
+        # Соединение открывается при первом обращении - не до fork пулов процессов
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    # === АРЕНДА ===
+    def heartbeat(self) -> FrozenSet[str]:
+        """Продлить аренду инстанса, перераспределить шарды; возвращает свои шарды"""
+        me = self.instance_id
+        now = bot_clock.time()
+        expires = now + self.lease_seconds
+        with self._transaction() as db:
+            db.execute('INSERT INTO instances VALUES (?, ?, ?) '
+                       'ON CONFLICT(instance_id) DO UPDATE SET expires = excluded.expires', (me, now, expires))
+            db.execute('DELETE FROM instances WHERE expires < ?', (now,))
+            live = tuple(sorted(row[0] for row in db.execute('SELECT instance_id FROM instances')))
+            desired = {shard for shard in self.shards if rendezvous_owner(shard, live) == me}
+
+            # Чужие по хешу шарды отпускаем сразу - новый владелец возьмёт их на своём heartbeat
+            held = {row[0] for row in db.execute('SELECT shard FROM shard_leases WHERE owner = ?', (me,))}
+            db.executemany('DELETE FROM shard_leases WHERE shard = ? AND owner = ?',
+                           [(shard, me) for shard in held - desired])
+            # Свой шард берём, только если он свободен или аренда прежнего владельца истекла
+            db.executemany('INSERT INTO shard_leases VALUES (?, ?, ?) '
+                           'ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires = excluded.expires '
+                           'WHERE shard_leases.owner = excluded.owner OR shard_leases.expires < ?',
+                           [(shard, me, expires, now) for shard in sorted(desired)])
+            owned = frozenset(row[0] for row in db.execute(
+                'SELECT shard FROM shard_leases WHERE owner = ? AND expires >= ?', (me, expires)))
+
+            if now - self._pruned >= PRUNE_INTERVAL:
+                db.execute('DELETE FROM sent_signals WHERE sent_at < ?', (now - self.dedup_retention,))
+                self._pruned = now
+
+        if owned != self.owned or live != self.live:
+            waiting = len(desired) - len(owned)
+            logger.info(f"Shards {me}: {len(owned)}/{len(self.shards)}, instances {len(live)}"
+                        + (f", waiting for {waiting} leases" if waiting else ""))
+        self.owned, self.live, self._valid_until = owned, live, expires
+        return owned
+
+    def owns(self, symbol: str, timeframe: str) -> bool:
+        """Шард свой и аренда не истекла (heartbeat не проходит - инстанс перестаёт работать)"""
+        return shard_key(symbol, timeframe) in self.owned and bot_clock.time() < self._valid_until
+
+    def owned_symbols(self, symbols: Iterable[str], timeframe: str) -> List[str]:
+        return [symbol for symbol in symbols if self.owns(symbol, timeframe)]
+
+    # === ОТПРАВЛЕННЫЕ СИГНАЛЫ ===
+    def claim_signal(self, key: str, cooldown: float) -> bool:
+        """
+        Занять отправку сигнала key: True - ни один инстанс не отправлял его
+        последние cooldown секунд (теперь отправка числится за этим инстансом)
+        """
+        now = bot_clock.time()
+        with self._transaction() as db:
+            cursor = db.execute('INSERT INTO sent_signals VALUES (?, ?, ?) '
+                                'ON CONFLICT(key) DO UPDATE SET instance_id = excluded.instance_id, '
+                                'sent_at = excluded.sent_at WHERE sent_signals.sent_at <= ?',
+                                (key, self.instance_id, now, now - cooldown))
+            return cursor.rowcount == 1
+
+    # === ЖИЗНЕННЫЙ ЦИКЛ ===
+    def start(self):
+        """Первый heartbeat сразу, дальше - в фоновом потоке"""
+        self.heartbeat()
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='shard-heartbeat', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except sqlite3.Error as e:
+                # Аренда истечёт сама - owns() вернёт False, шарды заберут другие
+                logger.error(f"Shard heartbeat failed: {e}")
+
+    def close(self):
+        """Выйти из группы: шарды сразу достаются остальным на их heartbeat"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            with self._transaction() as db:
+                db.execute('DELETE FROM shard_leases WHERE owner = ?', (self.instance_id,))
+                db.execute('DELETE FROM instances WHERE instance_id = ?', (self.instance_id,))
+        except sqlite3.Error as e:
+            logger.error(f"Shard release failed: {e}")
+        self.owned = frozenset()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def status(self) -> Dict:
+        return {
+            'instance': self.instance_id,
+            'instances': len(self.live),
+            'owned': len(self.owned),
+            'shards': len(self.shards),
+        }
+
+
+# Пример использования
+if __name__ == "__main__":
+    import tempfile
+    from datetime import datetime
+
+    clock = bot_clock.SimulatedClock(datetime(2024, 1, 1))
+    bot_clock.install(clock)
+
+    symbols = [f"COIN{i}/USDT" for i in range(30)]
+    shards = [(symbol, timeframe) for symbol in symbols for timeframe in ('4h', '12h', '1d')]
+    path = os.path.join(tempfile.mkdtemp(), 'shards.sqlite3')
+    nodes = {name: ShardCoordinator(path, shards, name, lease_seconds=60) for name in ('a', 'b', 'c')}
+
+    def show(label):
+        print(f"{label}: " + ", ".join(f"{name} {len(node.owned)}" for name, node in nodes.items()))
+        owned = [shard for node in nodes.values() for shard in node.owned]
+        print(f"   занято {len(set(owned))}/{len(shards)}, у двух инстансов сразу: {len(owned) - len(set(owned))}")
+
+    for _ in range(2):
+        for node in nodes.values():
+            node.heartbeat()
+    show("🧩 Три инстанса")
+
+    # c перестаёт отвечать: его шарды свободны после аренды
+    dead = nodes.pop('c')
+    before = {name: set(node.owned) for name, node in nodes.items()}
+    clock.sleep(61)
+    for _ in range(2):
+        for node in nodes.values():
+            node.heartbeat()
+    moved = sum(len(before[name] - node.owned) for name, node in nodes.items())
+    show(f"💀 c упал (у живых не переехало ни одного своего шарда: {moved == 0})")
+
+    claims = [node.claim_signal('COIN1/USDT_4h_LONG', 3600) for node in (*nodes.values(), dead)]
+    print(f"📨 Сигнал занят: {claims} | через час снова: "
+          f"{clock.sleep(3600) or nodes['b'].claim_signal('COIN1/USDT_4h_LONG', 3600)}")
+    for node in nodes.values():
+        node.close()
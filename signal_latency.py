@@ -0,0 +1,296 @@
+"""
+Signal Latency - Задержка сигнала от закрытия свечи до доставки в Telegram
+
+Важно не то, сколько считается стратегия, а через сколько после закрытия
+4h свечи сигнал оказывается в Telegram: check_intervals, паузы между
+парами и таймфреймами, отрисовка графика и очередь отправки складываются
+в десятки минут, которых раньше никто не видел. Здесь:
+
+- SignalTrace - закрытие последней закрытой свечи в данных и моменты
+  стадий конвейера (секунды эпохи по bot_clock): fetch - свечи получены,
+  decision - стратегия посчитана, chart - график готов, queued - сообщение
+  в очереди Telegram, delivery - доставлено первому получателю
+- LatencyTracker - распределения "закрытие -> стадия" по таймфреймам:
+  гистограмма Prometheus signal_bot_signal_latency_seconds и последние
+  window значений для p50/p95 в health check. fetch и decision
+  учитываются один раз на новую закрытую свечу пары, стадии сигнала -
+  для первого сигнала по свече (повтор того же сигнала после кулдауна
+  на той же свече не растягивает распределение)
+- SLO: пороги "стадия <= секунд" для всех или отдельных таймфреймов
+  (LATENCY_SLO="delivery=1800,4h.delivery=900,fetch=600"); превышение
+  считается в метрике и вызывает alert не чаще alert_interval
+
+Стратегии смотрят и на незакрытую свечу, поэтому для сигнала внутри бара
+задержка отсчитывается от закрытия предыдущей - "сколько свеча ждала".
+"""
+
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+import bot_clock
+import metrics
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('fetch', 'decision', 'chart', 'queued', 'delivery')
+# Учитываются для первого сигнала по свече, а не для первого прохода по ней
+SIGNAL_STAGES = frozenset({'chart', 'queued', 'delivery'})
+# Стадии в health check
+SUMMARY_STAGES = ('fetch', 'decision', 'delivery')
+
+DEFAULT_SLO = 'delivery=1800'
+DEFAULT_WINDOW = 200
+LATENCY_BUCKETS = (30.0, 60.0, 120.0, 300.0, 600.0, 900.0, 1800.0, 3600.0, 7200.0, 14400.0)
+
+LATENCY_SECONDS = metrics.histogram('signal_bot_signal_latency_seconds', 'От закрытия свечи до стадии',
+                                    ['timeframe', 'stage'], buckets=LATENCY_BUCKETS)
+SLO_BREACHES = metrics.counter('signal_bot_latency_slo_breaches', 'Превышения SLO задержки',
+                               ['timeframe', 'stage'])
+
+SloKey = Tuple[Optional[str], str]
+
+
+def parse_slo(spec: str) -> Dict[SloKey, float]:
+    """
+    'delivery=1800,4h.delivery=900' -> {(None, 'delivery'): 1800, ('4h', 'delivery'): 900}
+
+    None вместо таймфрейма - порог для всех таймфреймов без своего
+    """
+    slo = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            key, value = part.split('=')
+            timeframe, _, stage = key.strip().rpartition('.')
+            if stage not in STAGES:
+                raise ValueError(f"стадия {stage!r} не из {STAGES}")
+            slo[(timeframe or None, stage)] = float(value)
+        except ValueError as e:
+            logger.warning(f"LATENCY_SLO: пропущено {part!r}: {e}")
+    return slo
+
+
+def last_closed_candle(last_open: float, timeframe: str, now: float) -> float:
+    """Закрытие последней закрытой свечи, если последняя в данных (last_open) ещё формируется"""
+    close = last_open + timeframe_to_seconds(timeframe)
+    return close if close <= now else last_open
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '—'
+    if seconds < 120:
+        return f"{seconds:.0f}с"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}м"
+    return f"{seconds / 3600:.1f}ч"
+
+
+class SignalTrace:
+    """Закрытие свечи и моменты стадий одного прохода пары"""
+
+    __slots__ = ('symbol', 'timeframe', 'candle_close', 'stages', 'fresh', 'first_signal')
+
+    def __init__(self, symbol: str, timeframe: str, candle_close: float, fresh: bool = True):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.candle_close = candle_close
+        self.stages: Dict[str, float] = {}
+        # Свеча увидена впервые - fetch и decision идут в распределения
+        self.fresh = fresh
+        # Первый сигнал по свече - стадии сигнала идут в распределения (None - сигнала ещё не было)
+        self.first_signal: Optional[bool] = None
+
+    def latency(self, stage: str) -> Optional[float]:
+        at = self.stages.get(stage)
+        return None if at is None else at - self.candle_close
+
+    def to_dict(self) -> Dict:
+        """Для записи сигнала: закрытие свечи (UTC) и задержки стадий в секундах"""
+        return {
+            'candle_close': datetime.fromtimestamp(self.candle_close, timezone.utc).isoformat(),
+            'latency': {stage: round(at - self.candle_close, 1) for stage, at in self.stages.items()},
+        }
+
+
+class LatencyTracker:
+    """Распределения задержек по таймфреймам и стадиям, проверка SLO"""
+
+    def __init__(self, slo: Optional[Dict[SloKey, float]] = None, window: int = DEFAULT_WINDOW,
+                 alert: Optional[Callable[[str], None]] = None, alert_interval: float = 3600.0):
+        """
+        Args:
+            slo: Пороги {(таймфрейм или None, стадия): секунды} (parse_slo)
+            window: Сколько последних значений держать для перцентилей
+            alert: Функция(текст) - сообщение о превышении SLO
+            alert_interval: Не чаще одного alert на таймфрейм и стадию
+        """
+        self.slo = dict(slo or {})
+        self.window = window
+        self.alert = alert
+        self.alert_interval = alert_interval
+        self._samples: Dict[Tuple[str, str], deque] = {}
+        self._last_close: Dict[Tuple[str, str], float] = {}
+        self._last_signal: Dict[Tuple[str, str], float] = {}
+        self._last_alert: Dict[Tuple[str, str], float] = {}
+        self.breaches: Dict[Tuple[str, str], int] = {}
+        # delivery отмечается из потоков отправки Telegram
+        self._lock = threading.Lock()
+
+    def begin(self, symbol: str, timeframe: str, last_open: float,
+              fetched_at: Optional[float] = None) -> SignalTrace:
+        """
+        Трасса прохода пары по свечам, последняя из которых открылась в last_open
+
+        fetched_at - когда свечи получены (по умолчанию сейчас)
+        """
+        now = bot_clock.time()
+        candle_close = last_closed_candle(last_open, timeframe, now)
+        key = (symbol, timeframe)
+        fresh = candle_close > self._last_close.get(key, float('-inf'))
+        if fresh:
+            self._last_close[key] = candle_close
+        trace = SignalTrace(symbol, timeframe, candle_close, fresh)
+        self.record(trace, 'fetch', now if fetched_at is None else fetched_at)
+        return trace
+
+    def record(self, trace: SignalTrace, stage: str, at: Optional[float] = None) -> Optional[float]:
+        """
+        Отметить стадию (повторная отметка игнорируется - delivery
+        засчитывается по первому получателю)
+
+        Returns:
+            Задержка от закрытия свечи или None, если стадия уже отмечена
+        """
+        if stage in trace.stages:
+            return None
+        trace.stages[stage] = bot_clock.time() if at is None else at
+        latency = trace.latency(stage)
+        if stage in SIGNAL_STAGES:
+            if trace.first_signal is None:
+                key = (trace.symbol, trace.timeframe)
+                with self._lock:
+                    trace.first_signal = trace.candle_close > self._last_signal.get(key, float('-inf'))
+                    if trace.first_signal:
+                        self._last_signal[key] = trace.candle_close
+            observe = trace.first_signal
+        else:
+            observe = trace.fresh
+        if observe:
+            self._observe(trace, stage, latency)
+        return latency
+
+    def _observe(self, trace: SignalTrace, stage: str, latency: float):
+        key = (trace.timeframe, stage)
+        LATENCY_SECONDS.labels(*key).observe(latency)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency)
+
+        threshold = self.threshold(*key)
+        if threshold is None or latency <= threshold:
+            return
+        SLO_BREACHES.labels(*key).inc()
+        now = bot_clock.time()
+        with self._lock:
+            self.breaches[key] = self.breaches.get(key, 0) + 1
+            if now - self._last_alert.get(key, float('-inf')) < self.alert_interval:
+                return
+            self._last_alert[key] = now
+        logger.warning(f"Latency SLO breach {trace.symbol} {trace.timeframe} {stage}: "
+                       f"{latency:.0f}s > {threshold:.0f}s")
+        if self.alert is not None:
+            try:
+                self.alert(self.format_alert(trace, stage, latency, threshold))
+            except Exception as e:
+                logger.error(f"Latency alert failed: {e}")
+
+    def threshold(self, timeframe: str, stage: str) -> Optional[float]:
+        """Порог SLO: сначала для таймфрейма, потом общий"""
+        threshold = self.slo.get((timeframe, stage))
+        return self.slo.get((None, stage)) if threshold is None else threshold
+
+    def percentiles(self, timeframe: str, stage: str) -> Optional[Dict[str, float]]:
+        """{'count', 'p50', 'p95', 'max'} по последним window значениям или None"""
+        with self._lock:
+            samples = self._samples.get((timeframe, stage))
+            values = np.array(samples) if samples else None
+        if values is None:
+            return None
+        p50, p95 = np.percentile(values, [50, 95])
+        return {'count': len(values), 'p50': float(p50), 'p95': float(p95), 'max': float(values.max())}
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{таймфрейм: {стадия: перцентили + 'slo' и 'breaches'}}"""
+        with self._lock:
+            keys = sorted(self._samples)
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for timeframe, stage in keys:
+            entry = self.percentiles(timeframe, stage)
+            if entry is None:
+                continue
+            entry['slo'] = self.threshold(timeframe, stage)
+            entry['breaches'] = self.breaches.get((timeframe, stage), 0)
+            result.setdefault(timeframe, {})[stage] = entry
+        return result
+
+    def format_summary(self, stages=SUMMARY_STAGES) -> str:
+        """Строки для health check: p50/p95 закрытие -> стадия по таймфреймам"""
+        lines = []
+        for timeframe, by_stage in self.summary().items():
+            parts = []
+            for stage in stages:
+                entry = by_stage.get(stage)
+                if entry is None:
+                    continue
+                mark = '⚠️' if entry['slo'] is not None and entry['p95'] > entry['slo'] else ''
+                parts.append(f"{stage} {format_seconds(entry['p50'])}/{format_seconds(entry['p95'])}{mark}")
+            if parts:
+                lines.append(f"`{timeframe:>3}` " + ' | '.join(parts))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def format_alert(trace: SignalTrace, stage: str, latency: float, threshold: float) -> str:
+        stages = ' → '.join(f"{name} {format_seconds(trace.latency(name))}" for name in STAGES
+                            if name in trace.stages)
+        return (
+            f"🐢 *SLO ЗАДЕРЖКИ*\n"
+            f"━━━━━━━━━━━━━━━━━━━━\n"
+            f"📊 `{trace.symbol}` `{trace.timeframe}`: закрытие свечи → {stage} "
+            f"*{format_seconds(latency)}* (порог {format_seconds(threshold)})\n"
+            f"⏱ {stages}"
+        )
+
+
+# Пример использования
+if __name__ == "__main__":
+    from bot_clock import SimulatedClock
+
+    clock = SimulatedClock(datetime(2024, 1, 1, 4, 0))
+    bot_clock.install(clock)
+    tracker = LatencyTracker(parse_slo('delivery=1800,4h.delivery=900'), alert=print)
+
+    for bar in range(6):
+        last_open = clock.time() - 3600  # последняя свеча ещё формируется
+        clock.sleep(60 + bar * 300)
+        trace = tracker.begin('SOL/USDT', '4h', last_open)
+        clock.sleep(1)
+        tracker.record(trace, 'decision')
+        clock.sleep(30)
+        tracker.record(trace, 'queued')
+        clock.sleep(5)
+        tracker.record(trace, 'delivery')
+        print(f"📨 {trace.to_dict()}")
+        clock.sleep(4 * 3600 - 96 - bar * 300)
+
+    print(tracker.format_summary())
@@ -0,0 +1,318 @@
+"""
+Signal Outcomes - Отслеживание исходов отправленных сигналов
+
+После отправки LONG/SHORT с SL/TP бот не проверял, чем всё кончилось.
+OutcomeTracker держит открытые сигналы в столбцах NumPy и на каждой
+пачке свечей, которую check_signal и так получает с биржи, одним
+векторным проходом сверяет все открытые сигналы пары/таймфрейма с
+high/low. Фиксируются TP, SL или истечение срока, реализованный R и
+время до исхода. Лишних запросов к бирже нет.
+
+Правила:
+- учитываются свечи, открывшиеся не раньше сигнала (свеча, внутри
+  которой пришёл сигнал, уже содержит движение до него)
+- SL и TP на одной свече - считается SL (консервативно)
+- без исхода за expiry_bars свечей - выход по close свечи истечения
+"""
+
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Сколько свечей ждать исхода, прежде чем закрыть сигнал по времени
+DEFAULT_EXPIRY_BARS = 30
+
+SIDES = {'LONG': 1, 'SHORT': -1}
+SIDE_NAMES = {code: name for name, code in SIDES.items()}
+
+# Столбцы открытых сигналов
+OPEN_COLUMNS = {
+    'key': np.int32,        # номер пары (symbol, timeframe)
+    'side': np.int8,        # 1 LONG, -1 SHORT
+    'entry': np.float64,
+    'sl': np.float64,
+    'tp': np.float64,
+    'opened_ms': np.int64,  # время сигнала
+    'expires_ms': np.int64,
+}
+
+
+def to_ms(moment) -> int:
+    """
+    Момент сигнала -> мс эпохи, как timestamp свечей биржи
+
+    Число - секунды эпохи (bot_clock.time()), наивные datetime и
+    ISO-строки - локальное время, как bot_clock.now() и хранилище.
+    """
+    if isinstance(moment, (int, float, np.integer, np.floating)):
+        return int(moment * 1000)
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    if isinstance(moment, pd.Timestamp):
+        moment = moment.to_pydatetime()
+    return int(moment.timestamp() * 1000)
+
+
+class OutcomeTracker:
+    """Открытые сигналы в столбцах и статистика исходов"""
+
+    def __init__(self, expiry_bars: int = DEFAULT_EXPIRY_BARS, capacity: int = 64,
+                 history: int = 500):
+        """
+        Args:
+            expiry_bars: Через сколько свечей своего таймфрейма сигнал истекает
+            capacity: Начальный размер столбцов (растёт удвоением)
+            history: Сколько последних исходов хранить для вывода
+        """
+        self.expiry_bars = expiry_bars
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in OPEN_COLUMNS.items()}
+        self._size = 0
+        self._keys: Dict[tuple, int] = {}
+        self._key_names: List[tuple] = []
+
+        self.resolved = deque(maxlen=history)
+        self._totals = defaultdict(lambda: {'TP': 0, 'SL': 0, 'EXPIRED': 0, 'r_sum': 0.0, 'seconds_sum': 0.0})
+        # open() и update() зовутся из разных потоков конвейера: обе сдвигают _size и столбцы
+        self._lock = threading.RLock()
+
+    # === ОТКРЫТЫЕ СИГНАЛЫ ===
+    def _key(self, symbol: str, timeframe: str) -> int:
+        pair = (symbol, timeframe)
+        if pair not in self._keys:
+            self._keys[pair] = len(self._key_names)
+            self._key_names.append(pair)
+        return self._keys[pair]
+
+    def open(self, symbol: str, timeframe: str, side: str, entry: float,
+             stop_loss: float, take_profit: float, opened_at) -> bool:
+        """Добавить отправленный сигнал"""
+        if side not in SIDES or entry <= 0 or stop_loss == entry:
+            return False
+
+        opened_ms = to_ms(opened_at)
+        with self._lock:
+            if self._size == len(self._columns['key']):
+                for name, column in self._columns.items():
+                    self._columns[name] = np.concatenate([column, np.zeros_like(column)])
+
+            row = self._size
+            values = {
+                'key': self._key(symbol, timeframe),
+                'side': SIDES[side],
+                'entry': entry,
+                'sl': stop_loss,
+                'tp': take_profit,
+                'opened_ms': opened_ms,
+                'expires_ms': opened_ms + self.expiry_bars * timeframe_to_seconds(timeframe) * 1000,
+            }
+            for name, value in values.items():
+                self._columns[name][row] = value
+            self._size += 1
+        return True
+
+    def restore(self, signals: Iterable[Dict]) -> int:
+        """Открыть заново сигналы из хранилища (после перезапуска)"""
+        restored = 0
+        for signal in signals:
+            try:
+                restored += self.open(
+                    signal['symbol'], signal['timeframe'], signal['signal_type'],
+                    float(signal['entry_price']), float(signal['stop_loss']),
+                    float(signal['take_profit']), signal['timestamp']
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+        return restored
+
+    def open_count(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        if symbol is None:
+            return self._size
+        key = self._keys.get((symbol, timeframe))
+        if key is None:
+            return 0
+        with self._lock:
+            return int(np.count_nonzero(self._columns['key'][:self._size] == key))
+
+    # === ПРОВЕРКА ПО СВЕЧАМ ===
+    def update(self, symbol: str, timeframe: str, candles) -> List[Dict]:
+        """
+        Сверить открытые сигналы пары со свечами
+
+        Args:
+            candles: OHLCV DataFrame (timestamp, high, low, close) или
+                список [ts_ms, open, high, low, close, volume]; может включать
+                текущую незакрытую свечу - касание уровня уже случилось
+
+        Returns:
+            Исходы, зафиксированные на этом шаге
+        """
+        with self._lock:
+            key = self._keys.get((symbol, timeframe))
+            if key is None or self._size == 0:
+                return []
+            rows = np.flatnonzero(self._columns['key'][:self._size] == key)
+            if len(rows) == 0:
+                return []
+
+            open_ms, high, low, close = self._candle_arrays(candles)
+            if len(open_ms) == 0:
+                return []
+            close_ms = open_ms + timeframe_to_seconds(timeframe) * 1000
+
+            side = self._columns['side'][rows][:, None]
+            sl = self._columns['sl'][rows][:, None]
+            tp = self._columns['tp'][rows][:, None]
+            opened = self._columns['opened_ms'][rows][:, None]
+            expires = self._columns['expires_ms'][rows][:, None]
+
+            # Матрица сигналы x свечи
+            eligible = (open_ms[None, :] >= opened) & (open_ms[None, :] < expires)
+            is_long = side > 0
+            sl_hit = eligible & np.where(is_long, low[None, :] <= sl, high[None, :] >= sl)
+            tp_hit = eligible & np.where(is_long, high[None, :] >= tp, low[None, :] <= tp)
+            any_hit = sl_hit | tp_hit
+
+            n_candles = len(open_ms)
+            first_hit = np.where(any_hit.any(axis=1), any_hit.argmax(axis=1), n_candles)
+            # Истечение: в данных уже есть свеча, на которую приходится expires_ms
+            expiry_candle = np.searchsorted(close_ms, expires[:, 0], side='left')
+            expired = (first_hit == n_candles) & (expiry_candle < n_candles)
+            expiry_candle = np.minimum(expiry_candle, n_candles - 1)
+
+            done = (first_hit < n_candles) | expired
+            if not done.any():
+                return []
+
+            outcomes = []
+            for i in np.flatnonzero(done):
+                row = rows[i]
+                entry = float(self._columns['entry'][row])
+                risk = abs(entry - float(self._columns['sl'][row]))
+                direction = int(self._columns['side'][row])
+                if first_hit[i] < n_candles:
+                    candle = int(first_hit[i])
+                    # Оба уровня на одной свече - порядок внутри неизвестен, считаем SL
+                    result = 'SL' if sl_hit[i, candle] else 'TP'
+                    exit_price = float(self._columns['sl'][row] if result == 'SL' else self._columns['tp'][row])
+                else:
+                    candle = int(expiry_candle[i])
+                    result = 'EXPIRED'
+                    exit_price = float(close[candle])
+
+                outcome = {
+                    'symbol': symbol,
+                    'timeframe': timeframe,
+                    'side': SIDE_NAMES[direction],
+                    'entry': entry,
+                    'exit': exit_price,
+                    'result': result,
+                    'r': (exit_price - entry) * direction / risk,
+                    'opened': datetime.fromtimestamp(self._columns['opened_ms'][row] / 1000),
+                    'seconds': max(0.0, (close_ms[candle] - self._columns['opened_ms'][row]) / 1000),
+                }
+                outcomes.append(outcome)
+                self._record(outcome)
+
+            self._remove(rows[done])
+            return outcomes
+
+    @staticmethod
+    def _candle_arrays(candles):
+        if isinstance(candles, pd.DataFrame):
+            if len(candles) == 0:
+                return (np.empty(0, dtype=np.int64),) + (np.empty(0),) * 3
+            open_ms = candles['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+            return (open_ms, candles['high'].to_numpy(dtype=float),
+                    candles['low'].to_numpy(dtype=float), candles['close'].to_numpy(dtype=float))
+        values = np.asarray(candles, dtype=float).reshape(-1, 6)
+        return values[:, 0].astype(np.int64), values[:, 2], values[:, 3], values[:, 4]
+
+    def _remove(self, rows: np.ndarray):
+        """Удалить строки, сдвинув оставшиеся (порядок открытия сохраняется)"""
+        keep = np.ones(self._size, dtype=bool)
+        keep[rows] = False
+        remaining = int(keep.sum())
+        for name, column in self._columns.items():
+            column[:remaining] = column[:self._size][keep]
+        self._size = remaining
+
+    # === СТАТИСТИКА ===
+    def _record(self, outcome: Dict):
+        self.resolved.append(outcome)
+        for key in ((outcome['symbol'], outcome['timeframe']), 'all'):
+            totals = self._totals[key]
+            totals[outcome['result']] += 1
+            totals['r_sum'] += outcome['r']
+            totals['seconds_sum'] += outcome['seconds']
+
+    def performance(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> Dict:
+        """
+        Итоги по паре/таймфрейму или по всем сигналам
+
+        Returns:
+            {'trades', 'tp', 'sl', 'expired', 'win_rate', 'avg_r', 'total_r',
+             'avg_hours', 'open'}
+        """
+        key = 'all' if symbol is None else (symbol, timeframe)
+        with self._lock:
+            totals = dict(self._totals.get(key, {'TP': 0, 'SL': 0, 'EXPIRED': 0, 'r_sum': 0.0, 'seconds_sum': 0.0}))
+        trades = totals['TP'] + totals['SL'] + totals['EXPIRED']
+        return {
+            'trades': trades,
+            'tp': totals['TP'],
+            'sl': totals['SL'],
+            'expired': totals['EXPIRED'],
+            'win_rate': totals['TP'] / trades * 100 if trades else 0.0,
+            'avg_r': totals['r_sum'] / trades if trades else 0.0,
+            'total_r': totals['r_sum'],
+            'avg_hours': totals['seconds_sum'] / trades / 3600 if trades else 0.0,
+            'open': self.open_count(symbol, timeframe),
+        }
+
+    def performance_by_pair(self) -> Dict[tuple, Dict]:
+        with self._lock:
+            keys = [key for key in self._totals if key != 'all']
+        return {key: self.performance(*key) for key in keys}
+
+
+# Пример использования
+if __name__ == "__main__":
+    import time
+
+    from synthetic_data import generate_ohlcv
+
+    df = generate_ohlcv(5000, '4h', start='2024-01-01', seed=7)
+    tracker = OutcomeTracker(expiry_bars=30)
+    rng = np.random.default_rng(0)
+
+    started = time.perf_counter()
+    window = 100
+    for end in range(window, len(df)):
+        candles = df.iloc[end - window:end]
+        tracker.update('SOL/USDT', '4h', candles)
+        if rng.random() < 0.2:
+            last = candles.iloc[-1]
+            price = float(last['close'])
+            distance = price * 0.02
+            side = 'LONG' if rng.random() < 0.5 else 'SHORT'
+            direction = SIDES[side]
+            tracker.open('SOL/USDT', '4h', side, price,
+                         price - direction * distance, price + direction * 2 * distance,
+                         (last['timestamp'] + pd.Timedelta(hours=4)).value / 1e9)
+    elapsed = time.perf_counter() - started
+
+    stats = tracker.performance()
+    print(f"⚡ {len(df) - window} пачек свечей за {elapsed:.2f}с")
+    print(f"🎯 Исходов: {stats['trades']} (TP {stats['tp']}, SL {stats['sl']}, истекло {stats['expired']}), "
+          f"открыто {stats['open']}")
+    print(f"📊 Win rate {stats['win_rate']:.1f}% | средний R {stats['avg_r']:+.2f} | "
+          f"до исхода {stats['avg_hours']:.1f}ч")
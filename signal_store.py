@@ -0,0 +1,505 @@
+"""
+Signal Store - Хранилище сигналов только на дозапись (JSON Lines)
+
+Раньше каждый сигнал означал чтение всего signals.json, добавление
+одной записи и перезапись файла целиком: O(N) ввода-вывода на сигнал и
+битый файл при падении посреди записи. Здесь:
+- запись - одна строка в конец signals.jsonl (O(1))
+- flush в ОС сразу (переживает падение процесса), fsync пачками:
+  каждые fsync_every записей или fsync_interval секунд в фоне
+- недописанная последняя строка после сбоя обрезается при открытии
+- компактизация (оставить последние max_records) - в фоновом потоке,
+  когда файл вырос вдвое; записи во время компактизации не теряются
+- старый signals.json переносится автоматически при первом запуске
+- индекс по времени (bisect по смещениям строк) - выборка за период
+  за O(log N + k) без разбора всего файла
+- счётчики по (пара, таймфрейм, сторона) обновляются при записи и
+  сохраняются контрольной точкой в signals.index.json; после перезапуска
+  дочитывается только хвост файла после точки, компактизация их не теряет
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AggregateKey = Tuple[str, str, str]
+
+
+def parse_time(value) -> Optional[datetime]:
+    """Время сигнала -> наивный datetime в локальной зоне (как bot_clock.now())"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def aggregate_key(record: Dict) -> Optional[AggregateKey]:
+    """(symbol, timeframe, signal_type) записи или None, если полей нет"""
+    key = (record.get('symbol'), record.get('timeframe'), record.get('signal_type'))
+    return key if all(key) else None
+
+
+class SignalStore:
+    """Append-only хранилище сигналов в JSON Lines"""
+
+    def __init__(
+        self,
+        data_dir: str = 'bot_data',
+        max_records: int = 1000,
+        fsync_every: int = 10,
+        fsync_interval: float = 1.0,
+        background: bool = True
+    ):
+        """
+        Args:
+            data_dir: Папка хранилища
+            max_records: Сколько последних сигналов оставлять при компактизации
+            fsync_every: fsync после стольких записей
+            fsync_interval: Максимальная задержка fsync в секундах (фоновый поток)
+            background: Фоновый поток для fsync и компактизации (False - всё синхронно)
+        """
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, 'signals.jsonl')
+        self.legacy_path = os.path.join(data_dir, 'signals.json')
+        self.checkpoint_path = os.path.join(data_dir, 'signals.index.json')
+        self.max_records = max_records
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        self._compacting = False
+        self._closed = False
+
+        # Индекс по времени: отсортированные моменты и смещения их строк в файле
+        self._index_times: List[datetime] = []
+        self._index_offsets: List[int] = []
+        # Счётчики за всё время, включая записи, удалённые компактизацией
+        self._aggregates: Counter = Counter()
+        self._checkpoint_dirty = False
+
+        self._migrate_legacy()
+        self._repair_tail()
+        self._lines = 0
+        self._load_index()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+        self._wakeup = threading.Event()
+        self._worker = None
+        if background:
+            self._worker = threading.Thread(target=self._background, name='signal-store', daemon=True)
+            self._worker.start()
+
+    # === ЗАПИСЬ ===
+    def append(self, record: Dict) -> bool:
+        """Дописать сигнал в конец файла"""
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        timestamp = parse_time(record.get('timestamp'))
+        key = aggregate_key(record)
+        try:
+            with self._lock:
+                offset = self._file.tell()
+                self._file.write(line)
+                self._file.flush()
+                self._lines += 1
+                self._index(timestamp, offset)
+                if key:
+                    self._aggregates[key] += 1
+                self._checkpoint_dirty = True
+                self._pending += 1
+                if self._pending >= self.fsync_every:
+                    self._fsync()
+                needs_compaction = self._lines >= self.max_records * 2 and not self._compacting
+
+            if needs_compaction:
+                if self._worker is not None:
+                    self._wakeup.set()
+                else:
+                    self.compact()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving signal: {e}")
+            return False
+
+    def flush(self):
+        """Принудительный fsync всех записей"""
+        with self._lock:
+            if self._pending:
+                self._fsync()
+
+    def pending(self) -> int:
+        """Записей, ещё не сброшенных на диск fsync"""
+        return self._pending
+
+    def _fsync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        # С фоновым потоком точка пишется раз в fsync_interval, без него - с каждым fsync
+        if self._worker is None:
+            self._save_checkpoint()
+
+    # === ЧТЕНИЕ ===
+    def iter_records(self) -> Iterator[Dict]:
+        """Все сигналы по порядку записи"""
+        with self._lock:
+            self._file.flush()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Недописанная строка после сбоя - только последняя, остальные - повреждение
+                level = logging.INFO if number == len(lines) else logging.WARNING
+                logger.log(level, f"Пропущена повреждённая строка {number} в {self.path}")
+
+    def load(self) -> List[Dict]:
+        return list(self.iter_records())
+
+    def __len__(self) -> int:
+        return self._lines
+
+    def query(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict]:
+        """
+        Сигналы с since < timestamp <= until в порядке времени
+
+        Границы ищутся бинарным поиском по индексу, читаются только
+        подходящие строки: O(log N + k).
+        """
+        with self._lock:
+            start, end = self._range(since, until)
+            offsets = self._index_offsets[start:end]
+            if not offsets:
+                return []
+
+            self._file.flush()
+            records = []
+            with open(self.path, 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    try:
+                        records.append(json.loads(f.readline()))
+                    except json.JSONDecodeError:
+                        logger.warning(f"Повреждённая запись по смещению {offset} в {self.path}")
+            return records
+
+    def count_range(self, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None) -> Dict[AggregateKey, int]:
+        """Счётчики (symbol, timeframe, signal_type) за период"""
+        return dict(Counter(
+            key for key in map(aggregate_key, self.query(since, until)) if key
+        ))
+
+    def aggregates(self) -> Dict[AggregateKey, int]:
+        """Счётчики (symbol, timeframe, signal_type) за всё время - O(число ключей)"""
+        with self._lock:
+            return dict(self._aggregates)
+
+    # === ИНДЕКС ===
+    def _index(self, timestamp: Optional[datetime], offset: int):
+        if timestamp is None:
+            return
+        # Сигналы приходят по порядку - обычно это вставка в конец
+        position = bisect_right(self._index_times, timestamp)
+        self._index_times.insert(position, timestamp)
+        self._index_offsets.insert(position, offset)
+
+    def _range(self, since: Optional[datetime], until: Optional[datetime]) -> Tuple[int, int]:
+        start = 0 if since is None else bisect_right(self._index_times, parse_time(since))
+        end = len(self._index_times) if until is None else bisect_right(self._index_times, parse_time(until))
+        return start, max(start, end)
+
+    def _scan(self, start: int = 0, end: Optional[int] = None, count: bool = True):
+        """Строки файла с байта start до end - в индекс (и в счётчики, если count)"""
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if end is not None and offset >= end:
+                    break
+                line_offset, offset = offset, offset + len(line)
+                if not line.strip():
+                    continue
+                self._lines += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Пропущена повреждённая строка по смещению {line_offset} в {self.path}")
+                    continue
+                self._index(parse_time(record.get('timestamp')), line_offset)
+                key = aggregate_key(record)
+                if count and key:
+                    self._aggregates[key] += 1
+
+    def _load_index(self):
+        """
+        Индекс строится по файлу, счётчики - из контрольной точки плюс
+        хвост файла после неё. Без точки (или если файл с тех пор
+        подменили) счётчики пересчитываются по тому, что есть в файле.
+        """
+        if not os.path.exists(self.path):
+            open(self.path, 'a').close()
+
+        checkpoint = None
+        if os.path.exists(self.checkpoint_path):
+            try:
+                with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                    checkpoint = json.load(f)
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать {self.checkpoint_path}: {e}")
+
+        status = os.stat(self.path)
+        valid = (checkpoint is not None
+                 and checkpoint.get('inode') == status.st_ino
+                 and 0 <= checkpoint.get('offset', -1) <= status.st_size)
+
+        if valid:
+            offset = checkpoint['offset']
+            self._aggregates = Counter({
+                (symbol, timeframe, side): count
+                for symbol, timeframe, side, count in checkpoint.get('aggregates', [])
+            })
+            # До точки - только индекс, после неё - индекс и счётчики
+            self._scan(0, offset, count=False)
+            self._scan(offset)
+        else:
+            if checkpoint is not None:
+                logger.warning(f"{self.checkpoint_path} не соответствует {self.path}, счётчики пересчитаны по файлу")
+            self._scan()
+            self._save_checkpoint(self.path)
+
+    def _save_checkpoint(self, path: Optional[str] = None):
+        """
+        Счётчики и до какого байта какого файла они учтены
+
+        Вызывается под блокировкой после flush, так что смещение и
+        счётчики согласованы. path - файл, к которому относится точка
+        (при компактизации - новый файл до его переименования).
+        """
+        path = path or self.path
+        try:
+            status = os.stat(path)
+            checkpoint = {
+                'inode': status.st_ino,
+                'offset': status.st_size,
+                'aggregates': [[*key, count] for key, count in sorted(self._aggregates.items())],
+            }
+            fd, tmp = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as out:
+                json.dump(checkpoint, out)
+            os.replace(tmp, self.checkpoint_path)
+            self._checkpoint_dirty = False
+        except Exception as e:
+            logger.error(f"Signal store checkpoint error: {e}")
+
+    # === КОМПАКТИЗАЦИЯ ===
+    def compact(self):
+        """
+        Оставить последние max_records записей
+
+        Основная часть файла переписывается без блокировки; строки,
+        дописанные за это время, переносятся в новый файл под блокировкой.
+        """
+        with self._lock:
+            if self._compacting or self._closed:
+                return
+            self._compacting = True
+            self._file.flush()
+            cut = self._file.tell()
+
+        try:
+            with open(self.path, 'rb') as f:
+                head = f.read(cut)
+
+            # Файл обрезается с начала строки: смещения оставшихся строк
+            # в индексе просто сдвигаются на drop
+            drop, kept = len(head), 0
+            for line in reversed(head.splitlines(keepends=True)):
+                if kept == self.max_records:
+                    break
+                drop -= len(line)
+                kept += bool(line.strip())
+
+            fd, tmp = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as out:
+                out.write(head[drop:])
+
+                with self._lock:
+                    self._file.flush()
+                    with open(self.path, 'rb') as f:
+                        f.seek(cut)
+                        tail = f.read()
+                    out.write(tail)
+                    out.flush()
+                    os.fsync(out.fileno())
+
+                    # Точка для нового файла пишется до подмены: при сбое между
+                    # ними inode не совпадёт и счётчики пересчитаются по файлу
+                    self._save_checkpoint(tmp)
+                    self._file.close()
+                    os.replace(tmp, self.path)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    self._lines = kept + sum(1 for line in tail.splitlines() if line.strip())
+                    self._pending = 0
+
+                    entries = [(moment, offset - drop)
+                               for moment, offset in zip(self._index_times, self._index_offsets)
+                               if offset >= drop]
+                    self._index_times = [moment for moment, _ in entries]
+                    self._index_offsets = [offset for _, offset in entries]
+
+            logger.info(f"Компактизация {self.path}: оставлено {self._lines} записей")
+        except Exception as e:
+            logger.error(f"Signal store compaction error: {e}")
+            if 'tmp' in locals() and os.path.exists(tmp):
+                os.remove(tmp)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _background(self):
+        """fsync не реже fsync_interval и компактизация по сигналу из append"""
+        while not self._closed:
+            self._wakeup.wait(self.fsync_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                with self._lock:
+                    if self._pending and time.monotonic() - self._last_fsync >= self.fsync_interval:
+                        self._fsync()
+                    if self._checkpoint_dirty and not self._pending:
+                        self._save_checkpoint()
+                    needs_compaction = self._lines >= self.max_records * 2
+                if needs_compaction:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Signal store background error: {e}")
+
+    # === МИГРАЦИЯ ===
+    def _migrate_legacy(self):
+        """signals.json (список) -> signals.jsonl, старый файл переименовывается в .migrated"""
+        if not os.path.exists(self.legacy_path):
+            return
+
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            logger.error(f"Не удалось прочитать {self.legacy_path} для миграции: {e}")
+            return
+
+        if not isinstance(legacy, list):
+            logger.error(f"{self.legacy_path}: ожидался список сигналов")
+            return
+
+        existing = b''
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                existing = f.read()
+
+        fd, tmp = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            for record in legacy[-self.max_records:]:
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            # Если новое хранилище уже было - его записи свежее старых
+            out.write(existing.decode('utf-8'))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.path)
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        logger.info(f"Миграция {self.legacy_path}: перенесено {len(legacy)} сигналов в {self.path}")
+
+    def _repair_tail(self):
+        """Обрезать недописанную последнюю строку, иначе следующая запись склеится с ней"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+
+            # Ищем последний перевод строки с конца блоками
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                chunk = f.read(step)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    position += newline + 1
+                    break
+            f.truncate(position)
+            logger.warning(f"{self.path}: обрезана недописанная запись ({size - position} байт)")
+
+    def close(self):
+        """fsync и остановка фонового потока"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.set()
+            try:
+                self._fsync()
+                self._save_checkpoint()
+            finally:
+                self._file.close()
+        if self._worker is not None and self._worker is not threading.current_thread():
+            self._worker.join(timeout=5)
+
+
+# Пример использования
+if __name__ == "__main__":
+    import shutil
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(data_dir, 'signals.json'), 'w') as f:
+            json.dump([{'timestamp': '2024-01-01T00:00:00', 'symbol': 'SOL/USDT', 'timeframe': '4h', 'signal_type': 'LONG'}], f)
+
+        store = SignalStore(data_dir, max_records=1000)
+        started = time.perf_counter()
+        for n in range(10000):
+            store.append({'timestamp': f'2024-01-02T00:00:{n % 60:02d}', 'symbol': 'BTC/USDT', 'timeframe': '4h', 'signal_type': 'SHORT'})
+        elapsed = time.perf_counter() - started
+        store.close()
+
+        reopened = SignalStore(data_dir)
+        print(f"⚡ 10000 записей за {elapsed:.3f}с ({elapsed / 10000 * 1e6:.1f} мкс/запись)")
+        print(f"📦 В хранилище после компактизации: {len(reopened.load())} записей")
+        print(f"🧮 Счётчики за всё время: {reopened.aggregates()}")
+
+        started = time.perf_counter()
+        recent = reopened.query(since=datetime(2024, 1, 2, 0, 0, 58))
+        print(f"🔎 Сигналов после 00:00:58: {len(recent)} за {(time.perf_counter() - started) * 1e3:.2f} мс")
+        reopened.close()
+    finally:
+        shutil.rmtree(data_dir)
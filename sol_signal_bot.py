@@ -13,14 +13,31 @@ from collections import defaultdict
 # Third-party imports
 import pandas as pd
 import numpy as np
-import requests
 import ta
-from flask import Flask
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 from io import BytesIO
 
+import bot_clock
+import metrics
+from bot_clock import stage_timer
+from profiling import CycleProfiler, span, traced
+from pipeline import Pipeline, RateLimiter, Stage
+from signal_store import SignalStore
+from compact_stats import ErrorLog, make_stats, memory_usage, process_rss_bytes
+from windowed_counters import CounterSet, sparkline
+from signal_outcomes import OutcomeTracker
+from signal_latency import DEFAULT_SLO, LatencyTracker, parse_slo
+from telegram_delivery import DEFAULT_API_BASE, TelegramDelivery
+from subscriptions import SubscriptionRegistry
+from chart_renderer import ChartRenderer
+from parallel_eval import StrategyPool, pack_candles
+from shard_coordinator import DEFAULT_LEASE, ShardCoordinator
+from timeframes import timeframe_to_seconds
+from lazy_imports import lazy_module
+
+# Flask и requests нужны только для keep-alive и Telegram при запуске бота
+flask = lazy_module('flask')
+requests = lazy_module('requests')
+
 # Suppress performance warnings
 warnings.filterwarnings('ignore', category=pd.errors.PerformanceWarning)
 
@@ -37,33 +54,55 @@ logger = logging.getLogger(__name__)
 
 # === DATA PERSISTENCE ===
 class DataPersistence:
+    """Сигналы - в append-only SignalStore (signals.jsonl), статистика - в stats.json"""
     def __init__(self, data_dir='bot_data'):
         self.data_dir = data_dir
-        self.signals_file = os.path.join(data_dir, 'signals.json')
         self.stats_file = os.path.join(data_dir, 'stats.json')
         os.makedirs(data_dir, exist_ok=True)
+        # Старый signals.json переносится в signals.jsonl при первом запуске
+        self.signal_store = SignalStore(data_dir)
         
     def save_signal(self, signal):
-        try:
-            signals = self.load_signals()
-            signals.append(signal)
-            with open(self.signals_file, 'w') as f:
-                json.dump(signals, f, indent=2)
-            return True
-        except Exception as e:
-            logger.error(f"Error saving signal: {e}")
-            return False
+        return self.signal_store.append(signal)
             
     def load_signals(self):
         try:
-            if os.path.exists(self.signals_file):
-                with open(self.signals_file, 'r') as f:
-                    return json.load(f)
-            return []
+            return self.signal_store.load()
         except Exception as e:
             logger.error(f"Error loading signals: {e}")
             return []
 
+    def get_recent_signals(self, hours=24):
+        """Получение недавних сигналов (бинарный поиск по индексу времени)"""
+        try:
+            return self.signal_store.query(since=bot_clock.now() - timedelta(hours=hours))
+        except Exception as e:
+            logger.error(f"Error getting recent signals: {e}")
+            return []
+
+    def get_signal_counts(self, hours=None):
+        """
+        Счётчики сигналов {symbol: {timeframe: {'LONG', 'SHORT', 'Total'}}}
+
+        hours=None - за всё время (хранятся в SignalStore и переживают
+        перезапуск), иначе - за последние hours часов по индексу времени.
+        """
+        try:
+            if hours is None:
+                counts = self.signal_store.aggregates()
+            else:
+                counts = self.signal_store.count_range(since=bot_clock.now() - timedelta(hours=hours))
+        except Exception as e:
+            logger.error(f"Error getting signal counts: {e}")
+            counts = {}
+
+        result = defaultdict(lambda: defaultdict(lambda: {'LONG': 0, 'SHORT': 0, 'Total': 0}))
+        for (symbol, timeframe, side), count in counts.items():
+            entry = result[symbol][timeframe]
+            entry[side] = entry.get(side, 0) + count
+            entry['Total'] += count
+        return result
+
     def save_stats(self, stats):
         try:
             with open(self.stats_file, 'w') as f:
@@ -83,26 +122,8 @@ class DataPersistence:
             logger.error(f"Error loading stats: {e}")
             return {}
 
-# === HEALTH MONITOR ===
-class HealthMonitor:
-    def __init__(self):
-        self.start_time = time.time()
-        self.errors = []
-        self.last_check = time.time()
-        
-    def log_error(self, error):
-        self.errors.append({
-            'timestamp': datetime.now().isoformat(),
-            'error': str(error)
-        })
-        
-    def get_status(self):
-        return {
-            'uptime': time.time() - self.start_time,
-            'error_count': len(self.errors),
-            'last_error': self.errors[-1] if self.errors else None,
-            'last_check': self.last_check
-        }
+    def close(self):
+        self.signal_store.close()
 
 # === DATA CACHE ===
 class DataCache:
@@ -129,7 +150,7 @@ class HealthCheckSystem:
         self.check_interval = 300  # 5 minutes
         
     def needs_check(self, check_name):
-        now = time.time()
+        now = bot_clock.time()
         last = self.last_check.get(check_name, 0)
         if now - last > self.check_interval:
             self.last_check[check_name] = now
@@ -141,6 +162,7 @@ class DataValidator:
     """Класс для валидации и очистки данных"""
     
     @staticmethod
+    @traced('validate')
     def validate_ohlcv_data(ohlcv: List) -> Tuple[bool, str]:
         """Валидация OHLCV данных"""
         if not ohlcv or len(ohlcv) < 10:
@@ -157,10 +179,10 @@ class DataValidator:
                 return False, f"NaN/None values at index {i}"
             
             # Проверка логичности цен
-            if not (0 < open_price < 1000000 and 0 < close_price < 1000000):
+            if not (0 < open_price < 1000000 and 0 < close < 1000000):
                 return False, f"Price out of range at index {i}"
             
-            if not (low <= min(open_price, close_price) and high >= max(open_price, close_price)):
+            if not (low <= min(open_price, close) and high >= max(open_price, close)):
                 return False, f"Invalid OHLC relationship at index {i}"
             
             if volume < 0:
@@ -169,6 +191,7 @@ class DataValidator:
         return True, "Valid"
     
     @staticmethod
+    @traced('clean')
     def clean_ohlcv_data(ohlcv: List) -> List:
         """Очистка и нормализация данных"""
         cleaned = []
@@ -208,7 +231,7 @@ class DataCache:
         
     def can_make_request(self):
         """Проверяет, можно ли сделать запрос с учётом rate limits"""
-        now = time.time()
+        now = bot_clock.time()
         # Увеличено до 5 секунд между запросами для Bybit
         if now - self.last_request_time < 5:
             return False
@@ -219,7 +242,7 @@ class DataCache:
         cache_key = f"{symbol}_{timeframe}"
         if cache_key in self.cache:
             data, timestamp = self.cache[cache_key]
-            if time.time() - timestamp < self.cache_duration[timeframe]:
+            if bot_clock.time() - timestamp < self.cache_duration[timeframe]:
                 self.health_stats['cache_hits'] += 1
                 logger.info(f"Cache hit: {symbol} {timeframe}")
                 return data
@@ -236,7 +259,7 @@ class DataCache:
             logger.error(f"Invalid data for {symbol} {timeframe}: {message}")
             return
         
-        self.cache[cache_key] = (data, time.time())
+        self.cache[cache_key] = (data, bot_clock.time())
 
 # === КОНФИГУРАЦИЯ ===
 # Параметры риска
@@ -275,11 +298,13 @@ timeframes = {
 }
 
 # Инициализация статистики
-stats = {s: {tf: {'LONG': 0, 'SHORT': 0, 'Total': 0, 'Signals': []} 
-           for tf in timeframes} for s in symbols}
+# Счётчики за всё время и кольцевой буфер последних сигналов на пару/таймфрейм
+stats = make_stats(symbols, timeframes)
+# Открытые сигналы сверяются со свечами, которые check_signal и так получает
+outcome_tracker = OutcomeTracker()
 last_signal_time = {}
-last_summary_time = datetime.now() - timedelta(minutes=35)  # Принудительно отправить сводку при старте
-last_daily_report = datetime.now() - timedelta(days=1)  # Принудительно отправить отчёт при старте
+last_summary_time = bot_clock.now() - timedelta(minutes=35)  # Принудительно отправить сводку при старте
+last_daily_report = bot_clock.now() - timedelta(days=1)  # Принудительно отправить отчёт при старте
 last_regime_check = {}  # Последняя проверка режима для каждой пары
 last_regime_state = {}  # Последнее состояние режима для каждой пары
 
@@ -297,6 +322,9 @@ logger = logging.getLogger(__name__)
 # === Telegram ===
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 CHAT_ID = os.environ.get("CHAT_ID")
+TELEGRAM_API_BASE = os.environ.get("TELEGRAM_API_BASE", DEFAULT_API_BASE)
+# 30/с - общий лимит Telegram на бота; выше - только для платных рассылок
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", 30))
 BOT_URL = os.environ.get("BOT_URL", "https://sol-signal-bot-wpme.onrender.com/")
 
 def keep_alive():
@@ -308,44 +336,140 @@ def keep_alive():
             pass
         time.sleep(300)
 
-def send_telegram(msg, img=None):
+# Подмена отправки: None - Telegram Bot API, иначе функция (msg, img, kind)
+telegram_sender = None
+
+def set_telegram_sender(sender):
+    """Перенаправить сообщения бота (например, в запись при прогоне по истории)"""
+    global telegram_sender
+    telegram_sender = sender
+
+# Фоновая очередь отправки, создаётся при первом сообщении
+telegram_delivery = None
+
+# Подписки чатов (bot_data/subscriptions.json); CHAT_ID получает всё, как раньше
+subscription_registry = SubscriptionRegistry()
+
+def get_telegram_delivery():
+    global telegram_delivery
+    if telegram_delivery is None and TELEGRAM_TOKEN:
+        telegram_delivery = TelegramDelivery(TELEGRAM_TOKEN, CHAT_ID, api_base=TELEGRAM_API_BASE,
+                                             global_rate=TELEGRAM_GLOBAL_RATE)
+    return telegram_delivery
+
+def shutdown_telegram(timeout=10.0):
+    """Доотправить очередь перед выходом"""
+    global telegram_delivery
+    if telegram_delivery is not None:
+        telegram_delivery.close(timeout)
+        telegram_delivery = None
+
+@stage_timer.timed('telegram')
+def send_telegram(msg, img=None, kind=None, symbol=None, timeframe=None, strategy=None, on_done=None):
+    """
+    Поставить сообщение в очередь всем подходящим чатам - сеть ждёт
+    фоновый поток, не основной цикл
+    
+    kind - вид сообщения (subscriptions.MESSAGE_KINDS, None - всем),
+    symbol/timeframe/strategy - для фильтров подписок,
+    on_done(sent) - после доставки каждому чату (в потоке отправки)
+    """
     try:
-        if not TELEGRAM_TOKEN or not CHAT_ID:
+        if telegram_sender is not None:
+            telegram_sender(msg, img, kind=kind)
+            if on_done is not None:
+                on_done(True)
+            return
+        
+        delivery = get_telegram_delivery()
+        if delivery is None:
             print("⚠️ Telegram credentials not set")
             return
-            
-        if img is None:
-            data = {'chat_id': CHAT_ID, 'text': msg, 'parse_mode': 'Markdown'}
-            resp = requests.post(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage', 
-                               data=data, timeout=10)
-            if resp.status_code != 200:
-                print(f"Telegram send error: {resp.text}")
-        else:
-            files = {'photo': img.getvalue()}
-            data = {'chat_id': CHAT_ID, 'caption': msg, 'parse_mode': 'Markdown'}
-            resp = requests.post(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendPhoto', 
-                               data=data, files=files, timeout=15)
-            if resp.status_code != 200:
-                print(f"Telegram photo error: {resp.text}")
+        
+        chats = subscription_registry.match(kind, symbol, timeframe, strategy)
+        if CHAT_ID:
+            chats.add(CHAT_ID)
+        if not chats:
+            print("⚠️ No Telegram recipients (CHAT_ID and subscriptions are empty)")
+            return
+        
+        # Текст и картинка общие для всех получателей
+        delivery.submit_many(sorted(chats), msg, img, on_done)
     except Exception as e:
         print(f"Telegram error: {e}")
 
 # Функция send_status_update удалена - теперь используется только HEALTH CHECK
 
 # === ДАННЫЕ ===
-from data_provider import data_provider, safe_fetch_ohlcv
+from data_provider import CACHE_REQUESTS, data_provider, safe_fetch_ohlcv
 from grid_bot_strategy import strategy_grid_bot, format_grid_signal
 from market_regime_monitor import MarketRegimeMonitor, format_regime_message
 
-# Запускаем потоки
-threading.Thread(target=keep_alive, daemon=True).start()
+def set_data_provider(provider):
+    """Подменить источник свечей (любой объект с fetch_ohlcv(symbol, timeframe, limit))"""
+    global data_provider
+    data_provider = provider
+
+# === МЕТРИКИ PROMETHEUS (/metrics) ===
+STRATEGY_SECONDS = metrics.histogram('signal_bot_strategy_seconds', 'Время расчёта стратегии', ['strategy'])
+CYCLE_SECONDS = metrics.histogram('signal_bot_cycle_seconds', 'Проход таймфрейма по всем парам (с паузами)',
+                                  ['timeframe'], buckets=metrics.CYCLE_BUCKETS)
+SIGNALS = metrics.counter('signal_bot_signals', 'Отправленные сигналы', ['symbol', 'timeframe', 'side'])
+QUEUE_DEPTH = metrics.gauge('signal_bot_queue_depth', 'Глубина очередей', ['queue'])
+OPEN_SIGNALS = metrics.gauge('signal_bot_open_signals', 'Сигналы без исхода (SL/TP/истечение)')
+UPTIME_SECONDS = metrics.gauge('signal_bot_uptime_seconds', 'Время работы бота')
+RSS_BYTES = metrics.gauge('signal_bot_resident_memory_bytes', 'RSS процесса')
+
+# Очереди читаются при запросе /metrics - на горячем пути ничего не обновляется
+QUEUE_DEPTH.labels('telegram').set_function(lambda: telegram_delivery.queue_depth() if telegram_delivery else 0)
+QUEUE_DEPTH.labels('telegram_inflight').set_function(
+    lambda: telegram_delivery.inflight() if telegram_delivery else 0)
+QUEUE_DEPTH.labels('charts').set_function(lambda: chart_renderer.pending())
+QUEUE_DEPTH.labels('strategy_pool').set_function(lambda: strategy_pool.pending() if strategy_pool else 0)
+QUEUE_DEPTH.labels('signal_store').set_function(lambda: data_persistence.signal_store.pending())
+OPEN_SIGNALS.set_function(lambda: outcome_tracker.open_count())
+UPTIME_SECONDS.set_function(lambda: (bot_clock.now() - health_monitor.start_time).total_seconds())
+RSS_BYTES.set_function(process_rss_bytes)
+
+# === ЗАДЕРЖКА СИГНАЛОВ (закрытие свечи -> доставка) ===
+# Пороги SLO в секундах: "delivery=1800,4h.delivery=900,fetch=600" (signal_latency.parse_slo)
+LATENCY_SLO = os.environ.get("LATENCY_SLO", DEFAULT_SLO)
+LATENCY_ALERT_INTERVAL = float(os.environ.get("LATENCY_ALERT_INTERVAL", 3600))
+
+def send_latency_alert(text):
+    send_telegram(text, kind='latency')
+
+def new_latency_tracker():
+    return LatencyTracker(parse_slo(LATENCY_SLO), alert=send_latency_alert,
+                          alert_interval=LATENCY_ALERT_INTERVAL)
+
+latency_tracker = new_latency_tracker()
+
+def begin_latency_trace(df, symbol, timeframe, fetched_at=None):
+    """Трасса задержки по последней свече df (None - в df нет времени свечей)"""
+    if 'timestamp' not in df.columns or df.empty:
+        return None
+    return latency_tracker.begin(symbol, timeframe, df['timestamp'].iat[-1].timestamp(), fetched_at)
 
 # === Flask keep-alive ===
-app = Flask(__name__)
-@app.route("/")
-def home():
-    return "🚀 Signal Bot Active | Data Source: Yahoo Finance | Strategies: 4h Turtle, 1d Momentum (12h), 1d Trend"
-threading.Thread(target=lambda: app.run(host="0.0.0.0", port=10000), daemon=True).start()
+def create_app():
+    app = flask.Flask(__name__)
+    
+    @app.route("/")
+    def home():
+        return "🚀 Signal Bot Active | Data Source: Yahoo Finance | Strategies: 4h Turtle, 1d Momentum (12h), 1d Trend"
+    
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return flask.Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+    
+    return app
+
+def start_background_threads():
+    """Keep-alive и Flask запускаются только при запуске бота, а не при импорте модуля"""
+    app = create_app()
+    threading.Thread(target=keep_alive, daemon=True).start()
+    threading.Thread(target=lambda: app.run(host="0.0.0.0", port=10000), daemon=True).start()
 
 def get_mapped_symbol(symbol: str, exchange_id: str = None) -> str:
     """Возвращает символ в правильном формате"""
@@ -359,6 +483,7 @@ class DataValidator:
     """Класс для валидации и очистки данных"""
     
     @staticmethod
+    @traced('validate')
     def validate_ohlcv_data(ohlcv: List) -> Tuple[bool, str]:
         """Валидация OHLCV данных"""
         if not ohlcv or len(ohlcv) < 10:
@@ -375,10 +500,10 @@ class DataValidator:
                 return False, f"NaN/None values at index {i}"
             
             # Проверка логичности цен
-            if not (0 < open_price < 1000000 and 0 < close_price < 1000000):
+            if not (0 < open_price < 1000000 and 0 < close < 1000000):
                 return False, f"Price out of range at index {i}"
             
-            if not (low <= min(open_price, close_price) and high >= max(open_price, close_price)):
+            if not (low <= min(open_price, close) and high >= max(open_price, close)):
                 return False, f"Invalid OHLC relationship at index {i}"
             
             if volume < 0:
@@ -387,6 +512,7 @@ class DataValidator:
         return True, "Valid"
     
     @staticmethod
+    @traced('clean')
     def clean_ohlcv_data(ohlcv: List) -> List:
         """Очистка и нормализация данных"""
         cleaned = []
@@ -426,7 +552,7 @@ class DataCache:
         
     def can_make_request(self):
         """Проверяет, можно ли сделать запрос с учётом rate limits"""
-        now = time.time()
+        now = bot_clock.time()
         # Увеличено до 5 секунд между запросами для Bybit
         if now - self.last_request_time < 5:
             return False
@@ -437,10 +563,13 @@ class DataCache:
         cache_key = f"{symbol}_{timeframe}"
         if cache_key in self.cache:
             data, timestamp = self.cache[cache_key]
-            if time.time() - timestamp < self.cache_duration[timeframe]:
+            if bot_clock.time() - timestamp < self.cache_duration[timeframe]:
                 self.health_stats['cache_hits'] += 1
+                health_monitor.record_cache_hit()
+                CACHE_REQUESTS.labels('bot', 'hit').inc()
                 logger.info(f"Cache hit: {symbol} {timeframe}")
                 return data
+        CACHE_REQUESTS.labels('bot', 'miss').inc()
         return None
     
     def set_cached_data(self, symbol, timeframe, data):
@@ -457,8 +586,8 @@ class DataCache:
         # Очистка данных
         cleaned_data = self.validator.clean_ohlcv_data(data)
         
-        self.cache[cache_key] = (cleaned_data, time.time())
-        self.last_request_time = time.time()
+        self.cache[cache_key] = (cleaned_data, bot_clock.time())
+        self.last_request_time = bot_clock.time()
         self.health_stats['successful_requests'] += 1
         logger.info(f"Cached {len(cleaned_data)} candles for {symbol} {timeframe}")
         return True
@@ -479,8 +608,9 @@ class DataCache:
 # === СИСТЕМА МОНИТОРИНГА ЗДОРОВЬЯ ===
 class HealthMonitor:
     def __init__(self):
-        self.start_time = datetime.now()
-        self.errors = []
+        self.start_time = bot_clock.now()
+        # Последние ERROR_HISTORY ошибок, старые вытесняются
+        self.errors = ErrorLog()
         self.performance_metrics = {
             'api_calls': 0,
             'successful_calls': 0,
@@ -488,34 +618,45 @@ class HealthMonitor:
             'signals_generated': 0,
             'cache_hits': 0
         }
-        self.last_health_check = datetime.now()
+        # Поминутные корзины за сутки: суммы за час/сутки за O(1) и ряды для трендов
+        self.counters = CounterSet(['errors', 'api_calls', 'api_failures', 'signals', 'cache_hits'])
+        self.last_health_check = bot_clock.now()
+        # Пишут потоки стадий конвейера (загрузка, стратегия, отправка)
+        self._lock = threading.Lock()
     
     def record_error(self, error_type, message):
         """Запись ошибки"""
-        self.errors.append({
-            'timestamp': datetime.now(),
-            'type': error_type,
-            'message': str(message)[:200]
-        })
-        # Храним только последние 100 ошибок
-        if len(self.errors) > 100:
-            self.errors = self.errors[-100:]
+        with self._lock:
+            self.errors.append(bot_clock.now(), error_type, str(message)[:200])
+        self.counters.add('errors')
     
     def record_api_call(self, success=True):
         """Запись API вызова"""
-        self.performance_metrics['api_calls'] += 1
-        if success:
-            self.performance_metrics['successful_calls'] += 1
-        else:
-            self.performance_metrics['failed_calls'] += 1
+        with self._lock:
+            self.performance_metrics['api_calls'] += 1
+            if success:
+                self.performance_metrics['successful_calls'] += 1
+            else:
+                self.performance_metrics['failed_calls'] += 1
+        self.counters.add('api_calls')
+        if not success:
+            self.counters.add('api_failures')
     
     def record_signal(self):
         """Запись сгенерированного сигнала"""
-        self.performance_metrics['signals_generated'] += 1
+        with self._lock:
+            self.performance_metrics['signals_generated'] += 1
+        self.counters.add('signals')
+    
+    def record_cache_hit(self):
+        """Запись попадания в кэш"""
+        with self._lock:
+            self.performance_metrics['cache_hits'] += 1
+        self.counters.add('cache_hits')
     
     def get_uptime(self):
         """Возвращает время работы"""
-        return datetime.now() - self.start_time
+        return bot_clock.now() - self.start_time
     
     def get_success_rate(self):
         """Возвращает процент успешных вызовов"""
@@ -547,113 +688,28 @@ class HealthMonitor:
             'success_rate': round(success_rate, 2),
             'api_calls': self.performance_metrics['api_calls'],
             'signals_generated': self.performance_metrics['signals_generated'],
-            'recent_errors': len([e for e in self.errors if (datetime.now() - e['timestamp']).total_seconds() < 3600])
+            'recent_errors': self.counters.count('errors', 'hour'),
+            'total_errors': self.errors.total,
+            'windows': self.counters.snapshot(),
+            'error_trend': sparkline(self.counters['errors'].trend(12)),
+            'memory': memory_usage(stats, self.errors),
+            'latency': latency_tracker.summary()
         }
 
-        self.stats_file = os.path.join(data_dir, 'stats.json')
-        self.init_storage()
-    
-    def init_storage(self):
-        """Инициализация файлового хранилища"""
-        try:
-            # Создаём директорию если не существует
-            if not os.path.exists(self.data_dir):
-                os.makedirs(self.data_dir)
-            
-            # Инициализируем файлы если не существуют
-            if not os.path.exists(self.signals_file):
-                with open(self.signals_file, 'w') as f:
-                    json.dump([], f)
-            
-            if not os.path.exists(self.stats_file):
-                with open(self.stats_file, 'w') as f:
-                    json.dump({}, f)
-            
-            logger.info("File storage initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Storage initialization error: {e}")
-    
-    def save_signal(self, signal_data):
-        """Сохранение сигнала в файл"""
-        try:
-            # Читаем существующие сигналы
-            signals = []
-            if os.path.exists(self.signals_file):
-                with open(self.signals_file, 'r') as f:
-                    signals = json.load(f)
-            
-            # Добавляем новый сигнал
-            signals.append(signal_data)
-            
-            # Ограничиваем количество сигналов (последние 1000)
-            if len(signals) > 1000:
-                signals = signals[-1000:]
-            
-            # Сохраняем обратно
-            with open(self.signals_file, 'w') as f:
-                json.dump(signals, f, indent=2)
-            
-            logger.info(f"Signal saved: {signal_data['symbol']} {signal_data['signal_type']}")
-            
-        except Exception as e:
-            logger.error(f"Error saving signal: {e}")
-    
-    def get_recent_signals(self, hours=24):
-        """Получение недавних сигналов"""
-        try:
-            if not os.path.exists(self.signals_file):
-                return []
-            
-            with open(self.signals_file, 'r') as f:
-                signals = json.load(f)
-            
-            since = datetime.now() - timedelta(hours=hours)
-            recent_signals = []
-            
-            for signal in signals:
-                signal_time = datetime.fromisoformat(signal['timestamp'])
-                if signal_time > since:
-                    recent_signals.append(signal)
-            
-            return recent_signals
-            
-        except Exception as e:
-            logger.error(f"Error getting recent signals: {e}")
-            return []
-    
-    def save_stats(self, stats_data):
-        """Сохранение статистики"""
-        try:
-            with open(self.stats_file, 'w') as f:
-                json.dump(stats_data, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving stats: {e}")
-    
-    def load_stats(self):
-        """Загрузка статистики"""
-        try:
-            if os.path.exists(self.stats_file):
-                with open(self.stats_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"Error loading stats: {e}")
-            return {}
-
 # === СИСТЕМА HEALTH CHECK ===
 class HealthCheckSystem:
     def __init__(self):
-        self.last_health_check = datetime.now()
+        self.last_health_check = bot_clock.now()
         self.health_check_interval = 300  # 5 минут
         self.consecutive_failures = 0
         self.max_failures = 3
         
     def should_send_health_check(self):
         """Проверяет, нужно ли отправить health check"""
-        now = datetime.now()
+        now = bot_clock.now()
         return (now - self.last_health_check).total_seconds() >= self.health_check_interval
     
+    @stage_timer.timed('health_check')
     def send_health_check(self):
         """Отправляет health check в Telegram с ценами валют"""
         try:
@@ -677,7 +733,7 @@ class HealthCheckSystem:
             msg = (
                 f"{status_emoji} *HEALTH CHECK*\n"
                 f"━━━━━━━━━━━━━━━━━━━━\n"
-                f"⏰ Время: `{datetime.now().strftime('%H:%M:%S')}`\n"
+                f"⏰ Время: `{bot_clock.now().strftime('%H:%M:%S')}`\n"
                 f"🏥 Статус: *{health_summary['status']}*\n"
                 f"⏱️ Время работы: *{health_summary['uptime_hours']:.1f}ч*\n"
                 f"✅ API успешность: *{health_summary['success_rate']:.1f}%*\n"
@@ -686,6 +742,10 @@ class HealthCheckSystem:
                 f"📊 Сигналов: *{health_summary['signals_generated']}*\n"
             )
             
+            memory = health_summary['memory']
+            if memory['rss_mb'] is not None:
+                msg += f"🧠 Память: *{memory['rss_mb']:.1f} МБ* (статистика {memory['stats_kb']:.0f} КБ)\n"
+            
             # Добавляем цены
             if prices:
                 msg += f"\n💰 *Текущие цены:*\n"
@@ -695,15 +755,32 @@ class HealthCheckSystem:
             
             msg += f"━━━━━━━━━━━━━━━━━━━━\n"
             
+            hour = {name: counts['hour'] for name, counts in health_summary['windows'].items()}
+            msg += f"🕐 За час: API *{hour['api_calls']}* | сигналов *{hour['signals']}* | ошибок *{hour['errors']}*\n"
+            
             if health_summary['recent_errors'] > 0:
-                msg += f"⚠️ Ошибок за час: *{health_summary['recent_errors']}*\n"
+                msg += f"⚠️ Ошибок за час: *{health_summary['recent_errors']}* `{health_summary['error_trend']}`\n"
             else:
                 msg += f"🤖 Бот работает стабильно\n"
             
+            latency = latency_tracker.format_summary()
+            if latency:
+                msg += f"⏱ От закрытия свечи (p50/p95):\n{latency}\n"
+            
+            if shard_coordinator is not None:
+                shards = shard_coordinator.status()
+                msg += (f"🧩 Шарды `{shards['instance']}`: *{shards['owned']}/{shards['shards']}* | "
+                        f"инстансов *{shards['instances']}*\n")
+            
+            if telegram_delivery is not None:
+                delivery = telegram_delivery.metrics()
+                msg += (f"📨 Очередь Telegram: *{delivery['queue_depth']}* | "
+                        f"повторов *{delivery['retries']}* | потеряно *{delivery['failed'] + delivery['dropped']}*\n")
+            
             msg += f"📡 Источник: Yahoo Finance"
             
-            send_telegram(msg)
-            self.last_health_check = datetime.now()
+            send_telegram(msg, kind='health_check')
+            self.last_health_check = bot_clock.now()
             self.consecutive_failures = 0
             
             logger.info("Health check sent successfully")
@@ -720,16 +797,17 @@ class HealthCheckSystem:
                         f"━━━━━━━━━━━━━━━━━━━━\n"
                         f"❌ Health check не работает!\n"
                         f"🔄 Попыток: *{self.consecutive_failures}*\n"
-                        f"⏰ Время: `{datetime.now().strftime('%H:%M:%S')}`\n"
+                        f"⏰ Время: `{bot_clock.now().strftime('%H:%M:%S')}`\n"
                         f"━━━━━━━━━━━━━━━━━━━━\n"
                         f"🔧 Проверьте бота!"
                     )
-                    send_telegram(critical_msg)
+                    send_telegram(critical_msg, kind='critical')
                     self.consecutive_failures = 0  # Сбрасываем счётчик
                 except:
                     pass  # Если даже критическое сообщение не отправилось, просто логируем
 
 # === УЛУЧШЕННЫЙ FETCH С АДАПТИВНЫМИ ЗАДЕРЖКАМИ ===
+@stage_timer.timed('fetch')
 def safe_fetch_ohlcv(symbol, timeframe, limit=100, retries=3):
     """Безопасное получение данных с использованием yfinance"""
     base_delay = 2.0
@@ -753,7 +831,7 @@ def safe_fetch_ohlcv(symbol, timeframe, limit=100, retries=3):
             
             # Экспоненциальная задержка
             delay = min(base_delay * (2 ** attempt), max_delay)
-            time.sleep(delay)
+            bot_clock.sleep(delay)
     
     # If all attempts failed, log the final error
     error_msg = f"Не удалось получить данные для {symbol} {timeframe} после {retries} попыток"
@@ -763,6 +841,13 @@ def safe_fetch_ohlcv(symbol, timeframe, limit=100, retries=3):
     
     return []
 
+@traced('dataframe')
+def ohlcv_to_dataframe(ohlcv):
+    """Список свечей [timestamp, open, high, low, close, volume] -> DataFrame"""
+    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
 # === УЛУЧШЕННЫЕ СТРАТЕГИИ С ВАЛИДАЦИЕЙ ===
 def calculate_indicators_safely(df, indicators_config):
     """Безопасное вычисление индикаторов с валидацией"""
@@ -803,22 +888,30 @@ def validate_signal_conditions(conditions, values):
         return False
 
 # === СТРАТЕГИЯ 1: 4h Turtle (УЛУЧШЕННАЯ) ===
-def strategy_4h_turtle(df):
+@traced()
+def add_turtle_indicators(df):
+    """Индикаторы 4h Turtle"""
+    # Calculate indicators directly instead of using string-based module lookup
+    df['High_15'] = df['high'].rolling(window=15).max()
+    df['Low_15'] = df['low'].rolling(window=15).min()
+    df['EMA_21'] = ta.trend.ema_indicator(df['close'], window=21)
+    df['EMA_55'] = ta.trend.ema_indicator(df['close'], window=55)
+    df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
+    df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
+    df['RSI'] = ta.momentum.rsi(df['close'], window=14)
+    df['Volume_SMA'] = df['volume'].rolling(window=20).mean()
+    return df
+
+@traced()
+def strategy_4h_turtle(df, precomputed=False):
+    """precomputed=True - индикаторы уже в df (add_turtle_indicators)"""
     try:
         if len(df) < 55:
             logger.warning("Insufficient data for 4h Turtle strategy")
             return None, {}
         
-        # Конфигурация индикаторов
-        # Calculate indicators directly instead of using string-based module lookup
-        df['High_15'] = df['high'].rolling(window=15).max()
-        df['Low_15'] = df['low'].rolling(window=15).min()
-        df['EMA_21'] = ta.trend.ema_indicator(df['close'], window=21)
-        df['EMA_55'] = ta.trend.ema_indicator(df['close'], window=55)
-        df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
-        df['RSI'] = ta.momentum.rsi(df['close'], window=14)
-        df['Volume_SMA'] = df['volume'].rolling(window=20).mean()
+        if not precomputed:
+            add_turtle_indicators(df)
         
         # Check if all indicators were calculated successfully
         required_indicators = ['High_15', 'Low_15', 'EMA_21', 'EMA_55', 'ATR', 'ADX', 'RSI', 'Volume_SMA']
@@ -905,29 +998,37 @@ def strategy_4h_turtle(df):
         return None, {}
 
 # === СТРАТЕГИЯ 2: 12h Momentum ===
-def strategy_12h_momentum(df):
+@traced()
+def add_momentum_indicators(df):
+    """Индикаторы 12h Momentum"""
+    df['EMA_9'] = ta.trend.ema_indicator(df['close'], window=9)
+    df['EMA_21'] = ta.trend.ema_indicator(df['close'], window=21)
+    df['EMA_50'] = ta.trend.ema_indicator(df['close'], window=50)
+    
+    bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
+    df['BB_Upper'] = bb.bollinger_hband()
+    df['BB_Lower'] = bb.bollinger_lband()
+    df['BB_Width'] = (df['BB_Upper'] - df['BB_Lower']) / df['close']
+    
+    macd = ta.trend.MACD(df['close'])
+    df['MACD'] = macd.macd()
+    df['MACD_Signal'] = macd.macd_signal()
+    df['MACD_Hist'] = macd.macd_diff()
+    
+    df['RSI'] = ta.momentum.rsi(df['close'], window=14)
+    df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
+    df['Volume_SMA'] = df['volume'].rolling(window=20).mean()
+    df['Volume_Ratio'] = df['volume'] / df['Volume_SMA']
+    return df
+
+@traced()
+def strategy_12h_momentum(df, precomputed=False):
     try:
         if len(df) < 50:
             return None, {}
         
-        df['EMA_9'] = ta.trend.ema_indicator(df['close'], window=9)
-        df['EMA_21'] = ta.trend.ema_indicator(df['close'], window=21)
-        df['EMA_50'] = ta.trend.ema_indicator(df['close'], window=50)
-        
-        bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
-        df['BB_Upper'] = bb.bollinger_hband()
-        df['BB_Lower'] = bb.bollinger_lband()
-        df['BB_Width'] = (df['BB_Upper'] - df['BB_Lower']) / df['close']
-        
-        macd = ta.trend.MACD(df['close'])
-        df['MACD'] = macd.macd()
-        df['MACD_Signal'] = macd.macd_signal()
-        df['MACD_Hist'] = macd.macd_diff()
-        
-        df['RSI'] = ta.momentum.rsi(df['close'], window=14)
-        df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        df['Volume_SMA'] = df['volume'].rolling(window=20).mean()
-        df['Volume_Ratio'] = df['volume'] / df['Volume_SMA']
+        if not precomputed:
+            add_momentum_indicators(df)
         
         last = df.iloc[-1]
         prev = df.iloc[-2]
@@ -977,23 +1078,31 @@ def strategy_12h_momentum(df):
         return None, {}
 
 # === СТРАТЕГИЯ 3: 1d Trend ===
-def strategy_1d_trend(df):
+@traced()
+def add_trend_indicators(df):
+    """Индикаторы 1d Trend"""
+    df['EMA_20'] = ta.trend.ema_indicator(df['close'], window=20)
+    df['EMA_50'] = ta.trend.ema_indicator(df['close'], window=50)
+    df['EMA_100'] = ta.trend.ema_indicator(df['close'], window=100)
+    df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
+    df['+DI'] = ta.trend.adx_pos(df['high'], df['low'], df['close'], window=14)
+    df['-DI'] = ta.trend.adx_neg(df['high'], df['low'], df['close'], window=14)
+    df['RSI'] = ta.momentum.rsi(df['close'], window=14)
+    df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
+    
+    macd = ta.trend.MACD(df['close'])
+    df['MACD'] = macd.macd()
+    df['MACD_Signal'] = macd.macd_signal()
+    return df
+
+@traced()
+def strategy_1d_trend(df, precomputed=False):
     try:
         if len(df) < 100:
             return None, {}
         
-        df['EMA_20'] = ta.trend.ema_indicator(df['close'], window=20)
-        df['EMA_50'] = ta.trend.ema_indicator(df['close'], window=50)
-        df['EMA_100'] = ta.trend.ema_indicator(df['close'], window=100)
-        df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
-        df['+DI'] = ta.trend.adx_pos(df['high'], df['low'], df['close'], window=14)
-        df['-DI'] = ta.trend.adx_neg(df['high'], df['low'], df['close'], window=14)
-        df['RSI'] = ta.momentum.rsi(df['close'], window=14)
-        df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        
-        macd = ta.trend.MACD(df['close'])
-        df['MACD'] = macd.macd()
-        df['MACD_Signal'] = macd.macd_signal()
+        if not precomputed:
+            add_trend_indicators(df)
         
         last = df.iloc[-1]
         
@@ -1040,7 +1149,46 @@ def strategy_1d_trend(df):
         return None, {}
 
 # === СТРАТЕГИЯ 4: Range Trading (Диапазонная торговля) ===
-def strategy_range_trading(df):
+@traced()
+def add_range_indicators(df):
+    """Индикаторы Range Trading"""
+    df['EMA_20'] = ta.trend.ema_indicator(df['close'], window=20)
+    df['EMA_50'] = ta.trend.ema_indicator(df['close'], window=50)
+    
+    # Bollinger Bands для определения границ диапазона
+    bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
+    df['BB_Upper'] = bb.bollinger_hband()
+    df['BB_Lower'] = bb.bollinger_lband()
+    df['BB_Middle'] = bb.bollinger_mavg()
+    df['BB_Width'] = (df['BB_Upper'] - df['BB_Lower']) / df['BB_Middle']
+    
+    # RSI для перекупленности/перепроданности
+    df['RSI'] = ta.momentum.rsi(df['close'], window=14)
+    
+    # Stochastic для дополнительного подтверждения
+    stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'], window=14, smooth_window=3)
+    df['Stoch_K'] = stoch.stoch()
+    df['Stoch_D'] = stoch.stoch_signal()
+    
+    # ATR для стоп-лоссов
+    df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
+    
+    # ADX для определения силы тренда (нам нужен СЛАБЫЙ тренд)
+    df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
+    
+    # Определение диапазона (support/resistance за последние 50 свечей)
+    lookback = 50
+    df['Support'] = df['low'].rolling(window=lookback).min()
+    df['Resistance'] = df['high'].rolling(window=lookback).max()
+    df['Range_Height'] = df['Resistance'] - df['Support']
+    df['Range_Pct'] = (df['Range_Height'] / df['close']) * 100
+    
+    # Объём
+    df['Volume_SMA'] = df['volume'].rolling(window=20).mean()
+    return df
+
+@traced()
+def strategy_range_trading(df, precomputed=False):
     """
     Стратегия для торговли в боковике (range).
     Определяет уровни поддержки/сопротивления и торгует отскоки.
@@ -1050,40 +1198,8 @@ def strategy_range_trading(df):
         if len(df) < 100:
             return None, {}
         
-        # Индикаторы
-        df['EMA_20'] = ta.trend.ema_indicator(df['close'], window=20)
-        df['EMA_50'] = ta.trend.ema_indicator(df['close'], window=50)
-        
-        # Bollinger Bands для определения границ диапазона
-        bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
-        df['BB_Upper'] = bb.bollinger_hband()
-        df['BB_Lower'] = bb.bollinger_lband()
-        df['BB_Middle'] = bb.bollinger_mavg()
-        df['BB_Width'] = (df['BB_Upper'] - df['BB_Lower']) / df['BB_Middle']
-        
-        # RSI для перекупленности/перепроданности
-        df['RSI'] = ta.momentum.rsi(df['close'], window=14)
-        
-        # Stochastic для дополнительного подтверждения
-        stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'], window=14, smooth_window=3)
-        df['Stoch_K'] = stoch.stoch()
-        df['Stoch_D'] = stoch.stoch_signal()
-        
-        # ATR для стоп-лоссов
-        df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        
-        # ADX для определения силы тренда (нам нужен СЛАБЫЙ тренд)
-        df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
-        
-        # Определение диапазона (support/resistance за последние 50 свечей)
-        lookback = 50
-        df['Support'] = df['low'].rolling(window=lookback).min()
-        df['Resistance'] = df['high'].rolling(window=lookback).max()
-        df['Range_Height'] = df['Resistance'] - df['Support']
-        df['Range_Pct'] = (df['Range_Height'] / df['close']) * 100
-        
-        # Объём
-        df['Volume_SMA'] = df['volume'].rolling(window=20).mean()
+        if not precomputed:
+            add_range_indicators(df)
         
         last = df.iloc[-1]
         prev = df.iloc[-2]
@@ -1192,7 +1308,22 @@ def strategy_range_trading(df):
         return None, {}
 
 # === ГИБРИДНАЯ СТРАТЕГИЯ 4h: Turtle + Range Trading ===
-def strategy_4h_hybrid(df):
+def add_hybrid_indicators(df):
+    """Индикаторы обеих веток гибридной стратегии"""
+    add_range_indicators(df)
+    add_turtle_indicators(df)
+    return df
+
+def add_hybrid_branch_indicators(df):
+    """Индикаторы только той ветки, которую гибридная стратегия выберет по ADX последней свечи"""
+    df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
+    last_adx = df['ADX'].iat[-1]
+    if pd.isna(last_adx):
+        return df
+    return add_range_indicators(df) if last_adx < 25 else add_turtle_indicators(df)
+
+@traced()
+def strategy_4h_hybrid(df, precomputed=False):
     """
     Гибридная стратегия для 4h:
     - ADX < 25: Range Trading (боковик)
@@ -1203,7 +1334,8 @@ def strategy_4h_hybrid(df):
             return None, {}
         
         # Рассчитываем ADX для определения режима рынка
-        df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
+        if not precomputed:
+            df['ADX'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
         last_adx = df.iloc[-1]['ADX']
         
         if pd.isna(last_adx):
@@ -1213,11 +1345,11 @@ def strategy_4h_hybrid(df):
         if last_adx < 25:
             # Боковик - используем Range Trading
             logger.info(f"4h Hybrid: ADX={last_adx:.1f} < 25 → Range Trading")
-            return strategy_range_trading(df)
+            return strategy_range_trading(df, precomputed)
         else:
             # Тренд - используем Turtle
             logger.info(f"4h Hybrid: ADX={last_adx:.1f} >= 25 → Turtle")
-            return strategy_4h_turtle(df)
+            return strategy_4h_turtle(df, precomputed)
             
     except Exception as e:
         logger.error(f"Strategy 4h Hybrid error: {e}")
@@ -1232,189 +1364,293 @@ def get_strategy(timeframe):
     }
     return strategies.get(timeframe, (None, None))
 
+def strategy_id(strategy_func):
+    """Короткое имя стратегии для подписок: strategy_4h_hybrid -> 4h_hybrid"""
+    return getattr(strategy_func, '__name__', str(strategy_func)).replace('strategy_', '', 1)
+
+# Индикаторы каждой стратегии (для прогона с precomputed=True)
+STRATEGY_INDICATORS = {
+    strategy_4h_turtle: add_turtle_indicators,
+    strategy_12h_momentum: add_momentum_indicators,
+    strategy_1d_trend: add_trend_indicators,
+    strategy_range_trading: add_range_indicators,
+    strategy_4h_hybrid: add_hybrid_indicators,
+}
+
 # === График ===
+# Процессов отрисовки (0 - в основном цикле), dpi и палитра PNG (0 - полноцветный)
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", 2))
+CHART_DPI = int(os.environ.get("CHART_DPI", 100))
+CHART_PALETTE_COLORS = int(os.environ.get("CHART_PALETTE_COLORS", 0))
+
+chart_renderer = ChartRenderer(workers=CHART_WORKERS, dpi=CHART_DPI, palette_colors=CHART_PALETTE_COLORS)
+
+def shutdown_charts():
+    """Дорисовать графики в работе (их сообщения встают в очередь Telegram)"""
+    chart_renderer.close()
+
+@stage_timer.timed('chart')
 def plot_signal(df, signal_type, symbol, timeframe, params):
+    """График сигнала синхронно, в текущем процессе"""
     try:
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), gridspec_kw={'height_ratios': [3, 1]})
-        
-        ax1.plot(df['timestamp'], df['close'], label='Close', linewidth=1.5)
-        
-        last = df.iloc[-1]
-        color = 'lime' if signal_type == 'LONG' else 'red'
-        marker = '^' if signal_type == 'LONG' else 'v'
-        
-        ax1.scatter(last['timestamp'], last['close'], color=color, s=200, marker=marker, 
-                   label=f'{signal_type} Signal', zorder=5, edgecolors='black', linewidths=2)
-        
-        if signal_type == 'LONG':
-            sl_price = params['entry'] - params['sl_distance']
-            tp_price = params['entry'] + params['tp_distance']
-        else:
-            sl_price = params['entry'] + params['sl_distance']
-            tp_price = params['entry'] - params['tp_distance']
-        
-        ax1.axhline(sl_price, color='red', linestyle='--', alpha=0.7, label=f'SL: {sl_price:.2f}')
-        ax1.axhline(tp_price, color='green', linestyle='--', alpha=0.7, label=f'TP: {tp_price:.2f}')
-        ax1.axhline(params['entry'], color='yellow', linestyle=':', alpha=0.8, label=f'Entry: {params["entry"]:.2f}')
-        
-        ax1.set_title(f'{symbol} | {timeframe} | {signal_type} Signal', fontsize=14, fontweight='bold')
-        ax1.set_ylabel('Price (USDT)', fontsize=11)
-        ax1.legend(loc='upper left', fontsize=9)
-        ax1.grid(alpha=0.3)
-        
-        colors = ['green' if df.iloc[i]['close'] >= df.iloc[i]['open'] else 'red' 
-                 for i in range(len(df))]
-        ax2.bar(df['timestamp'], df['volume'], color=colors, alpha=0.6, width=0.8)
-        ax2.set_ylabel('Volume', fontsize=11)
-        ax2.set_xlabel('Time', fontsize=11)
-        ax2.grid(alpha=0.3)
-        
-        plt.tight_layout()
-        
-        img = BytesIO()
-        plt.savefig(img, format='png', dpi=100, bbox_inches='tight')
-        img.seek(0)
-        plt.close(fig)
-        return img
+        return BytesIO(chart_renderer.render(df, signal_type, symbol, timeframe, params))
     except Exception as e:
         print(f"Plot error: {e}")
         return None
 
-# === УЛУЧШЕННАЯ ПРОВЕРКА СИГНАЛОВ ===
-def check_signal(df, symbol, timeframe):
+def queue_signal_message(msg, img, symbol, timeframe, strategy, trace=None):
+    """Сообщение сигнала в Telegram; trace - отметить chart, queued и delivery"""
+    def delivered(sent):
+        if sent:
+            latency_tracker.record(trace, 'delivery')
+    
+    if trace is not None:
+        latency_tracker.record(trace, 'chart')
+        latency_tracker.record(trace, 'queued')
+    send_telegram(msg, img, kind='signal', symbol=symbol, timeframe=timeframe, strategy=strategy,
+                  on_done=delivered if trace is not None else None)
+
+def send_signal_with_chart(msg, df, signal_type, symbol, timeframe, params, strategy, trace=None):
+    """
+    Отправить сигнал с графиком, не дожидаясь отрисовки: график рисуется
+    в пуле процессов, сообщение встаёт в очередь Telegram, когда он готов
+    """
+    if telegram_sender is not None:
+        # Подменённая отправка (прогон по истории, бенчмарк) - синхронно и детерминированно
+        queue_signal_message(msg, plot_signal(df, signal_type, symbol, timeframe, params),
+                             symbol, timeframe, strategy, trace)
+        return
+    
+    def deliver(future):
+        try:
+            img = BytesIO(future.result())
+        except Exception as e:
+            logger.error(f"Chart render error for {symbol} {timeframe}: {e}")
+            img = None
+        queue_signal_message(msg, img, symbol, timeframe, strategy, trace)
+    
     try:
-        if len(df) < 100:
-            logger.warning(f"Insufficient data for {symbol} {timeframe}: {len(df)} candles")
-            return
-        
-        strategy_name, strategy_func = get_strategy(timeframe)
-        if not strategy_func:
-            logger.warning(f"No strategy found for timeframe {timeframe}")
-            return
-        
-        signal, params = strategy_func(df)
-        
-        if not signal or not params:
-            return
-        
-        signal_key = f"{symbol}_{timeframe}_{signal}"
-        now = datetime.now()
-        if signal_key in last_signal_time:
-            if (now - last_signal_time[signal_key]).total_seconds() < 3600:
-                logger.info(f"Signal {signal_key} already sent recently, skipping")
-                return
-        last_signal_time[signal_key] = now
-        
-        # Валидация параметров
-        if not all(key in params for key in ['entry', 'sl_distance', 'tp_distance', 'atr']):
-            logger.error(f"Invalid signal parameters for {symbol} {timeframe}")
-            return
-        
-        rr = params['tp_distance'] / params['sl_distance']
-        if rr < MIN_RISK_REWARD:
-            logger.info(f"Risk/reward ratio too low: {rr:.2f} for {symbol} {timeframe}")
-            return
-        
-        entry = float(params['entry'])
-        sl_distance = float(params['sl_distance'])
-        tp_distance = float(params['tp_distance'])
-        atr = float(params['atr'])
-        
-        if entry <= 0 or sl_distance <= 0 or tp_distance <= 0:
-            logger.error(f"Invalid price values for {symbol} {timeframe}")
-            return
-        
-        if signal == 'LONG':
-            stop_loss = entry - sl_distance
-            take_profit = entry + tp_distance
-        else:
-            stop_loss = entry + sl_distance
-            take_profit = entry - tp_distance
-        
-        # Проверка на разумные значения
-        if stop_loss <= 0 or take_profit <= 0:
-            logger.error(f"Invalid stop loss or take profit for {symbol} {timeframe}")
-            return
-        
-        risk_amount = BALANCE * RISK_PER_TRADE
-        position_size_base = risk_amount / sl_distance
-        
-        leverage_ratio = (position_size_base * entry) / BALANCE
-        leverage_used = min(MAX_LEVERAGE, leverage_ratio)
-        position_size = (risk_amount * leverage_used) / sl_distance
-        
-        potential_profit = tp_distance * position_size
-        potential_loss = sl_distance * position_size
-        
-        commission_cost = position_size * entry * COMMISSION * 2
-        net_profit = potential_profit - commission_cost
-        net_loss = potential_loss + commission_cost
-        
-        # Обновление статистики
-        stats[symbol][timeframe]['Total'] += 1
-        stats[symbol][timeframe][signal] += 1
-        stats[symbol][timeframe]['Signals'].append({
-            'time': now,
-            'type': signal,
-            'entry': entry,
-            'sl': stop_loss,
-            'tp': take_profit
-        })
-        
-        # Сохранение в базу данных
-        signal_data = {
-            'timestamp': now.isoformat(),
-            'symbol': symbol,
-            'timeframe': timeframe,
-            'signal_type': signal,
-            'entry_price': entry,
-            'stop_loss': stop_loss,
-            'take_profit': take_profit,
-            'atr': atr
-        }
+        future = chart_renderer.submit(df, signal_type, symbol, timeframe, params)
+    except Exception as e:
+        logger.error(f"Chart submit error for {symbol} {timeframe}: {e}")
+        queue_signal_message(msg, None, symbol, timeframe, strategy, trace)
+        return
+    future.add_done_callback(deliver)
+
+def render_signal_chart(signal):
+    """График сигнала для стадии конвейера: в пуле процессов, поток стадии ждёт"""
+    args = (signal['df'], signal['side'], signal['symbol'], signal['timeframe'], signal['params'])
+    if telegram_sender is not None:
+        img = plot_signal(*args)
+    else:
+        try:
+            img = BytesIO(chart_renderer.submit(*args).result())
+        except Exception as e:
+            logger.error(f"Chart render error for {signal['symbol']} {signal['timeframe']}: {e}")
+            img = None
+    if signal['trace'] is not None:
+        latency_tracker.record(signal['trace'], 'chart')
+    return img
+
+# === УЛУЧШЕННАЯ ПРОВЕРКА СИГНАЛОВ ===
+def evaluate_signal(df, symbol, timeframe, fetched_at=None, precomputed=False, decision=None):
+    """
+    Исходы прошлых сигналов, стратегия, кулдаун и расчёт позиции
+    
+    fetched_at - когда получены свечи (bot_clock.time()), для задержки от
+    закрытия свечи; precomputed - индикаторы стратегии уже в df;
+    decision - (signal, params), уже посчитанные в пуле процессов
+    
+    Returns:
+        Сигнал для publish_signal (dict) или None
+    """
+    trace = begin_latency_trace(df, symbol, timeframe, fetched_at)
+    
+    # Исходы прошлых сигналов - по тем же свечам, без отдельных запросов
+    with span('outcomes'):
+        outcomes = outcome_tracker.update(symbol, timeframe, df)
+    for outcome in outcomes:
+        logger.info(f"Signal outcome {symbol} {timeframe} {outcome['side']}: "
+                    f"{outcome['result']} {outcome['r']:+.2f}R за {outcome['seconds'] / 3600:.1f}ч")
+    
+    if len(df) < 100:
+        logger.warning(f"Insufficient data for {symbol} {timeframe}: {len(df)} candles")
+        return None
+    
+    strategy_name, strategy_func = get_strategy(timeframe)
+    if not strategy_func:
+        logger.warning(f"No strategy found for timeframe {timeframe}")
+        return None
+    
+    if decision is not None:
+        signal, params = decision
+    else:
+        with stage_timer.stage('strategy'), STRATEGY_SECONDS.labels(strategy_id(strategy_func)).time():
+            signal, params = strategy_func(df, precomputed=precomputed)
+    if trace is not None:
+        latency_tracker.record(trace, 'decision')
+    
+    if not signal or not params:
+        return None
+    
+    signal_key = f"{symbol}_{timeframe}_{signal}"
+    now = bot_clock.now()
+    if signal_key in last_signal_time:
+        if (now - last_signal_time[signal_key]).total_seconds() < 3600:
+            logger.info(f"Signal {signal_key} already sent recently, skipping")
+            return None
+    # Тот же кулдаун, общий для инстансов: пару мог проверить прежний владелец шарда
+    if shard_coordinator is not None and not shard_coordinator.claim_signal(signal_key, 3600):
+        logger.info(f"Signal {signal_key} already sent by another instance, skipping")
+        return None
+    last_signal_time[signal_key] = now
+    
+    # Валидация параметров
+    if not all(key in params for key in ['entry', 'sl_distance', 'tp_distance', 'atr']):
+        logger.error(f"Invalid signal parameters for {symbol} {timeframe}")
+        return None
+    
+    rr = params['tp_distance'] / params['sl_distance']
+    if rr < MIN_RISK_REWARD:
+        logger.info(f"Risk/reward ratio too low: {rr:.2f} for {symbol} {timeframe}")
+        return None
+    
+    entry = float(params['entry'])
+    sl_distance = float(params['sl_distance'])
+    tp_distance = float(params['tp_distance'])
+    atr = float(params['atr'])
+    
+    if entry <= 0 or sl_distance <= 0 or tp_distance <= 0:
+        logger.error(f"Invalid price values for {symbol} {timeframe}")
+        return None
+    
+    if signal == 'LONG':
+        stop_loss = entry - sl_distance
+        take_profit = entry + tp_distance
+    else:
+        stop_loss = entry + sl_distance
+        take_profit = entry - tp_distance
+    
+    # Проверка на разумные значения
+    if stop_loss <= 0 or take_profit <= 0:
+        logger.error(f"Invalid stop loss or take profit for {symbol} {timeframe}")
+        return None
+    
+    risk_amount = BALANCE * RISK_PER_TRADE
+    position_size_base = risk_amount / sl_distance
+    
+    leverage_ratio = (position_size_base * entry) / BALANCE
+    leverage_used = min(MAX_LEVERAGE, leverage_ratio)
+    position_size = (risk_amount * leverage_used) / sl_distance
+    
+    potential_profit = tp_distance * position_size
+    potential_loss = sl_distance * position_size
+    
+    commission_cost = position_size * entry * COMMISSION * 2
+    net_profit = potential_profit - commission_cost
+    net_loss = potential_loss + commission_cost
+    
+    # Формирование сообщения
+    msg = (
+        f"🚨 *{signal} СИГНАЛ*\n"
+        f"━━━━━━━━━━━━━━━━━━━━\n"
+        f"📊 *Пара:* `{symbol}`\n"
+        f"⏰ *Таймфрейм:* `{timeframe}`\n"
+        f"🎯 *Стратегия:* `{strategy_name}`\n"
+        f"━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"💰 *ПАРАМЕТРЫ ВХОДА:*\n"
+        f"├ Цена входа: `{entry:.4f}` USDT\n"
+        f"├ Stop-Loss: `{stop_loss:.4f}` USDT\n"
+        f"└ Take-Profit: `{take_profit:.4f}` USDT\n\n"
+        f"📊 *ПОЗИЦИЯ:*\n"
+        f"├ Размер: `{position_size:.2f}` USD\n"
+        f"├ Плечо: `{leverage_used:.1f}x`\n"
+        f"└ R:R: `{rr:.2f}:1`\n\n"
+        f"💵 *ПРОГНОЗ:*\n"
+        f"├ ✅ Прибыль: `+{net_profit:.2f}` USD (`+{(net_profit/BALANCE)*100:.1f}%`)\n"
+        f"├ ❌ Убыток: `-{net_loss:.2f}` USD (`-{(net_loss/BALANCE)*100:.1f}%`)\n"
+        f"└ Риск: `{RISK_PER_TRADE*100:.0f}%` от депозита\n\n"
+        f"📈 *ATR:* `{atr:.4f}`\n"
+        f"⚡ *Комиссии:* `{commission_cost:.2f}` USD\n\n"
+        f"⚠️ *Рекомендации:*\n"
+        f"• Строго соблюдай Stop-Loss!\n"
+        f"• Используй trailing stop при +5%\n"
+        f"━━━━━━━━━━━━━━━━━━━━"
+    )
+    
+    return {
+        'time': now,
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'side': signal,
+        'entry': entry,
+        'stop_loss': stop_loss,
+        'take_profit': take_profit,
+        'atr': atr,
+        'params': params,
+        'strategy': strategy_id(strategy_func),
+        'message': msg,
+        'df': df,
+        'trace': trace,
+    }
+
+def publish_signal(signal, img=None, render=True):
+    """
+    Статистика, хранилище, отслеживание исхода и отправка сигнала
+    
+    render=True - нарисовать график в пуле процессов и отправить, когда
+    готов; False - отправить с готовой картинкой img (стадия конвейера)
+    """
+    symbol, timeframe, side = signal['symbol'], signal['timeframe'], signal['side']
+    entry, stop_loss, take_profit = signal['entry'], signal['stop_loss'], signal['take_profit']
+    trace = signal['trace']
+    
+    # Обновление статистики
+    stats[symbol][timeframe].record(signal['time'], side, entry, stop_loss, take_profit)
+    
+    # Сохранение в базу данных
+    signal_data = {
+        'timestamp': signal['time'].isoformat(),
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'signal_type': side,
+        'entry_price': entry,
+        'stop_loss': stop_loss,
+        'take_profit': take_profit,
+        'atr': signal['atr']
+    }
+    if trace is not None:
+        # Закрытие свечи и задержки fetch/decision - вместе с сигналом
+        signal_data.update(trace.to_dict())
+    with span('persist'):
         data_persistence.save_signal(signal_data)
-        
-        # Запись в мониторинг
-        health_monitor.record_signal()
-        
-        # Формирование сообщения
-        msg = (
-            f"🚨 *{signal} СИГНАЛ*\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n"
-            f"📊 *Пара:* `{symbol}`\n"
-            f"⏰ *Таймфрейм:* `{timeframe}`\n"
-            f"🎯 *Стратегия:* `{strategy_name}`\n"
-            f"━━━━━━━━━━━━━━━━━━━━\n\n"
-            f"💰 *ПАРАМЕТРЫ ВХОДА:*\n"
-            f"├ Цена входа: `{entry:.4f}` USDT\n"
-            f"├ Stop-Loss: `{stop_loss:.4f}` USDT\n"
-            f"└ Take-Profit: `{take_profit:.4f}` USDT\n\n"
-            f"📊 *ПОЗИЦИЯ:*\n"
-            f"├ Размер: `{position_size:.2f}` USD\n"
-            f"├ Плечо: `{leverage_used:.1f}x`\n"
-            f"└ R:R: `{rr:.2f}:1`\n\n"
-            f"💵 *ПРОГНОЗ:*\n"
-            f"├ ✅ Прибыль: `+{net_profit:.2f}` USD (`+{(net_profit/BALANCE)*100:.1f}%`)\n"
-            f"├ ❌ Убыток: `-{net_loss:.2f}` USD (`-{(net_loss/BALANCE)*100:.1f}%`)\n"
-            f"└ Риск: `{RISK_PER_TRADE*100:.0f}%` от депозита\n\n"
-            f"📈 *ATR:* `{atr:.4f}`\n"
-            f"⚡ *Комиссии:* `{commission_cost:.2f}` USD\n\n"
-            f"⚠️ *Рекомендации:*\n"
-            f"• Строго соблюдай Stop-Loss!\n"
-            f"• Используй trailing stop при +5%\n"
-            f"━━━━━━━━━━━━━━━━━━━━"
-        )
-        
-        img = plot_signal(df, signal, symbol, timeframe, params)
-        send_telegram(msg, img)
-        
-        logger.info(f"✅ {signal} signal sent: {symbol} {timeframe} at {entry:.4f}")
-        
+    outcome_tracker.open(symbol, timeframe, side, entry, stop_loss, take_profit, bot_clock.time())
+    
+    # Запись в мониторинг
+    health_monitor.record_signal()
+    SIGNALS.labels(symbol, timeframe, side).inc()
+    
+    if render:
+        send_signal_with_chart(signal['message'], signal['df'], side, symbol, timeframe, signal['params'],
+                               signal['strategy'], trace)
+    else:
+        queue_signal_message(signal['message'], img, symbol, timeframe, signal['strategy'], trace)
+    
+    logger.info(f"✅ {side} signal sent: {symbol} {timeframe} at {entry:.4f}")
+
+@stage_timer.timed('check_signal')
+def check_signal(df, symbol, timeframe, fetched_at=None):
+    """Проверка пары целиком, без конвейера: evaluate_signal и publish_signal"""
+    try:
+        signal = evaluate_signal(df, symbol, timeframe, fetched_at)
+        if signal is not None:
+            publish_signal(signal)
     except Exception as e:
         logger.error(f"Check signal error for {symbol} {timeframe}: {e}")
         health_monitor.record_error("signal_check", str(e))
 
 # === МОНИТОРИНГ РЫНОЧНЫХ РЕЖИМОВ ===
+@stage_timer.timed('regime')
 def check_market_regime(symbol: str, timeframe: str = '4h'):
     """
     Проверяет режим рынка и отправляет обновления
@@ -1424,7 +1660,7 @@ def check_market_regime(symbol: str, timeframe: str = '4h'):
         global last_regime_check, last_regime_state
         
         key = f"{symbol}_{timeframe}"
-        now = datetime.now()
+        now = bot_clock.now()
         
         # Проверяем, нужно ли обновить (каждые 4 часа)
         if key in last_regime_check:
@@ -1433,13 +1669,16 @@ def check_market_regime(symbol: str, timeframe: str = '4h'):
                 return
         
         # Получаем данные
-        df = safe_fetch_ohlcv(symbol, timeframe, limit=100)
-        if df is None or len(df) < 100:
+        ohlcv = safe_fetch_ohlcv(symbol, timeframe, limit=100)
+        if len(ohlcv) < 100:
             return
         
         # Анализируем режим
-        monitor = MarketRegimeMonitor()
-        regime_info = monitor.analyze_market_regime(df)
+        if strategy_pool is not None:
+            regime_info, _ = strategy_pool.submit('regime', timeframe, pack_candles(ohlcv)).result()
+        else:
+            monitor = MarketRegimeMonitor()
+            regime_info = monitor.analyze_market_regime(ohlcv_to_dataframe(ohlcv))
         
         if regime_info['regime'] == 'ERROR':
             return
@@ -1456,7 +1695,7 @@ def check_market_regime(symbol: str, timeframe: str = '4h'):
         # 3. Уверенность > 60%
         if (regime_changed or time_since_check >= 4) and regime_info['confidence'] >= 60:
             message = format_regime_message(regime_info, symbol, timeframe)
-            send_telegram(message)
+            send_telegram(message, kind='regime', symbol=symbol, timeframe=timeframe)
             
             if regime_changed:
                 logger.info(f"🔄 Режим изменился: {symbol} {timeframe} → {current_regime}")
@@ -1471,16 +1710,27 @@ def check_market_regime(symbol: str, timeframe: str = '4h'):
         logger.error(f"Market regime check error for {symbol}: {e}")
 
 # === УЛУЧШЕННАЯ СВОДКА С МОНИТОРИНГОМ ===
+def format_outcomes_line(performance):
+    """Строка сводки по исходам отправленных сигналов"""
+    if performance['trades'] == 0:
+        return f"🎲 Исходов пока нет (открыто: *{performance['open']}*)\n"
+    return (f"🎲 Исходы: ✅{performance['tp']} ❌{performance['sl']} ⌛{performance['expired']} | "
+            f"WR *{performance['win_rate']:.0f}%* | средний R *{performance['avg_r']:+.2f}* | "
+            f"открыто *{performance['open']}*\n")
+
+@stage_timer.timed('summary')
 def send_summary():
     health_summary = health_monitor.get_summary()
     cache_stats = data_cache.get_health_stats()
     
-    msg = f"📊 *Статистика сигналов*\n`{datetime.now().strftime('%Y-%m-%d %H:%M')}`\n━━━━━━━━━━━━━━━━━━━━\n"
+    msg = f"📊 *Статистика сигналов*\n`{bot_clock.now().strftime('%Y-%m-%d %H:%M')}`\n━━━━━━━━━━━━━━━━━━━━\n"
     
+    # Счётчики за всё время из хранилища - не обнуляются при перезапуске
+    counts = data_persistence.get_signal_counts()
     total_signals = 0
     for s in symbols:
         for tf in timeframes.keys():
-            st = stats[s][tf]
+            st = counts[s][tf]
             if st['Total'] > 0:
                 msg += f"`{s:<10}` {tf:>3}: 📈{st['LONG']} 📉{st['SHORT']} (всего: {st['Total']})\n"
                 total_signals += st['Total']
@@ -1490,6 +1740,7 @@ def send_summary():
     
     msg += f"\n━━━━━━━━━━━━━━━━━━━━\n"
     msg += f"🎯 Всего сигналов: *{total_signals}*\n"
+    msg += format_outcomes_line(outcome_tracker.performance())
     msg += f"🏥 Статус: *{health_summary['status']}*\n"
     msg += f"⏱️ Время работы: *{health_summary['uptime_hours']}ч*\n"
     msg += f"✅ API успешность: *{health_summary['success_rate']}%*\n"
@@ -1499,18 +1750,20 @@ def send_summary():
     if health_summary['recent_errors'] > 0:
         msg += f"⚠️ Ошибок за час: *{health_summary['recent_errors']}*\n"
     
-    send_telegram(msg)
+    send_telegram(msg, kind='summary')
 
 # === Ежедневная сводка ===
+@stage_timer.timed('daily_report')
 def send_daily_report():
-    msg = f"📈 *Ежедневный отчёт*\n`{datetime.now().strftime('%Y-%m-%d')}`\n{'='*30}\n\n"
+    msg = f"📈 *Ежедневный отчёт*\n`{bot_clock.now().strftime('%Y-%m-%d')}`\n{'='*30}\n\n"
     
+    counts = data_persistence.get_signal_counts(hours=24)
     for s in symbols:
-        symbol_total = sum(stats[s][tf]['Total'] for tf in timeframes.keys())
+        symbol_total = sum(counts[s][tf]['Total'] for tf in timeframes.keys())
         if symbol_total > 0:
             msg += f"*{s}*\n"
             for tf in timeframes.keys():
-                st = stats[s][tf]
+                st = counts[s][tf]
                 if st['Total'] > 0:
                     long_pct = (st['LONG'] / st['Total'] * 100) if st['Total'] > 0 else 0
                     short_pct = (st['SHORT'] / st['Total'] * 100) if st['Total'] > 0 else 0
@@ -1519,8 +1772,185 @@ def send_daily_report():
                            f"SHORT {st['SHORT']} ({short_pct:.0f}%)\n")
             msg += "\n"
     
-    msg += f"{'='*30}\n🎯 *Лучшая стратегия:* 4h Turtle\n💡 Следи за пробоями!"
-    send_telegram(msg)
+    msg += f"{'='*30}\n"
+    msg += format_outcomes_line(outcome_tracker.performance())
+    msg += f"🎯 *Лучшая стратегия:* 4h Turtle\n💡 Следи за пробоями!"
+    send_telegram(msg, kind='daily_report')
+
+# === КОНВЕЙЕР ПАР ===
+# Потоки стадий: загрузка - сеть, индикаторы - CPU; стадии с общим состоянием бота - по одному
+PIPELINE_FETCH_WORKERS = int(os.environ.get("PIPELINE_FETCH_WORKERS", 1))
+PIPELINE_INDICATOR_WORKERS = int(os.environ.get("PIPELINE_INDICATOR_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 4))
+# Интервал между запросами к бирже (раньше - пауза 15-25с после обработки каждой пары)
+FETCH_INTERVAL = float(os.environ.get("FETCH_INTERVAL", 15))
+FETCH_JITTER = float(os.environ.get("FETCH_JITTER", 10))
+
+fetch_limiter = RateLimiter(FETCH_INTERVAL, FETCH_JITTER)
+
+class PairJob:
+    """Пара и таймфрейм на стадиях конвейера"""
+    __slots__ = ('symbol', 'timeframe', 'ohlcv', 'fetched_at', 'df', 'precomputed', 'decision', 'signal',
+                 'chart')
+    
+    def __init__(self, symbol, timeframe):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.ohlcv = None
+        self.fetched_at = None
+        self.df = None
+        self.precomputed = False
+        self.decision = None
+        self.signal = None
+        self.chart = None
+
+def fetch_stage(job):
+    fetch_limiter.wait()
+    job.ohlcv = safe_fetch_ohlcv(job.symbol, job.timeframe, limit=timeframes[job.timeframe])
+    job.fetched_at = bot_clock.time()
+    return job
+
+def validate_stage(job):
+    """
+    Свечи без пропусков и с корректными OHLC -> DataFrame
+    
+    Пустые или битые свечи - ошибка стадии: on_pipeline_error считает её сбоем API
+    """
+    is_valid, message = DataValidator.validate_ohlcv_data(job.ohlcv)
+    if not is_valid:
+        raise ValueError(f"Data validation failed: {message}")
+    job.df = ohlcv_to_dataframe(job.ohlcv)
+    return job
+
+# Индикаторы для одного прохода по последней свече: у гибридной - только нужной ветки
+PIPELINE_INDICATORS = {**STRATEGY_INDICATORS, strategy_4h_hybrid: add_hybrid_branch_indicators}
+
+def indicators_stage(job):
+    """
+    Индикаторы стратегии таймфрейма - в df, стратегия получит precomputed=True;
+    с пулом процессов - индикаторы и стратегия целиком в процессе пула
+    """
+    _, strategy_func = get_strategy(job.timeframe)
+    if strategy_func is None or len(job.df) < 100:
+        return job
+    if strategy_pool is not None:
+        job.decision, seconds = strategy_pool.submit('strategy', job.timeframe, pack_candles(job.ohlcv)).result()
+        stage_timer.record('strategy', seconds)
+        STRATEGY_SECONDS.labels(strategy_id(strategy_func)).observe(seconds)
+        return job
+    indicators = PIPELINE_INDICATORS.get(strategy_func)
+    if indicators is not None:
+        indicators(job.df)
+        job.precomputed = True
+    return job
+
+def strategy_stage(job):
+    job.signal = evaluate_signal(job.df, job.symbol, job.timeframe, job.fetched_at, job.precomputed,
+                                 job.decision)
+    return job if job.signal is not None else None
+
+def render_stage(job):
+    job.chart = render_signal_chart(job.signal)
+    return job
+
+def deliver_stage(job):
+    publish_signal(job.signal, job.chart, render=False)
+    return job
+
+# Ошибка загрузки или данных - сбой API, как раньше в цикле по парам
+API_STAGES = ('fetch', 'validate')
+
+# === ПУЛ ПРОЦЕССОВ СТРАТЕГИЙ ===
+# Процессов для индикаторов и стратегий (0 - в потоках стадии индикаторов, под GIL).
+# Поток стадии индикаторов ждёт свой расчёт в пуле, поэтому с пулом потоков
+# стадии не меньше, чем процессов - иначе лишние процессы простаивают
+STRATEGY_PROCESSES = int(os.environ.get("STRATEGY_PROCESSES", 0))
+
+def evaluate_in_worker(kind, timeframe, df):
+    """
+    Расчёт в процессе пула по свечам пары
+    
+    'strategy' -> (signal, params) стратегии таймфрейма, 'regime' -> режим рынка
+    """
+    if kind == 'regime':
+        return MarketRegimeMonitor().analyze_market_regime(df)
+    _, strategy_func = get_strategy(timeframe)
+    indicators = PIPELINE_INDICATORS.get(strategy_func)
+    if indicators is not None:
+        indicators(df)
+    return strategy_func(df, precomputed=indicators is not None)
+
+strategy_pool = StrategyPool(evaluate_in_worker, STRATEGY_PROCESSES) if STRATEGY_PROCESSES > 0 else None
+
+def shutdown_strategy_pool():
+    if strategy_pool is not None:
+        strategy_pool.close()
+
+def on_pipeline_error(stage, job, error):
+    logger.error(f"Error {job.symbol} {job.timeframe} ({stage}): {error}")
+    if stage in API_STAGES:
+        health_monitor.record_api_call(success=False)
+        health_monitor.record_error("api_call", str(error))
+        # Пауза перед следующим запросом - ещё больше для Bybit
+        fetch_limiter.backoff(30 + random.uniform(0, 15))
+    else:
+        health_monitor.record_error("signal_check", str(error))
+
+def build_signal_pipeline(inline=False):
+    """
+    Загрузка -> проверка -> индикаторы -> стратегия -> график -> отправка
+    
+    inline=True - без потоков (подменённая отправка: прогон по истории детерминирован)
+    
+    С пулом процессов стратегий у стадии индикаторов по потоку на процесс
+    (каждый поток держит в пуле один расчёт) и очередь на два расчёта на процесс.
+    """
+    indicator_workers = PIPELINE_INDICATOR_WORKERS
+    indicator_queue = PIPELINE_QUEUE_SIZE
+    if strategy_pool is not None:
+        indicator_workers = max(indicator_workers, strategy_pool.workers)
+        indicator_queue = max(indicator_queue, 2 * indicator_workers)
+    return Pipeline([
+        Stage('fetch', fetch_stage, PIPELINE_FETCH_WORKERS, PIPELINE_QUEUE_SIZE),
+        Stage('validate', validate_stage, 1, PIPELINE_QUEUE_SIZE),
+        Stage('indicators', indicators_stage, indicator_workers, indicator_queue),
+        Stage('strategy', strategy_stage, 1, PIPELINE_QUEUE_SIZE),
+        Stage('render', render_stage, max(1, CHART_WORKERS), PIPELINE_QUEUE_SIZE),
+        Stage('deliver', deliver_stage, 1, PIPELINE_QUEUE_SIZE),
+    ], on_error=on_pipeline_error, inline=inline, name='pairs')
+
+# === ШАРДЫ (несколько инстансов бота) ===
+# Общая база SQLite для инстансов (пусто - один инстанс проверяет все пары)
+SHARD_DB = os.environ.get("SHARD_DB", "")
+INSTANCE_ID = os.environ.get("INSTANCE_ID") or None
+SHARD_LEASE = float(os.environ.get("SHARD_LEASE", DEFAULT_LEASE))
+
+shard_coordinator = (ShardCoordinator(SHARD_DB, [(symbol, tf) for symbol in symbols for tf in timeframes],
+                                      INSTANCE_ID, SHARD_LEASE) if SHARD_DB else None)
+if shard_coordinator is not None and INSTANCE_ID is None:
+    logger.warning(f"SHARD_DB без INSTANCE_ID: имя {shard_coordinator.instance_id} и каталог данных "
+                   f"будут другими после перезапуска")
+
+def instance_data_dir(base='bot_data'):
+    """
+    Каталог данных инстанса: с шардированием - bot_data/<INSTANCE_ID>
+    
+    SignalStore.compact() подменяет signals.jsonl через os.replace - другой
+    процесс с открытым на дозапись файлом писал бы в удалённый inode, а
+    signals.index.json переписывали бы оба
+    """
+    if shard_coordinator is None:
+        return base
+    return os.path.join(base, shard_coordinator.instance_id.replace(os.sep, '_'))
+
+def owns_shard(symbol, timeframe):
+    """Пара за этим инстансом (без шардирования - все пары)"""
+    return shard_coordinator is None or shard_coordinator.owns(symbol, timeframe)
+
+def shutdown_shards():
+    """Отпустить шарды - остальные инстансы заберут их на следующем heartbeat"""
+    if shard_coordinator is not None:
+        shard_coordinator.close()
 
 # === УЛУЧШЕННЫЙ ОСНОВНОЙ ЦИКЛ ===
 def send_startup_message():
@@ -1545,15 +1975,48 @@ def send_startup_message():
             "• 12h: 1 hour\n"
             "• 1d: 2 hours"
         )
-        send_telegram(message)
+        send_telegram(message, kind='startup')
         return True
     except Exception as e:
         print(f"Error sending startup message: {e}")
         return False
 
-def main_loop():
+def reset_runtime_state():
+    """
+    Сброс состояния бота (статистика, кулдауны, расписание сводок, мониторинг)
+    на текущее время часов - нужен после подмены часов на симулированные
+    """
+    global stats, last_signal_time, last_summary_time, last_daily_report
+    global last_regime_check, last_regime_state, health_monitor, data_cache, health_check_system
+    global outcome_tracker, latency_tracker
+    
+    stats = make_stats(symbols, timeframes)
+    outcome_tracker = OutcomeTracker()
+    last_signal_time = {}
+    last_summary_time = bot_clock.now() - timedelta(minutes=35)
+    last_daily_report = bot_clock.now() - timedelta(days=1)
+    last_regime_check = {}
+    last_regime_state = {}
+    health_monitor = HealthMonitor()
+    data_cache = DataCache()
+    health_check_system = HealthCheckSystem()
+    latency_tracker = new_latency_tracker()
+
+def main_loop(run_until=None):
+    """
+    Основной цикл бота
+    
+    Args:
+        run_until: datetime остановки по часам бота (None - работать бесконечно)
+    """
     global last_summary_time, last_daily_report, last_status_time, last_processed_tf
     
+    # Сигналы, которые ещё могли не дойти до SL/TP/истечения, снова отслеживаются
+    restore_hours = outcome_tracker.expiry_bars * max(map(timeframe_to_seconds, timeframes)) / 3600
+    restored = outcome_tracker.restore(data_persistence.get_recent_signals(hours=restore_hours))
+    if restored:
+        logger.info(f"Restored {restored} open signals for outcome tracking")
+    
     # Send startup message
     if not send_startup_message():
         print("⚠️ Failed to send startup message, will retry later")
@@ -1561,24 +2024,25 @@ def main_loop():
     # Отправка режима рынка при запуске для основных пар
     print("\n🔍 Проверка режима рынка при запуске...")
     for main_symbol in ['SOL/USDT', 'BTC/USDT', 'ETH/USDT']:
-        if main_symbol in symbols:
+        if main_symbol in symbols and owns_shard(main_symbol, '4h'):
             try:
-                df = safe_fetch_ohlcv(main_symbol, '4h', limit=100)
-                if df is not None and len(df) >= 100:
+                ohlcv = safe_fetch_ohlcv(main_symbol, '4h', limit=100)
+                if len(ohlcv) >= 100:
+                    df = ohlcv_to_dataframe(ohlcv)
                     monitor = MarketRegimeMonitor()
                     regime_info = monitor.analyze_market_regime(df)
                     
                     if regime_info['regime'] != 'ERROR' and regime_info['confidence'] >= 60:
                         message = format_regime_message(regime_info, main_symbol, '4h')
-                        send_telegram(message)
+                        send_telegram(message, kind='regime', symbol=main_symbol, timeframe='4h')
                         print(f"✅ Режим рынка отправлен: {main_symbol} → {regime_info['regime']}")
                         
                         # Сохраняем начальное состояние
                         key = f"{main_symbol}_4h"
                         last_regime_state[key] = regime_info['regime']
-                        last_regime_check[key] = datetime.now()
+                        last_regime_check[key] = bot_clock.now()
                 
-                time.sleep(3)  # Пауза между парами
+                bot_clock.sleep(3)  # Пауза между парами
             except Exception as e:
                 print(f"⚠️ Ошибка проверки режима {main_symbol}: {e}")
     
@@ -1586,7 +2050,7 @@ def main_loop():
     last_processed_tf = list(timeframes.keys())[0] if timeframes else "N/A"
     
     # Initialize last_status_time to ensure first status is sent immediately
-    last_status_time = datetime.now() - timedelta(minutes=6)
+    last_status_time = bot_clock.now() - timedelta(minutes=6)
     
     # Очень консервативные интервалы проверки для Bybit
     check_intervals = {
@@ -1594,21 +2058,34 @@ def main_loop():
         '12h': 3600, # 1 час (увеличено с 30 минут)
         '1d': 7200   # 2 часа (увеличено с 1 часа)
     }
-    last_check = {tf: datetime.now() - timedelta(seconds=check_intervals[tf]) for tf in timeframes.keys()}
+    last_check = {tf: bot_clock.now() - timedelta(seconds=check_intervals[tf]) for tf in timeframes.keys()}
     
     # Счётчик ошибок для адаптивного поведения
     error_count = 0
     max_errors = 10
     
-    while True:
+    # PROFILE_CYCLES=N - сэмплирование и спаны на первые N циклов (profiling.py)
+    profiler = CycleProfiler.from_env()
+    
+    signal_pipeline = build_signal_pipeline(inline=telegram_sender is not None)
+    
+    while run_until is None or bot_clock.now() < run_until:
+        if profiler is not None and not profiler.next_cycle():
+            profiler = None
         try:
-            now = datetime.now()
+            now = bot_clock.now()
             
             # Проверка каждого таймфрейма по расписанию
             for tf in timeframes.keys():
                 if (now - last_check[tf]).total_seconds() < check_intervals[tf]:
                     continue
                 
+                # Пары таймфрейма, закреплённые за этим инстансом
+                tf_symbols = [symbol for symbol in symbols if owns_shard(symbol, tf)]
+                if not tf_symbols:
+                    continue
+                
+                cycle_started = time.perf_counter()
                 print(f"\n{'='*50}")
                 print(f"🔍 Checking {tf} timeframe...")
                 print(f"{'='*50}")
@@ -1616,55 +2093,36 @@ def main_loop():
                 # Проверка режима рынка для основных пар (только на 4h)
                 if tf == '4h':
                     for main_symbol in ['SOL/USDT', 'BTC/USDT', 'ETH/USDT']:
-                        if main_symbol in symbols:
+                        if main_symbol in symbols and owns_shard(main_symbol, '4h'):
                             check_market_regime(main_symbol, '4h')
-                            time.sleep(2)  # Пауза между проверками
+                            bot_clock.sleep(2)  # Пауза между проверками
                 
-                # Обработка символов с улучшенной обработкой ошибок
-                successful_symbols = 0
-                for i, symbol in enumerate(symbols):
-                    try:
-                        limit = timeframes[tf]
-                        ohlcv = safe_fetch_ohlcv(symbol, tf, limit=limit)
-                        
-                        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                        
-                        check_signal(df, symbol, tf)
-                        successful_symbols += 1
-                        health_monitor.record_api_call(success=True)
-                        
-                        # Адаптивная задержка между символами - увеличена для Bybit
-                        if i < len(symbols) - 1:  # Не ждём после последнего символа
-                            delay = 15 + random.uniform(0, 10)  # 15-25 секунд
-                            logger.info(f"Waiting {delay:.1f}s before next symbol...")
-                            time.sleep(delay)
-                        
-                    except Exception as e:
-                        logger.error(f"Error {symbol} {tf}: {e}")
-                        health_monitor.record_api_call(success=False)
-                        health_monitor.record_error("api_call", str(e))
-                        error_count += 1
-                        
-                        # Если слишком много ошибок, увеличиваем интервалы
-                        if error_count > max_errors:
-                            logger.warning(f"Too many errors ({error_count}), increasing intervals...")
-                            for tf_key in check_intervals:
-                                check_intervals[tf_key] *= 1.5
-                            error_count = 0
-                        
-                        # Увеличенная задержка при ошибке - ещё больше для Bybit
-                        time.sleep(30 + random.uniform(0, 15))  # 30-45 секунд
-                        continue
+                # Пары проходят стадии конвейера одновременно: пока одна загружается,
+                # другая считается - проход занимает время самой медленной стадии
+                result = signal_pipeline.run(PairJob(symbol, tf) for symbol in tf_symbols)
+                successful_symbols = result['items'] - sum(result['failed'].values())
+                for _ in range(successful_symbols):
+                    health_monitor.record_api_call(success=True)
                 
-                    if successful_symbols > 0:
-                        last_check[tf] = now
-                        print(f"✅ Successfully processed {successful_symbols}/{len(symbols)} symbols for {tf}")
-                    else:
-                        print(f"⚠️ No successful requests for {tf}, will retry later")
+                error_count += sum(result['failed'].get(stage, 0) for stage in API_STAGES)
+                # Если слишком много ошибок, увеличиваем интервалы
+                if error_count > max_errors:
+                    logger.warning(f"Too many errors ({error_count}), increasing intervals...")
+                    for tf_key in check_intervals:
+                        check_intervals[tf_key] *= 1.5
+                    error_count = 0
+                
+                if successful_symbols > 0:
+                    last_check[tf] = now
+                    print(f"✅ Successfully processed {successful_symbols}/{len(tf_symbols)} symbols for {tf} "
+                          f"in {result['seconds']:.1f}s")
+                else:
+                    print(f"⚠️ No successful requests for {tf}, will retry later")
+                
+                CYCLE_SECONDS.labels(tf).observe(time.perf_counter() - cycle_started)
                 
                 # Задержка между таймфреймами - увеличена для Bybit
-                time.sleep(20 + random.uniform(0, 10))  # 20-30 секунд
+                bot_clock.sleep(20 + random.uniform(0, 10))  # 20-30 секунд
             
             # Health check каждые 5 минут (объединяет все статусные сообщения)
             if health_check_system.should_send_health_check():
@@ -1705,21 +2163,25 @@ def main_loop():
             # Sleep with jitter to avoid rate limiting
             sleep_time = 300 + random.uniform(0, 60)  # 5-6 minutes
             print(f"😴 Sleeping {sleep_time:.1f}s before next cycle...")
-            time.sleep(sleep_time)
+            bot_clock.sleep(sleep_time)
             
         except Exception as e:
             error_msg = f"❌ *Критическая ошибка:*\n`{str(e)[:200]}`"
-            send_telegram(error_msg)
+            send_telegram(error_msg, kind='critical')
             print(f"Main loop error: {e}")
             error_count += 1
             
             # Экспоненциальная задержка при критических ошибках
             sleep_time = min(300, 60 * (2 ** min(error_count, 5)))
             print(f"💤 Critical error sleep: {sleep_time}s")
-            time.sleep(sleep_time)
+            bot_clock.sleep(sleep_time)
+    
+    signal_pipeline.close()
+    if profiler is not None:
+        profiler.finish()
 
 # Инициализация компонентов после определения всех классов
-data_persistence = DataPersistence()
+data_persistence = DataPersistence(instance_data_dir())
 health_monitor = HealthMonitor()
 data_cache = DataCache()
 health_check_system = HealthCheckSystem()
@@ -1739,11 +2201,26 @@ if __name__ == '__main__':
     print(f"✅ Data Validation: ENABLED")
     print("="*70)
     
+    # Процессы графиков и стратегий - до фоновых потоков, чтобы fork не копировал их состояние
+    chart_renderer.start()
+    if strategy_pool is not None:
+        strategy_pool.start()
+    start_background_threads()
+    if shard_coordinator is not None:
+        shard_coordinator.start()
+    
     try:
         main_loop()
     except KeyboardInterrupt:
         print("\n⛔ Бот остановлен пользователем")
-        send_telegram("⛔ *Бот остановлен*")
+        send_telegram("⛔ *Бот остановлен*", kind='critical')
     except Exception as e:
         print(f"\n❌ Критическая ошибка: {e}")
-        send_telegram(f"❌ *Бот упал:* `{str(e)[:200]}`")
\ No newline at end of file
+        send_telegram(f"❌ *Бот упал:* `{str(e)[:200]}`", kind='critical')
+    finally:
+        shutdown_shards()
+        shutdown_strategy_pool()
+        shutdown_charts()
+        shutdown_telegram()
+        # Последние сигналы и агрегаты - на диск (fsync) после остановки конвейера и отправки
+        data_persistence.close()
\ No newline at end of file
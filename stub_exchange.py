@@ -0,0 +1,315 @@
+"""
+Stub Exchange - Локальная биржа, совместимая с ccxt, для нагрузочных тестов
+
+Подменяет OKX/Bybit/KuCoin в DataProvider и ExchangeManager:
+- fetch_ohlcv, fetch_ticker, fetch_tickers, load_markets, fetch_time
+- данные - архивные или синтетические свечи {(symbol, timeframe): df}
+- отдаются только свечи, закрытые к текущему времени bot_clock, поэтому
+  на симулированных часах биржа "живёт" вместе с ботом
+- управляемые сбои: задержка, сетевые ошибки, ответы 429 (случайные и
+  по превышению лимита запросов), таймауты и окна недоступности
+
+Ошибки - настоящие исключения ccxt (NetworkError, RateLimitExceeded,
+ExchangeNotAvailable, RequestTimeout), поэтому обработчики бота и
+ExchangeManager работают с заглушкой так же, как с биржей.
+"""
+
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import bot_clock
+from lazy_imports import lazy_module
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Исключения ccxt нужны только при имитации сбоев
+ccxt = lazy_module('ccxt')
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class StubExchange:
+    """In-process биржа с интерфейсом ccxt.Exchange (публичная часть)"""
+
+    def __init__(
+        self,
+        candles: Dict[Tuple[str, str], pd.DataFrame],
+        exchange_id: str = 'stub',
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_429_rate: float = 0.0,
+        max_requests_per_second: Optional[float] = None,
+        timeout: int = 30000,
+        outages: Optional[List[Tuple[datetime, datetime]]] = None,
+        align_to: Optional[datetime] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            candles: {(symbol, timeframe): OHLCV DataFrame}
+            exchange_id: id биржи (как у ccxt: 'okx', 'bybit', ...)
+            latency: Средняя задержка ответа, с
+            jitter: Разброс задержки (экспоненциальный хвост), с
+            error_rate: Доля запросов с сетевой ошибкой
+            rate_limit_429_rate: Доля запросов со случайным ответом 429
+            max_requests_per_second: Лимит запросов, сверх него - 429
+            timeout: Таймаут клиента в мс (задержка больше - RequestTimeout)
+            outages: Окна недоступности [(начало, конец)] по часам бота
+            align_to: Сдвинуть архив так, чтобы последняя свеча закрывалась в этот момент
+            seed: Seed для задержек и сбоев
+        """
+        self.id = exchange_id
+        self.name = f"Stub {exchange_id.upper()}"
+        self.rateLimit = 0
+        self.enableRateLimit = False
+        self.timeout = timeout
+        self.has = {
+            'fetchOHLCV': True, 'fetchTicker': True, 'fetchTickers': True,
+            'fetchTime': True, 'loadMarkets': True,
+        }
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_429_rate = rate_limit_429_rate
+        self.max_requests_per_second = max_requests_per_second
+        self.outages = list(outages or [])
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._request_times: List[float] = []
+        self.stats = Counter()
+
+        shift_ms = 0
+        if align_to is not None and candles:
+            last_close = max(
+                df['timestamp'].iloc[-1] + pd.Timedelta(seconds=timeframe_to_seconds(tf))
+                for (_, tf), df in candles.items() if len(df)
+            )
+            shift_ms = (pd.Timestamp(align_to) - last_close).value // 1_000_000
+
+        # Для каждой серии: время закрытия свечей и массив OHLCV (timestamp в мс)
+        self._series = {}
+        for (symbol, timeframe), df in candles.items():
+            values = df[OHLCV_COLUMNS[1:]].to_numpy(dtype=float)
+            open_ms = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64) + shift_ms
+            close_ms = open_ms + timeframe_to_seconds(timeframe) * 1000
+            self._series[(symbol, timeframe)] = (open_ms, close_ms, values)
+
+        self.symbols = sorted({symbol for symbol, _ in candles})
+        self.timeframes = {tf: tf for tf in sorted({tf for _, tf in candles}, key=timeframe_to_seconds)}
+        self.markets = {}
+
+    # === СБОИ ===
+    def start_outage(self, duration: float):
+        """Биржа недоступна duration секунд начиная с текущего момента"""
+        now = bot_clock.now()
+        self.outages.append((now, now + timedelta(seconds=duration)))
+
+    def _request(self, method: str):
+        """Задержка и сбои перед каждым запросом"""
+        with self._lock:
+            self.stats[f'{method}.requests'] += 1
+            draw_error, draw_429 = self._rng.random(2)
+            delay = self.latency + (self._rng.exponential(self.jitter) if self.jitter else 0.0)
+
+        now = bot_clock.now()
+        if any(start <= now < end for start, end in self.outages):
+            self._fail(method, 'outage')
+            raise ccxt.ExchangeNotAvailable(f"{self.id} 503 Service Unavailable")
+
+        if self.max_requests_per_second:
+            moment = bot_clock.time()
+            with self._lock:
+                self._request_times = [t for t in self._request_times if moment - t < 1.0]
+                limited = len(self._request_times) >= self.max_requests_per_second
+                if not limited:
+                    self._request_times.append(moment)
+            if limited:
+                self._fail(method, '429')
+                raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests")
+
+        if delay > 0:
+            if delay * 1000 > self.timeout:
+                bot_clock.sleep(self.timeout / 1000)
+                self._fail(method, 'timeout')
+                raise ccxt.RequestTimeout(f"{self.id} GET {method} timed out ({self.timeout} ms)")
+            bot_clock.sleep(delay)
+
+        if draw_429 < self.rate_limit_429_rate:
+            self._fail(method, '429')
+            raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests")
+        if draw_error < self.error_rate:
+            self._fail(method, 'error')
+            raise ccxt.NetworkError(f"{self.id} GET {method} connection reset")
+
+    def _fail(self, method: str, kind: str):
+        with self._lock:
+            self.stats[f'{method}.{kind}'] += 1
+
+    # === ДАННЫЕ ===
+    def _resolve(self, symbol: str) -> str:
+        """'SOL/USDT:USDT' (фьючерсы) -> 'SOL/USDT'"""
+        base_symbol = symbol.split(':')[0]
+        if base_symbol not in self.symbols:
+            raise ccxt.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+        return base_symbol
+
+    def _closed(self, symbol: str, timeframe: str):
+        """Свечи, закрытые к текущему моменту часов бота"""
+        series = self._series.get((symbol, timeframe))
+        if series is None:
+            raise ccxt.BadRequest(f"{self.id} has no {timeframe} candles for {symbol}")
+        open_ms, close_ms, values = series
+        end = int(np.searchsorted(close_ms, self.milliseconds(), side='right'))
+        return open_ms[:end], values[:end]
+
+    def milliseconds(self) -> int:
+        return pd.Timestamp(bot_clock.now()).value // 1_000_000
+
+    def load_markets(self, reload: bool = False, params: Optional[Dict] = None) -> Dict:
+        if self.markets and not reload:
+            return self.markets
+        self._request('load_markets')
+        self.markets = {
+            symbol: {
+                'id': symbol.replace('/', '-'),
+                'symbol': symbol,
+                'base': symbol.split('/')[0],
+                'quote': symbol.split('/')[1],
+                'type': 'spot',
+                'spot': True,
+                'active': True,
+            }
+            for symbol in self.symbols
+        }
+        return self.markets
+
+    def fetch_time(self, params: Optional[Dict] = None) -> int:
+        self._request('fetch_time')
+        return self.milliseconds()
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: Optional[int] = None,
+                    limit: Optional[int] = None, params: Optional[Dict] = None) -> List[list]:
+        self._request('fetch_ohlcv')
+        open_ms, values = self._closed(self._resolve(symbol), timeframe)
+        limit = limit or 100
+
+        if since is not None:
+            start = int(np.searchsorted(open_ms, since, side='left'))
+            stop = min(len(open_ms), start + limit)
+        else:
+            stop = len(open_ms)
+            start = max(0, stop - limit)
+
+        rows = np.column_stack([open_ms[start:stop], values[start:stop]]).tolist()
+        for row in rows:
+            row[0] = int(row[0])
+        return rows
+
+    def _ticker(self, symbol: str) -> Dict:
+        """Тикер по самому мелкому таймфрейму: цена закрытия и статистика за 24ч"""
+        timeframe = next(tf for tf in self.timeframes if (symbol, tf) in self._series)
+        open_ms, values = self._closed(symbol, timeframe)
+        if not len(open_ms):
+            raise ccxt.BadRequest(f"{self.id} has no closed candles for {symbol} yet")
+
+        now = self.milliseconds()
+        day = values[int(np.searchsorted(open_ms, now - 86_400_000, side='left')):]
+        last = float(values[-1, 3])
+        opened = float(day[0, 0])
+
+        return {
+            'symbol': symbol,
+            'timestamp': now,
+            'datetime': pd.Timestamp(now, unit='ms').isoformat() + 'Z',
+            'open': opened,
+            'high': float(day[:, 1].max()),
+            'low': float(day[:, 2].min()),
+            'close': last,
+            'last': last,
+            'bid': last,
+            'ask': last,
+            'change': last - opened,
+            'percentage': (last - opened) / opened * 100 if opened else None,
+            'baseVolume': float(day[:, 4].sum()),
+            'quoteVolume': float((day[:, 4] * day[:, 3]).sum()),
+        }
+
+    def fetch_ticker(self, symbol: str, params: Optional[Dict] = None) -> Dict:
+        self._request('fetch_ticker')
+        ticker = self._ticker(self._resolve(symbol))
+        ticker['symbol'] = symbol
+        return ticker
+
+    def fetch_tickers(self, symbols: Optional[List[str]] = None, params: Optional[Dict] = None) -> Dict:
+        self._request('fetch_tickers')
+        return {symbol: self._ticker(self._resolve(symbol)) for symbol in (symbols or self.symbols)}
+
+
+def synthetic_symbols(count: int) -> List[str]:
+    """Имена пар для нагрузки: сначала реальные пары бота, затем SYN000/USDT..."""
+    import sol_signal_bot as bot
+
+    names = list(bot.symbols[:count])
+    names += [f'SYN{n:03d}/USDT' for n in range(count - len(names))]
+    return names
+
+
+def stub_from_synthetic(symbols: List[str], timeframes=('4h', '12h', '1d'), days: int = 120,
+                        end: Optional[datetime] = None, seed: int = 42, **kwargs) -> StubExchange:
+    """Заглушка на синтетических данных, последняя свеча закрывается в end (по умолчанию сейчас)"""
+    from synthetic_data import generate_market
+
+    market = generate_market(symbols, timeframes, days=days, seed=seed)
+    return StubExchange(market, align_to=end or bot_clock.now(), seed=seed, **kwargs)
+
+
+def run_load_test(multiplier: int = 10, hours: float = 24, latency: float = 0.15, error_rate: float = 0.02,
+                  rate_limit_429_rate: float = 0.01, seed: int = 42):
+    """
+    Нагрузочный прогон всего бота: multiplier × пар бота на заглушке биржи
+
+    Бот работает на симулированных часах (bot_replay) через настоящий
+    DataProvider, который смотрит в StubExchange.
+
+    Returns:
+        (сообщения, сводка прогона, статистика заглушки)
+    """
+    import sol_signal_bot as bot
+    from bot_replay import replay_bot
+    from data_provider import DataProvider
+
+    symbols = synthetic_symbols(len(bot.symbols) * multiplier)
+    end = datetime(2025, 1, 1)
+    start = end - timedelta(hours=hours)
+
+    stub = stub_from_synthetic(symbols, days=120, end=end, seed=seed, latency=latency, jitter=latency / 2,
+                               error_rate=error_rate, rate_limit_429_rate=rate_limit_429_rate)
+    provider = DataProvider(exchange=stub)
+
+    messages, summary = replay_bot({}, start, end, symbols, seed=seed, provider=provider)
+    return messages, summary, dict(stub.stats)
+
+
+# Пример использования
+if __name__ == "__main__":
+    from bot_replay import print_bot_replay_report
+
+    # Ошибки заглушки ожидаемы - не засоряем вывод логами DataProvider
+    logging.getLogger('data_provider').setLevel(logging.CRITICAL)
+
+    messages, summary, stub_stats = run_load_test(multiplier=10, hours=12)
+    print_bot_replay_report(messages, summary)
+
+    print("\n🧪 Заглушка биржи:")
+    for key, count in sorted(stub_stats.items()):
+        print(f"  {key:<28} {count}")
@@ -0,0 +1,242 @@
+"""
+Subscriptions - Подписки чатов на сигналы по парам, таймфреймам и стратегиям
+
+Бот отправлял всё в один CHAT_ID. Здесь у каждого чата свой фильтр:
+пары, таймфреймы, стратегии и виды сообщений (пустой фильтр - всё).
+Фильтры разворачиваются в индекс (symbol, timeframe, strategy) -> чаты,
+где '*' - любое значение, так что поиск получателей сигнала - 8 обращений
+к словарю независимо от числа подписчиков. Для сообщений, где задана
+только часть полей (режим рынка - только пара), есть индексы по полям.
+
+Подписки хранятся в bot_data/subscriptions.json и перечитываются при
+изменении файла, управление - из командной строки:
+
+    python subscriptions.py add 12345 --symbols SOL/USDT,BTC/USDT --timeframes 4h
+    python subscriptions.py remove 12345
+    python subscriptions.py list
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANY = '*'
+
+# Виды сообщений бота
+MESSAGE_KINDS = ('signal', 'regime', 'summary', 'daily_report', 'health_check', 'startup', 'critical',
+                 'latency')
+
+DEFAULT_PATH = os.path.join('bot_data', 'subscriptions.json')
+
+# Поля фильтра в порядке ключа индекса
+FILTER_FIELDS = ('symbols', 'timeframes', 'strategies')
+
+IndexKey = Tuple[str, str, str]
+
+
+@dataclass
+class Subscription:
+    """Подписка чата; пустой список - без ограничения"""
+    chat_id: str
+    symbols: List[str] = field(default_factory=list)
+    timeframes: List[str] = field(default_factory=list)
+    strategies: List[str] = field(default_factory=list)
+    kinds: List[str] = field(default_factory=list)
+
+    def index_keys(self) -> Iterable[IndexKey]:
+        return itertools.product(self.symbols or [ANY], self.timeframes or [ANY], self.strategies or [ANY])
+
+    def wants(self, kind: str) -> bool:
+        return not self.kinds or kind in self.kinds
+
+
+class SubscriptionRegistry:
+    """Подписки и индекс (symbol, timeframe, strategy) -> чаты"""
+
+    def __init__(self, path: str = DEFAULT_PATH, reload_interval: float = 5.0):
+        """
+        Args:
+            path: JSON-файл подписок (None - только в памяти)
+            reload_interval: Как часто (сек) проверять, не изменился ли файл
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._subscriptions: Dict[str, Subscription] = {}
+        self._index: Dict[IndexKey, Set[str]] = {}
+        self._fields: Dict[str, Dict[str, Set[str]]] = {}
+        self._by_kind: Dict[str, Set[str]] = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self.load()
+
+    # === ИНДЕКС ===
+    def _rebuild(self):
+        index: Dict[IndexKey, Set[str]] = {}
+        fields = {name: {} for name in FILTER_FIELDS}
+        by_kind: Dict[str, Set[str]] = {kind: set() for kind in MESSAGE_KINDS}
+        for chat_id, subscription in self._subscriptions.items():
+            for key in subscription.index_keys():
+                index.setdefault(key, set()).add(chat_id)
+            for name in FILTER_FIELDS:
+                for value in getattr(subscription, name) or [ANY]:
+                    fields[name].setdefault(value, set()).add(chat_id)
+            for kind in subscription.kinds or MESSAGE_KINDS:
+                by_kind.setdefault(kind, set()).add(chat_id)
+        self._index = index
+        self._fields = fields
+        self._by_kind = by_kind
+
+    def match(self, kind: Optional[str] = 'signal', symbol: Optional[str] = None,
+              timeframe: Optional[str] = None, strategy: Optional[str] = None) -> Set[str]:
+        """
+        Чаты, которым положено сообщение
+
+        Не заданные symbol/timeframe/strategy не фильтруют (например,
+        сводка - всем, кто подписан на вид 'summary'), kind=None - все чаты.
+        """
+        self._maybe_reload()
+        with self._lock:
+            wanted = self._by_kind.get(kind, set()) if kind is not None else set(self._subscriptions)
+            if symbol is None and timeframe is None and strategy is None:
+                return set(wanted)
+
+            values = dict(zip(FILTER_FIELDS, (symbol, timeframe, strategy)))
+            if None not in values.values():
+                chats = set()
+                for key in itertools.product(*((value, ANY) for value in values.values())):
+                    chats |= self._index.get(key, set())
+                return chats & wanted
+
+            # Часть полей не задана - пересечение индексов по заданным полям
+            chats = wanted
+            for name, value in values.items():
+                if value is not None:
+                    index = self._fields.get(name, {})
+                    chats = chats & (index.get(value, set()) | index.get(ANY, set()))
+            return set(chats)
+
+    # === ИЗМЕНЕНИЕ ===
+    def subscribe(self, chat_id, symbols: Iterable[str] = (), timeframes: Iterable[str] = (),
+                  strategies: Iterable[str] = (), kinds: Iterable[str] = (), save: bool = True) -> Subscription:
+        """Добавить или заменить подписку чата"""
+        kinds = list(kinds)
+        unknown = set(kinds) - set(MESSAGE_KINDS)
+        if unknown:
+            raise ValueError(f"Неизвестные виды сообщений: {sorted(unknown)}")
+        subscription = Subscription(str(chat_id), list(symbols), list(timeframes), list(strategies), kinds)
+        with self._lock:
+            self._subscriptions[subscription.chat_id] = subscription
+            self._rebuild()
+            if save:
+                self.save()
+        return subscription
+
+    def unsubscribe(self, chat_id, save: bool = True) -> bool:
+        with self._lock:
+            removed = self._subscriptions.pop(str(chat_id), None) is not None
+            if removed:
+                self._rebuild()
+                if save:
+                    self.save()
+            return removed
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def all(self) -> List[Subscription]:
+        with self._lock:
+            return list(self._subscriptions.values())
+
+    # === ФАЙЛ ===
+    def load(self):
+        """Прочитать файл подписок (нет файла - пустой реестр)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+            subscriptions = {str(r['chat_id']): Subscription(**{**r, 'chat_id': str(r['chat_id'])})
+                             for r in records}
+        except Exception as e:
+            logger.error(f"Error loading subscriptions from {self.path}: {e}")
+            return
+        with self._lock:
+            self._subscriptions = subscriptions
+            self._rebuild()
+            self._mtime = os.path.getmtime(self.path)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._lock:
+            records = [asdict(s) for s in self._subscriptions.values()]
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+    def _maybe_reload(self):
+        """Перечитать файл, если его изменили снаружи (не чаще reload_interval)"""
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Управление подписками чатов")
+    parser.add_argument('--file', default=DEFAULT_PATH, help="Файл подписок")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="Добавить/заменить подписку")
+    add.add_argument('chat_id')
+    for name in ('symbols', 'timeframes', 'strategies', 'kinds'):
+        add.add_argument(f'--{name}', default='', help="Через запятую, пусто - все")
+
+    remove = commands.add_parser('remove', help="Удалить подписку")
+    remove.add_argument('chat_id')
+
+    commands.add_parser('list', help="Показать подписки")
+
+    args = parser.parse_args()
+    registry = SubscriptionRegistry(args.file)
+
+    if args.command == 'add':
+        split = lambda value: [part.strip() for part in value.split(',') if part.strip()]
+        try:
+            subscription = registry.subscribe(args.chat_id, split(args.symbols), split(args.timeframes),
+                                              split(args.strategies), split(args.kinds))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"✅ {subscription}")
+    elif args.command == 'remove':
+        print("✅ Удалено" if registry.unsubscribe(args.chat_id) else "⚠️ Подписки нет")
+    else:
+        for subscription in registry.all():
+            print(subscription)
+        print(f"Всего: {len(registry)}")
+
+
+# Пример использования
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Synthetic Data - Генератор реалистичных OHLCV без биржи
+
+Для бенчмарков и нагрузочных тестов без OKX:
+- смена режимов (цепь Маркова): бычий тренд, медвежий тренд, боковик
+- в тренде - GBM со сносом, в боковике - возврат к уровню (AR(1))
+- кластеризация волатильности: лог-волатильность - процесс AR(1)
+- всплески объёма, объём растёт вместе с размером свечи
+- опционально ценовые гэпы и пропущенные свечи
+
+Всё считается векторно в NumPy (AR(1) - блоками), генерация идёт со
+скоростью миллионы свечей в секунду. Старшие таймфреймы собираются из
+младшего, поэтому 4h/12h/1d одной пары согласованы между собой.
+Данные воспроизводимы: seed + имя пары однозначно задают ряд.
+"""
+
+import logging
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from timeframes import timeframe_to_seconds
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+# Режимы рынка
+BULL, BEAR, RANGE = 0, 1, 2
+REGIME_NAMES = {BULL: 'BULL_TREND', BEAR: 'BEAR_TREND', RANGE: 'RANGE'}
+
+# Вероятности перехода при смене режима (из строки в столбец)
+DEFAULT_TRANSITIONS = np.array([
+    [0.0, 0.3, 0.7],
+    [0.3, 0.0, 0.7],
+    [0.5, 0.5, 0.0],
+])
+
+# Годовые параметры, пересчитываются на длину свечи
+DEFAULT_PARAMS = {
+    'annual_drift': 1.5,        # снос в тренде (лог-доходность за год)
+    'annual_volatility': 0.8,   # базовая волатильность
+    'range_reversion': 0.97,    # коэффициент AR(1) отклонения в боковике (за 4h)
+    'mean_regime_days': 30,     # средняя длительность режима
+    'vol_persistence': 0.98,    # коэффициент AR(1) лог-волатильности (за 4h)
+    'vol_of_vol': 0.35,         # стационарное СКО лог-волатильности
+    'base_volume': 1e6,
+    'volume_spike_prob': 0.01,
+    'volume_spike_scale': (3.0, 10.0),
+}
+
+YEAR_SECONDS = 365 * 86400
+REFERENCE_SECONDS = 4 * 3600
+
+
+def _symbol_rng(seed: Optional[int], symbol: str) -> np.random.Generator:
+    """Генератор пары не зависит от того, какие ещё пары генерируются"""
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([seed, zlib.crc32(symbol.encode())])
+
+
+def _rescale_persistence(phi: float, bar_seconds: int) -> float:
+    """Коэффициент AR(1), заданный для 4h, на другой длине свечи"""
+    return phi ** (bar_seconds / REFERENCE_SECONDS)
+
+
+def ar1(eps: np.ndarray, phi: float, x0: float = 0.0) -> np.ndarray:
+    """
+    x[t] = phi * x[t-1] + eps[t] без цикла по барам
+
+    Внутри блока x[j] = phi^j * (cumsum(eps[k] * phi^-k) + phi * x0),
+    длина блока ограничена так, чтобы phi^-k не терял точность.
+    """
+    n = len(eps)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    if phi <= 0:
+        out[:] = eps
+        return out
+
+    block = n if phi >= 1 else int(min(n, max(1, 30 / -np.log(phi))))
+    powers = phi ** np.arange(block)
+    inverse = 1 / powers
+    carry = x0
+
+    for start in range(0, n, block):
+        chunk = eps[start:start + block]
+        m = len(chunk)
+        values = powers[:m] * (np.cumsum(chunk * inverse[:m]) + phi * carry)
+        out[start:start + m] = values
+        carry = values[-1]
+
+    return out
+
+
+def regime_path(n_bars: int, mean_duration: float, rng: np.random.Generator,
+                transitions: np.ndarray = DEFAULT_TRANSITIONS) -> np.ndarray:
+    """Последовательность режимов: геометрические длительности + цепь Маркова"""
+    segments = []
+    total = 0
+    state = int(rng.integers(0, len(transitions)))
+    cumulative = np.cumsum(transitions, axis=1)
+
+    # Длительности тянем пачкой, цикл - только по сегментам (их мало)
+    batch = max(16, int(n_bars / mean_duration * 1.5))
+    while total < n_bars:
+        durations = rng.geometric(1 / mean_duration, size=batch)
+        draws = rng.random(batch)
+        for duration, draw in zip(durations, draws):
+            segments.append((state, duration))
+            total += duration
+            if total >= n_bars:
+                break
+            state = int(np.searchsorted(cumulative[state], draw, side='right'))
+
+    states, durations = zip(*segments)
+    return np.repeat(np.asarray(states, dtype=np.int8), durations)[:n_bars]
+
+
+def generate_ohlcv(
+    n_bars: int,
+    timeframe: str = '4h',
+    start: str = '2024-01-01',
+    start_price: float = 100.0,
+    seed: Optional[int] = None,
+    symbol: str = 'SYN/USDT',
+    gap_prob: float = 0.0,
+    missing_prob: float = 0.0,
+    with_regimes: bool = False,
+    **params
+) -> pd.DataFrame:
+    """
+    Синтетические свечи одной пары
+
+    Args:
+        n_bars: Количество свечей
+        timeframe: Длина свечи ('1m', '4h', '1d', ...)
+        start: Время первой свечи
+        start_price: Начальная цена
+        seed: Seed (None - случайные данные)
+        symbol: Имя пары (участвует в seed)
+        gap_prob: Вероятность ценового гэпа между свечами
+        missing_prob: Вероятность пропуска свечи (дыра в timestamp)
+        with_regimes: Добавить колонку regime с истинным режимом
+        **params: Переопределение DEFAULT_PARAMS
+
+    Returns:
+        DataFrame с колонками timestamp, open, high, low, close, volume (+ regime)
+    """
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры: {sorted(unknown)}")
+    p = {**DEFAULT_PARAMS, **params}
+
+    rng = _symbol_rng(seed, symbol)
+    bar_seconds = timeframe_to_seconds(timeframe)
+    scale = bar_seconds / YEAR_SECONDS
+
+    drift = p['annual_drift'] * scale
+    sigma = p['annual_volatility'] * np.sqrt(scale)
+    mean_duration = max(2.0, p['mean_regime_days'] * 86400 / bar_seconds)
+
+    regimes = regime_path(n_bars, mean_duration, rng)
+
+    # Кластеризация волатильности: стационарный AR(1) с СКО vol_of_vol
+    phi_vol = _rescale_persistence(p['vol_persistence'], bar_seconds)
+    vol_noise = rng.standard_normal(n_bars) * p['vol_of_vol'] * np.sqrt(1 - phi_vol ** 2)
+    log_vol = ar1(vol_noise, phi_vol, x0=rng.standard_normal() * p['vol_of_vol'])
+    bar_sigma = sigma * np.exp(log_vol - p['vol_of_vol'] ** 2 / 2)
+
+    shocks = rng.standard_normal(n_bars) * bar_sigma
+
+    # Тренд: снос + шум; боковик: приращения отклонения AR(1) от уровня
+    is_range = regimes == RANGE
+    phi_range = _rescale_persistence(p['range_reversion'], bar_seconds)
+    deviation = ar1(np.where(is_range, shocks, 0.0), phi_range)
+    range_steps = np.diff(deviation, prepend=0.0)
+
+    log_returns = np.where(is_range, range_steps, shocks)
+    log_returns += np.select([regimes == BULL, regimes == BEAR], [drift, -drift], 0.0)
+
+    # Гэп - скачок между закрытием прошлой свечи и открытием текущей
+    gaps = np.zeros(n_bars)
+    if gap_prob > 0:
+        gap_mask = rng.random(n_bars) < gap_prob
+        gaps[gap_mask] = rng.standard_normal(gap_mask.sum()) * bar_sigma[gap_mask] * 5
+        gaps[0] = 0.0
+
+    log_close = np.log(start_price) + np.cumsum(log_returns + gaps)
+    close = np.exp(log_close)
+    open_ = np.exp(log_close - log_returns)
+    open_[0] = start_price
+
+    # Тени: экспонента с масштабом волатильности свечи
+    wick_up = rng.exponential(0.5, n_bars) * bar_sigma
+    wick_down = rng.exponential(0.5, n_bars) * bar_sigma
+    high = np.maximum(open_, close) * np.exp(wick_up)
+    low = np.minimum(open_, close) * np.exp(-wick_down)
+
+    # Объём: лог-нормальный шум, растёт с размером свечи, редкие всплески
+    volume_scale = p['base_volume'] * np.sqrt(bar_seconds / REFERENCE_SECONDS)
+    body = np.abs(log_returns) / np.maximum(bar_sigma, 1e-12)
+    volume = volume_scale * np.exp(rng.standard_normal(n_bars) * 0.4) * (0.5 + body)
+    if p['volume_spike_prob'] > 0:
+        spikes = rng.random(n_bars) < p['volume_spike_prob']
+        low_mult, high_mult = p['volume_spike_scale']
+        volume[spikes] *= rng.uniform(low_mult, high_mult, spikes.sum())
+
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(np.arange(n_bars) * bar_seconds, unit='s')
+
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
+    if with_regimes:
+        df['regime'] = pd.Categorical.from_codes(regimes, categories=[REGIME_NAMES[k] for k in sorted(REGIME_NAMES)])
+
+    if missing_prob > 0:
+        keep = rng.random(n_bars) >= missing_prob
+        keep[0] = True
+        df = df[keep].reset_index(drop=True)
+
+    return df
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    Сборка старшего таймфрейма из младшего (векторно, через reduceat)
+
+    Свечи группируются по границам таймфрейма от эпохи, как на бирже.
+    """
+    bar_ns = timeframe_to_seconds(timeframe) * 10 ** 9
+    ts = df['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    buckets = ts // bar_ns
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+    high = np.maximum.reduceat(df['high'].to_numpy(), starts)
+    low = np.minimum.reduceat(df['low'].to_numpy(), starts)
+    volume = np.add.reduceat(df['volume'].to_numpy(), starts)
+    ends = np.r_[starts[1:], len(df)] - 1
+
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(buckets[starts] * bar_ns),
+        'open': df['open'].to_numpy()[starts],
+        'high': high,
+        'low': low,
+        'close': df['close'].to_numpy()[ends],
+        'volume': volume,
+    })
+
+
+def generate_market(
+    symbols: Iterable[str],
+    timeframes: Iterable[str] = ('4h', '12h', '1d'),
+    days: int = 365,
+    start: str = '2024-01-01',
+    seed: Optional[int] = 42,
+    **kwargs
+) -> Dict[Tuple[str, str], pd.DataFrame]:
+    """
+    Архив для многих пар и таймфреймов
+
+    Каждая пара генерируется на младшем таймфрейме, остальные собираются
+    из него. Формат результата совпадает с архивом для bot_replay.
+
+    Returns:
+        {(symbol, timeframe): OHLCV DataFrame}
+    """
+    timeframes = sorted(set(timeframes), key=timeframe_to_seconds)
+    base = timeframes[0]
+    n_bars = int(days * 86400 // timeframe_to_seconds(base))
+
+    market = {}
+    for symbol in symbols:
+        # Разные пары - разный масштаб цены
+        start_price = float(10 ** _symbol_rng(seed, symbol + '#price').uniform(-1, 4.5))
+        base_df = generate_ohlcv(n_bars, base, start, start_price, seed, symbol, **kwargs)
+        market[(symbol, base)] = base_df.drop(columns='regime', errors='ignore')
+        for timeframe in timeframes[1:]:
+            market[(symbol, timeframe)] = resample_ohlcv(base_df, timeframe)
+
+    return market
+
+
+# Пример использования
+if __name__ == "__main__":
+    import time
+
+    for n_bars in (100_000, 1_000_000, 5_000_000):
+        started = time.perf_counter()
+        df = generate_ohlcv(n_bars, '1m', seed=1)
+        elapsed = time.perf_counter() - started
+        print(f"⚡ {n_bars:>9,} свечей 1m за {elapsed:.3f}с ({n_bars / elapsed / 1e6:.1f}M свечей/с)")
+
+    df = generate_ohlcv(365 * 6, '4h', seed=7, with_regimes=True, gap_prob=0.005)
+    print(f"\n📊 Год 4h: {df['close'].iloc[0]:.2f} → {df['close'].iloc[-1]:.2f}")
+    print(df['regime'].value_counts().to_string())
+
+    market = generate_market(['SOL/USDT', 'BTC/USDT', 'ETH/USDT'], days=180, seed=42)
+    for (symbol, timeframe), frame in market.items():
+        print(f"{symbol:<10} {timeframe:>4}: {len(frame)} свечей, последняя цена {frame['close'].iloc[-1]:.4f}")
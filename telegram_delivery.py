@@ -0,0 +1,472 @@
+"""
+Telegram Delivery - Фоновая отправка сообщений в Telegram
+
+send_telegram делал блокирующий requests.post (таймауты 10-15 с) прямо в
+основном цикле, без переиспользования соединений: check_signal ждал,
+пока загрузится картинка. Здесь:
+- submit() кладёт сообщение в ограниченную очередь и сразу возвращается
+- поток-планировщик раздаёт готовые сообщения пулу из workers потоков,
+  которые отправляют через постоянную requests.Session
+- лимиты Telegram: не чаще одного сообщения в чат за per_chat_interval
+  (и не больше одного запроса в чат одновременно - порядок сохраняется)
+  и не больше global_rate в секунду на бота; накопившиеся текстовые
+  сообщения одного чата склеиваются в одно (до 4096 символов)
+- submit_many() - одно сообщение (и картинка) многим чатам сразу
+- on_done(sent) - вызывается в потоке отправки, когда сообщение доставлено
+  или потеряно после повторов - по нему считается задержка сигналов
+- 429 - ждём retry_after из ответа, 5xx и сетевые ошибки - повтор с
+  экспоненциальной задержкой, ошибка разметки - повтор без Markdown
+- metrics(): глубина очереди, отправлено, повторы, потери, задержки
+
+api_base настраивается, поэтому поток проверяется на локальном HTTP
+сервере вместо api.telegram.org (см. пример внизу).
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import metrics
+from lazy_imports import lazy_module
+
+# requests - при первой отправке, прогонам по истории и бэктестам он не нужен
+requests = lazy_module('requests')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE = 'https://api.telegram.org'
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+BATCH_SEPARATOR = '\n\n'
+
+TELEGRAM_REQUEST_SECONDS = metrics.histogram('signal_bot_telegram_request_seconds',
+                                             'Время HTTP-запроса к Bot API', ['method', 'status'],
+                                             buckets=metrics.NETWORK_BUCKETS)
+TELEGRAM_DELIVERY_SECONDS = metrics.histogram('signal_bot_telegram_delivery_seconds',
+                                              'От постановки в очередь до доставки',
+                                              buckets=metrics.NETWORK_BUCKETS + (60.0, 300.0))
+TELEGRAM_MESSAGES = metrics.counter('signal_bot_telegram_messages', 'Сообщения по итогу', ['result'])
+_messages_sent = TELEGRAM_MESSAGES.labels('sent')
+_messages_failed = TELEGRAM_MESSAGES.labels('failed')
+_messages_retried = TELEGRAM_MESSAGES.labels('retry')
+
+
+class Delivery:
+    """Сообщение в очереди"""
+
+    __slots__ = ('chat_id', 'text', 'image', 'enqueued', 'attempts', 'parts', 'callbacks')
+
+    def __init__(self, chat_id: str, text: str, image: Optional[bytes] = None,
+                 on_done: Optional[Callable[[bool], None]] = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.image = image
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+        self.parts = 1
+        # on_done всех склеенных в этот запрос сообщений
+        self.callbacks: Optional[List[Callable[[bool], None]]] = [on_done] if on_done else None
+
+
+class TelegramDelivery:
+    """Очередь и фоновая отправка в Telegram Bot API"""
+
+    def __init__(
+        self,
+        token: str,
+        chat_id: Optional[str] = None,
+        api_base: str = DEFAULT_API_BASE,
+        max_queue: int = 500,
+        per_chat_interval: float = 1.0,
+        global_rate: float = 30.0,
+        workers: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: tuple = (5, 15),
+        session: Optional['requests.Session'] = None,
+        start: bool = True
+    ):
+        """
+        Args:
+            token: Токен бота
+            chat_id: Чат по умолчанию для submit()
+            api_base: Адрес Bot API (локальный сервер в тестах)
+            max_queue: Сколько сообщений может ждать отправки; сверх - теряются
+            per_chat_interval: Минимальный интервал между сообщениями в один чат
+            global_rate: Максимум запросов в секунду на бота
+            workers: Сколько запросов может идти одновременно (в разные чаты)
+            max_retries: Повторов после первой попытки
+            backoff_base: Начальная задержка повтора в секундах (удваивается)
+            backoff_max: Предел задержки повтора
+            timeout: (connect, read) таймауты запроса
+            session: Своя requests.Session
+            start: Сразу запустить поток
+        """
+        self.token = token
+        self.chat_id = chat_id
+        self.api_base = api_base.rstrip('/')
+        self.max_queue = max_queue
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+        # Всё состояние ниже - под self._cond
+        self._cond = threading.Condition()
+        self._chats: Dict[str, deque] = defaultdict(deque)
+        # (когда можно отправлять, порядковый номер, чат) - чаты с сообщениями
+        self._ready_heap = []
+        self._scheduled = set()
+        self._inflight = set()
+        self._next_chat_send: Dict[str, float] = defaultdict(float)
+        self._next_global_send = 0.0
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._stop = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self._metrics = {
+            'submitted': 0,
+            'sent': 0,
+            'requests': 0,
+            'batched': 0,
+            'retries': 0,
+            'failed': 0,
+            'dropped': 0,
+            'rate_limited': 0,
+            'max_queue_depth': 0,
+        }
+        self._latencies = deque(maxlen=200)
+        self.last_error: Optional[str] = None
+
+        self._thread = None
+        self._executor = None
+        if start:
+            self.start()
+
+    # === ПОСТАНОВКА В ОЧЕРЕДЬ ===
+    def submit(self, text: str, image=None, chat_id: Optional[str] = None,
+               on_done: Optional[Callable[[bool], None]] = None) -> bool:
+        """
+        Поставить сообщение в очередь, не дожидаясь сети
+
+        Args:
+            image: bytes или BytesIO с картинкой (отправится sendPhoto)
+            on_done: Функция(sent) после итога отправки (в потоке отправки)
+
+        Returns:
+            False, если очередь переполнена и сообщение потеряно
+        """
+        return self.submit_many([chat_id or self.chat_id], text, image, on_done) == 1
+
+    def submit_many(self, chat_ids: Iterable[str], text: str, image=None,
+                    on_done: Optional[Callable[[bool], None]] = None) -> int:
+        """
+        Одно сообщение нескольким чатам: картинка переводится в bytes один
+        раз и общая для всех отправок; on_done вызывается для каждого чата
+
+        Returns:
+            Сколько сообщений принято в очередь
+        """
+        if image is not None and hasattr(image, 'getvalue'):
+            image = image.getvalue()
+
+        accepted = dropped = 0
+        with self._cond:
+            for chat_id in chat_ids:
+                if self._queued >= self.max_queue:
+                    dropped += 1
+                    continue
+                self._chats[chat_id].append(Delivery(chat_id, text, image, on_done))
+                self._queued += 1
+                accepted += 1
+                self._schedule(chat_id)
+            self._metrics['submitted'] += accepted
+            self._metrics['dropped'] += dropped
+            self._metrics['max_queue_depth'] = max(self._metrics['max_queue_depth'], self._queued)
+            if accepted:
+                self._idle.clear()
+                self._cond.notify()
+
+        if dropped:
+            logger.warning(f"Telegram queue full, {dropped} messages dropped")
+        return accepted
+
+    # === ПЛАНИРОВЩИК ===
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='telegram-send')
+            self._thread = threading.Thread(target=self._run, name='telegram-delivery', daemon=True)
+            self._thread.start()
+
+    def _schedule(self, chat_id: str):
+        """Чат с сообщениями и без запроса в полёте - в кучу готовности"""
+        if chat_id in self._inflight or chat_id in self._scheduled or not self._chats[chat_id]:
+            return
+        heapq.heappush(self._ready_heap, (self._next_chat_send[chat_id], next(self._sequence), chat_id))
+        self._scheduled.add(chat_id)
+
+    def _run(self):
+        with self._cond:
+            while not self._stop:
+                if not self._ready_heap:
+                    self._cond.wait(0.5)
+                    continue
+
+                now = time.monotonic()
+                ready_at = max(self._ready_heap[0][0], self._next_global_send)
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+
+                _, _, chat_id = heapq.heappop(self._ready_heap)
+                self._scheduled.discard(chat_id)
+                item = self._take(chat_id)
+                self._inflight.add(chat_id)
+                self._next_chat_send[chat_id] = now + self.per_chat_interval
+                self._next_global_send = now + self.global_interval
+                self._executor.submit(self._deliver, item)
+
+    def _take(self, chat_id: str) -> Delivery:
+        """Первое сообщение чата, склеенное со следующими текстовыми"""
+        pending = self._chats[chat_id]
+        item = pending.popleft()
+        if item.image is not None or item.attempts:
+            return item
+
+        texts = [item.text]
+        length = len(item.text)
+        while pending:
+            other = pending[0]
+            if (other.image is not None or other.attempts
+                    or length + len(BATCH_SEPARATOR) + len(other.text) > MAX_MESSAGE_LENGTH):
+                break
+            pending.popleft()
+            texts.append(other.text)
+            length += len(BATCH_SEPARATOR) + len(other.text)
+            item.parts += other.parts
+            if other.callbacks:
+                item.callbacks = (item.callbacks or []) + other.callbacks
+        if len(texts) > 1:
+            item.text = BATCH_SEPARATOR.join(texts)
+            self._metrics['batched'] += len(texts) - 1
+        return item
+
+    # === ОТПРАВКА (потоки пула) ===
+    def _deliver(self, item: Delivery):
+        item.attempts += 1
+        method = 'sendMessage' if item.image is None else 'sendPhoto'
+        started = time.perf_counter()
+        try:
+            response = self._post(item, markdown=item.attempts <= self.max_retries)
+            TELEGRAM_REQUEST_SECONDS.labels(method, response.status_code).observe(time.perf_counter() - started)
+        except requests.RequestException as e:
+            TELEGRAM_REQUEST_SECONDS.labels(method, 'error').observe(time.perf_counter() - started)
+            self._finish(item, retry=(f"{type(e).__name__}: {e}", None), responded=False)
+            return
+        except Exception as e:
+            self._finish(item, error=f"{type(e).__name__}: {e}", responded=False)
+            return
+
+        if response.status_code == 200:
+            self._finish(item)
+            return
+
+        description, retry_after = self._error_details(response)
+        if response.status_code == 429:
+            self._finish(item, retry=(description, retry_after or self.per_chat_interval), rate_limited=True)
+        elif response.status_code >= 500:
+            self._finish(item, retry=(description, None))
+        elif response.status_code == 400 and "parse entities" in description and item.attempts <= self.max_retries:
+            # Markdown не разобрался - последняя попытка уйдёт обычным текстом
+            item.attempts = self.max_retries
+            self._finish(item, retry=(description, 0.0))
+        else:
+            self._finish(item, error=f"{response.status_code}: {description}")
+
+    def _post(self, item: Delivery, markdown: bool) -> 'requests.Response':
+        url = f"{self.api_base}/bot{self.token}"
+        data = {'chat_id': item.chat_id}
+        if markdown:
+            data['parse_mode'] = 'Markdown'
+        if item.image is None:
+            data['text'] = item.text
+            return self.session.post(f"{url}/sendMessage", data=data, timeout=self.timeout)
+        data['caption'] = item.text
+        return self.session.post(f"{url}/sendPhoto", data=data, files={'photo': item.image},
+                                 timeout=self.timeout)
+
+    @staticmethod
+    def _error_details(response: 'requests.Response'):
+        try:
+            payload = response.json()
+        except ValueError:
+            return response.text[:200], None
+        retry_after = (payload.get('parameters') or {}).get('retry_after')
+        return str(payload.get('description', ''))[:200], retry_after
+
+    def _finish(self, item: Delivery, retry: Optional[tuple] = None, error: Optional[str] = None,
+                rate_limited: bool = False, responded: bool = True):
+        """Итог запроса: отправлено, повтор (описание, задержка) или ошибка"""
+        if retry is not None and item.attempts > self.max_retries:
+            error, retry = retry[0], None
+
+        with self._cond:
+            now = time.monotonic()
+            chat_id = item.chat_id
+            if responded:
+                self._metrics['requests'] += 1
+            if rate_limited:
+                self._metrics['rate_limited'] += 1
+
+            if retry is not None:
+                description, delay = retry
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** (item.attempts - 1))
+                    delay *= random.uniform(0.8, 1.2)
+                self._metrics['retries'] += 1
+                _messages_retried.inc()
+                # Повтор идёт первым, остальные сообщения чата ждут вместе с ним
+                self._chats[chat_id].appendleft(item)
+                self._next_chat_send[chat_id] = max(self._next_chat_send[chat_id], now + delay)
+                logger.warning(f"Telegram delivery retry {item.attempts}/{self.max_retries} "
+                               f"in {delay:.1f}s: {description}")
+            else:
+                self._queued -= item.parts
+                if error is None:
+                    self._metrics['sent'] += item.parts
+                    self._latencies.append(now - item.enqueued)
+                    _messages_sent.inc(item.parts)
+                    TELEGRAM_DELIVERY_SECONDS.observe(now - item.enqueued)
+                else:
+                    self._metrics['failed'] += item.parts
+                    _messages_failed.inc(item.parts)
+                    self.last_error = error
+                    logger.error(f"Telegram delivery failed after {item.attempts} attempts: {error}")
+
+            self._inflight.discard(chat_id)
+            self._schedule(chat_id)
+            if self._queued == 0:
+                self._idle.set()
+            self._cond.notify()
+
+        if retry is None and item.callbacks:
+            for callback in item.callbacks:
+                try:
+                    callback(error is None)
+                except Exception as e:
+                    logger.error(f"Telegram on_done callback failed: {e}")
+
+    # === МЕТРИКИ И ОСТАНОВКА ===
+    def queue_depth(self) -> int:
+        """Сообщений, ещё не отправленных (в очереди, на повторе и в полёте)"""
+        return self._queued
+
+    def inflight(self) -> int:
+        """Чатов с запросом в полёте"""
+        return len(self._inflight)
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            latencies = sorted(self._latencies)
+            result = dict(self._metrics)
+            result['queue_depth'] = self._queued
+            result['inflight'] = len(self._inflight)
+        result['latency_avg'] = sum(latencies) / len(latencies) if latencies else 0.0
+        result['latency_max'] = latencies[-1] if latencies else 0.0
+        result['last_error'] = self.last_error
+        return result
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться отправки всего, что в очереди (True - очередь пуста)"""
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Доотправить очередь (не дольше timeout) и остановить потоки"""
+        self.flush(timeout)
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+
+# Пример использования
+if __name__ == "__main__":
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class FakeBotAPI(BaseHTTPRequestHandler):
+        """Локальная замена api.telegram.org: ответ за 50 мс, каждый rate_limit_every-й - 429"""
+        requests_seen = 0
+        rate_limit_every = 5
+        lock = threading.Lock()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(0.05)
+            with FakeBotAPI.lock:
+                FakeBotAPI.requests_seen += 1
+                seen = FakeBotAPI.requests_seen
+            if FakeBotAPI.rate_limit_every and seen % FakeBotAPI.rate_limit_every == 0:
+                body = {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                        'parameters': {'retry_after': 0.2}}
+                self.send_response(429)
+            else:
+                body = {'ok': True, 'result': {}}
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode())
+
+        def log_message(self, *args):
+            pass
+
+    class FakeServer(ThreadingHTTPServer):
+        request_queue_size = 128
+
+    server = FakeServer(('127.0.0.1', 0), FakeBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    api_base = f"http://127.0.0.1:{server.server_port}"
+
+    # Пачка сообщений в один чат склеивается
+    delivery = TelegramDelivery('TEST', '1', api_base=api_base, per_chat_interval=0.05)
+    for n in range(50):
+        delivery.submit(f"Сообщение {n}")
+    delivery.submit("С картинкой", image=b'\x89PNG')
+    delivery.flush(timeout=30)
+    print(f"📨 Один чат: {delivery.metrics()}")
+    delivery.close()
+
+    # Одна картинка 300 чатам параллельно (лимит рассылки как у платных рассылок)
+    FakeBotAPI.rate_limit_every = 0
+    delivery = TelegramDelivery('TEST', api_base=api_base, global_rate=1000, workers=64)
+    started = time.perf_counter()
+    delivery.submit_many([str(chat) for chat in range(300)], "Сигнал", image=b'\x89PNG' * 1000)
+    delivery.flush(timeout=60)
+    elapsed = time.perf_counter() - started
+    print(f"⚡ 300 чатов за {elapsed:.2f}с: {delivery.metrics()}")
+    delivery.close()
+    server.shutdown()
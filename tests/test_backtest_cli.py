@@ -0,0 +1,75 @@
+"""
+Запуск backtest_bot как программы на заглушке биржи
+
+Биржа в backtest_bot создаётся лениво (get_exchange), поэтому точка входа
+проверяется целиком: python backtest_bot.py с OKX, подменённой на
+StubExchange с синтетическими свечами.
+"""
+
+import runpy
+import sys
+import time
+
+import ccxt
+
+from stub_exchange import stub_from_synthetic
+
+
+def test_cli_runs_against_stub_exchange(tmp_path, monkeypatch, capsys):
+    import backtest_bot
+
+    # Импорт модуля не должен создавать биржу
+    assert backtest_bot.exchange is None
+
+    stub = stub_from_synthetic(['SOL/USDT', 'BTC/USDT', 'ETH/USDT'],
+                               timeframes=('4h', '6h', '8h', '12h', '1d'), days=400, seed=7)
+    monkeypatch.setattr(ccxt, 'okx', lambda config: stub)
+    # Паузы между запросами к бирже не нужны; кэш и графики - во временной папке
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['backtest_bot.py'])
+
+    runpy.run_module('backtest_bot', run_name='__main__', alter_sys=True)
+
+    out = capsys.readouterr().out
+    assert 'Критическая ошибка' not in out
+    assert '❌ Ошибка' not in out
+    assert 'ИТОГОВАЯ СВОДКА' in out
+    assert 'ТЕСТИРОВАНИЕ ЗАВЕРШЕНО' in out
+    assert stub.stats['load_markets.requests'] == 1
+    assert stub.stats['fetch_ohlcv.requests'] > 0
+
+
+def test_cached_rerun_reports_like_fresh_run(tmp_path, monkeypatch, capsys):
+    import backtest_bot
+
+    stub = stub_from_synthetic(['SOL/USDT', 'BTC/USDT', 'ETH/USDT'],
+                               timeframes=('4h', '6h', '8h', '12h', '1d'), days=200, seed=7)
+    monkeypatch.setattr(backtest_bot, 'exchange', stub)
+    monkeypatch.setattr(backtest_bot, 'MONTE_CARLO_SIMULATIONS', 200)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    monkeypatch.chdir(tmp_path)
+
+    # Графики рисуются в процессах - считаем постановку в очередь
+    charts = []
+    add = backtest_bot.RenderQueue.add
+
+    def counted_add(self, df, trades_df, *names):
+        if add(self, df, trades_df, *names):
+            charts.append(names)
+
+    monkeypatch.setattr(backtest_bot.RenderQueue, 'add', counted_add)
+
+    def run():
+        charts.clear()
+        backtest_bot.main()
+        out = capsys.readouterr().out
+        return out.count('🎲 MONTE CARLO'), sorted(charts), out.count('результат из кэша')
+
+    fresh = run()
+    cached = run()
+    assert fresh[0] > 0 and fresh[1] and fresh[2] == 0
+    assert cached[:2] == fresh[:2]
+    assert cached[2] == 7
+    # Рисуются только выбранные прогоны
+    assert set(fresh[1]) <= set(backtest_bot.RENDER_CHARTS)
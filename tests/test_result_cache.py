@@ -0,0 +1,57 @@
+"""
+Кэш свечей ResultCache.ohlcv: сохраняется только полный диапазон
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from result_cache import DAY_MS, ResultCache, pinned_range
+
+HOUR_MS = 3600 * 1000
+
+
+def make_candles(start_ms, end_ms, step_ms=4 * HOUR_MS):
+    stamps = np.arange(start_ms, end_ms, step_ms)
+    close = np.linspace(100, 110, len(stamps))
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(stamps, unit='ms'),
+        'open': close, 'high': close + 1, 'low': close - 1, 'close': close, 'volume': 1.0,
+    })
+
+
+def cached_files(cache):
+    return os.listdir(os.path.join(cache.cache_dir, 'ohlcv'))
+
+
+def test_full_range_is_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    start_ms, end_ms = pinned_range(4 * 3600, 10, 1_700_000_000_000)
+    full = make_candles(start_ms, end_ms)
+
+    first = cache.ohlcv('SOL/USDT', '4h', start_ms, end_ms, lambda: full)
+    second = cache.ohlcv('SOL/USDT', '4h', start_ms, end_ms, lambda: make_candles(0, 0))
+
+    assert len(first) == 10 * 6
+    pd.testing.assert_frame_equal(first, second)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_empty_or_partial_fetch_is_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    start_ms, end_ms = pinned_range(4 * 3600, 10, 1_700_000_000_000)
+
+    fetches = [
+        make_candles(0, 0),                                # пустой ответ
+        make_candles(start_ms, end_ms - DAY_MS),           # оборвался до конца
+        make_candles(start_ms + DAY_MS, end_ms),           # начало не догружено
+    ]
+    for candles in fetches:
+        df = cache.ohlcv('SOL/USDT', '4h', start_ms, end_ms, lambda: candles)
+        assert len(df) == len(candles)
+    assert cached_files(cache) == []
+
+    full = cache.ohlcv('SOL/USDT', '4h', start_ms, end_ms, lambda: make_candles(start_ms, end_ms))
+    assert len(full) == 10 * 6
+    assert len(cached_files(cache)) == 1
@@ -0,0 +1,13 @@
+"""
+Timeframes - Длительность таймфреймов ccxt ('15m', '4h', '1d', '1w')
+
+Один помощник для бота, бэктестов, реплея и заглушки биржи: модуль без
+зависимостей, его импортируют и живой бот, и офлайн-инструменты.
+"""
+
+TIMEFRAME_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def timeframe_to_seconds(timeframe: str) -> int:
+    """'4h' -> 14400"""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1]]
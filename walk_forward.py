@@ -0,0 +1,249 @@
+"""
+Walk-Forward Optimization - Оптимизация со скользящими окнами
+
+Вместо подбора параметров на той же выборке, на которой считается результат,
+история делится на последовательные пары окон обучение → тест:
+- rolling: окно обучения фиксированной длины сдвигается вперёд
+- anchored: начало окна обучения закреплено, окно растёт
+
+На каждом окне обучения перебирается сетка параметров движка бэктеста,
+лучшие параметры оцениваются на следующем (невиданном) тестовом окне.
+"""
+
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest_bot import simulate_trades, calculate_stats, INITIAL_BALANCE
+
+logger = logging.getLogger(__name__)
+
+# Сетка по умолчанию - та же, что перебирает optimize_strategy
+DEFAULT_PARAM_GRID = {
+    'min_risk_reward': [1.5, 2.0, 2.5, 3.0],
+}
+
+# Колонки, которые нужны движку бэктеста
+ENGINE_COLUMNS = ['timestamp', 'close', 'signal', 'sl_distance', 'tp_distance']
+
+# Кадр с сигналами, разделяемый между окнами внутри процесса-воркера
+_worker_frame: Optional[pd.DataFrame] = None
+
+
+def generate_windows(
+    n_bars: int,
+    train_bars: int,
+    test_bars: int,
+    anchored: bool = False,
+    step: Optional[int] = None
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Разбивает историю на окна обучения/теста
+
+    Args:
+        n_bars: Количество свечей в истории
+        train_bars: Длина окна обучения
+        test_bars: Длина тестового окна
+        anchored: True - окно обучения всегда начинается с первой свечи
+        step: Сдвиг между окнами (по умолчанию = test_bars, тесты не пересекаются)
+
+    Returns:
+        Список (train_start, train_end, test_start, test_end), концы не включаются
+    """
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("train_bars и test_bars должны быть положительными")
+
+    step = step or test_bars
+    windows = []
+    train_end = train_bars
+
+    while train_end + test_bars <= n_bars:
+        train_start = 0 if anchored else train_end - train_bars
+        windows.append((train_start, train_end, train_end, train_end + test_bars))
+        train_end += step
+
+    return windows
+
+
+def expand_param_grid(param_grid: Dict[str, list]) -> List[Dict]:
+    """Разворачивает сетку {параметр: [значения]} в список комбинаций"""
+    keys = sorted(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def _run(frame: pd.DataFrame, params: Dict) -> Dict:
+    """Тихий прогон движка бэктеста на срезе"""
+    trades, balance = simulate_trades(frame, **params)
+    if not trades:
+        return {'total': 0, 'wr': 0, 'roi': 0, 'pf': 0, 'max_dd': 0, 'final': balance}
+
+    stats = calculate_stats(pd.DataFrame(trades), balance)
+    return {key: stats[key] for key in ('total', 'wr', 'roi', 'pf', 'max_dd', 'final')}
+
+
+def _evaluate_window(frame: pd.DataFrame, window: Tuple[int, int, int, int],
+                     combos: List[Dict], min_trades: int) -> Dict:
+    """Оптимизация на окне обучения и проверка на тестовом окне"""
+    train_start, train_end, test_start, test_end = window
+    train = frame.iloc[train_start:train_end]
+    test = frame.iloc[test_start:test_end]
+
+    best_params, best_train = None, None
+    fallback_params, fallback_train = None, None
+
+    for params in combos:
+        result = _run(train, params)
+        if fallback_train is None or result['roi'] > fallback_train['roi']:
+            fallback_params, fallback_train = params, result
+        if result['total'] >= min_trades and (best_train is None or result['roi'] > best_train['roi']):
+            best_params, best_train = params, result
+
+    # Если ни одна комбинация не набрала достаточно сделок - берём лучшую по ROI
+    qualified = best_params is not None
+    if not qualified:
+        best_params, best_train = fallback_params, fallback_train
+
+    test_result = _run(test, best_params)
+
+    return {
+        'train_start': frame['timestamp'].iloc[train_start],
+        'train_end': frame['timestamp'].iloc[train_end - 1],
+        'test_start': frame['timestamp'].iloc[test_start],
+        'test_end': frame['timestamp'].iloc[test_end - 1],
+        'params': best_params,
+        'qualified': qualified,
+        'train_trades': best_train['total'],
+        'train_roi': best_train['roi'],
+        'test_trades': test_result['total'],
+        'test_wr': test_result['wr'],
+        'test_roi': test_result['roi'],
+        'test_pf': test_result['pf'],
+        'test_max_dd': test_result['max_dd'],
+    }
+
+
+def _init_worker(frame: pd.DataFrame):
+    """Кадр с сигналами передаётся воркеру один раз, а не с каждым окном"""
+    global _worker_frame
+    _worker_frame = frame
+
+
+def _evaluate_window_in_worker(window, combos, min_trades):
+    return _evaluate_window(_worker_frame, window, combos, min_trades)
+
+
+def walk_forward(
+    df: pd.DataFrame,
+    strategy_func,
+    train_bars: int,
+    test_bars: int,
+    anchored: bool = False,
+    param_grid: Optional[Dict[str, list]] = None,
+    min_trades: int = 5,
+    step: Optional[int] = None,
+    max_workers: Optional[int] = None
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Walk-forward оптимизация стратегии
+
+    Индикаторы и сигналы считаются один раз на всей истории: они причинные
+    (каждое значение зависит только от прошлых свечей), поэтому пересекающиеся
+    окна используют одни и те же колонки вместо пересчёта на каждом окне.
+
+    Args:
+        df: OHLCV история
+        strategy_func: Стратегия из backtest_bot (добавляет signal/sl_distance/tp_distance)
+        train_bars: Длина окна обучения в свечах
+        test_bars: Длина тестового окна в свечах
+        anchored: Закреплённое начало окна обучения
+        param_grid: Сетка параметров движка (по умолчанию DEFAULT_PARAM_GRID)
+        min_trades: Минимум сделок на обучении для выбора параметров
+        step: Сдвиг между окнами (по умолчанию test_bars)
+        max_workers: Количество процессов (1 - без пула)
+
+    Returns:
+        (DataFrame с результатами по окнам, сводка out-of-sample)
+    """
+    windows = generate_windows(len(df), train_bars, test_bars, anchored, step)
+    if not windows:
+        raise ValueError(f"История ({len(df)} свечей) короче одного окна {train_bars}+{test_bars}")
+
+    frame = strategy_func(df)[ENGINE_COLUMNS].reset_index(drop=True)
+    combos = expand_param_grid(param_grid or DEFAULT_PARAM_GRID)
+
+    if max_workers == 1 or len(windows) == 1:
+        results = [_evaluate_window(frame, w, combos, min_trades) for w in windows]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(frame,)) as pool:
+            futures = [pool.submit(_evaluate_window_in_worker, w, combos, min_trades) for w in windows]
+            results = [f.result() for f in futures]
+
+    results_df = pd.DataFrame(results)
+    return results_df, summarize_walk_forward(results_df)
+
+
+def summarize_walk_forward(results_df: pd.DataFrame) -> Dict:
+    """Сводка по всем тестовым окнам"""
+    # Тестовые окна идут подряд, поэтому доходности компаундируются
+    growth = np.prod(1 + results_df['test_roi'].to_numpy() / 100)
+    oos_roi = (growth - 1) * 100
+
+    avg_train_roi = results_df['train_roi'].mean()
+    avg_test_roi = results_df['test_roi'].mean()
+
+    return {
+        'windows': len(results_df),
+        'oos_roi': oos_roi,
+        'oos_final': INITIAL_BALANCE * growth,
+        'oos_trades': int(results_df['test_trades'].sum()),
+        'profitable_windows': int((results_df['test_roi'] > 0).sum()),
+        'avg_train_roi': avg_train_roi,
+        'avg_test_roi': avg_test_roi,
+        # Эффективность walk-forward: какая доля результата обучения сохраняется на тесте
+        'efficiency': avg_test_roi / avg_train_roi if avg_train_roi > 0 else 0,
+        'worst_test_dd': results_df['test_max_dd'].min(),
+    }
+
+
+def print_walk_forward_report(results_df: pd.DataFrame, summary: Dict, strategy_name: str,
+                              symbol: str, timeframe: str):
+    """Вывод отчёта walk-forward"""
+    print(f"\n{'='*100}")
+    print(f"🔁 WALK-FORWARD: {strategy_name} | {symbol} {timeframe}")
+    print(f"{'='*100}")
+    print(f"{'Тест':<23} | {'Параметры':<28} | {'IS ROI%':>8} | {'OOS ROI%':>9} | {'Сделок':>6} | {'DD%':>6}")
+    print("-" * 100)
+
+    for _, row in results_df.iterrows():
+        period = f"{row['test_start']:%Y-%m-%d}→{row['test_end']:%Y-%m-%d}"
+        params = ', '.join(f"{k}={v}" for k, v in row['params'].items())
+        if not row['qualified']:
+            params += ' *'
+        print(f"{period:<23} | {params:<28} | {row['train_roi']:>+8.1f} | {row['test_roi']:>+9.1f} | "
+              f"{row['test_trades']:>6} | {row['test_max_dd']:>6.1f}")
+
+    print("-" * 100)
+    print(f"💰 Out-of-sample ROI: {summary['oos_roi']:+.1f}% ({INITIAL_BALANCE:.2f} → {summary['oos_final']:.2f} USD)")
+    print(f"📊 Окон: {summary['windows']} | Прибыльных: {summary['profitable_windows']} | "
+          f"Сделок на тестах: {summary['oos_trades']}")
+    print(f"📈 Средний ROI: обучение {summary['avg_train_roi']:+.1f}% | тест {summary['avg_test_roi']:+.1f}%")
+    print(f"🎯 Эффективность WF: {summary['efficiency']:.2f}")
+    print(f"📉 Худшая просадка на тесте: {summary['worst_test_dd']:.1f}%")
+    if not results_df['qualified'].all():
+        print("* на обучении меньше минимального числа сделок, взяты параметры с лучшим ROI")
+
+
+# Пример использования
+if __name__ == "__main__":
+    from backtest_bot import fetch_historical_data, strategy_4h_turtle
+
+    df = fetch_historical_data('SOL/USDT', '4h', 365)
+
+    # ~60 дней обучения, ~30 дней теста на 4h свечах
+    results_df, summary = walk_forward(df, strategy_4h_turtle, train_bars=360, test_bars=180)
+    print_walk_forward_report(results_df, summary, '4h Aggressive Turtle', 'SOL/USDT', '4h')
@@ -0,0 +1,195 @@
+"""
+Windowed Counters - Счётчики событий по минутным корзинам
+
+HealthMonitor считал ошибки за час перебором списка с арифметикой
+datetime на каждом health check и сводке. Здесь каждое событие попадает
+в корзину своей минуты (кольцевой NumPy массив на сутки), а суммы за
+скользящие окна (час, сутки) поддерживаются инкрементально: при переходе
+часов в новую корзину из каждой суммы вычитается корзина, выпавшая из
+окна. Запрос окна - O(1), история корзин - готовый ряд для тренда.
+
+Время берётся из bot_clock, поэтому счётчики работают и в прогоне бота
+на симулированных часах. Счётчик пишут потоки конвейера - сдвиг корзин
+и суммы меняются под блокировкой.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+import bot_clock
+
+logger = logging.getLogger(__name__)
+
+# Окна по умолчанию: имя -> секунды
+DEFAULT_WINDOWS = {'hour': 3600, 'day': 86400}
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+
+class WindowedCounter:
+    """Счётчик с корзинами по bucket_seconds и суммами за скользящие окна"""
+
+    def __init__(
+        self,
+        bucket_seconds: int = 60,
+        history_buckets: int = 1440,
+        windows: Optional[Dict[str, int]] = None,
+        clock: Callable[[], float] = None
+    ):
+        """
+        Args:
+            bucket_seconds: Ширина корзины в секундах
+            history_buckets: Сколько корзин хранить (по умолчанию - сутки минут)
+            windows: {имя: секунды} - окна с O(1) запросом, не длиннее истории
+            clock: Источник времени (по умолчанию bot_clock.time)
+        """
+        windows = dict(DEFAULT_WINDOWS if windows is None else windows)
+        self.bucket_seconds = bucket_seconds
+        self.history_buckets = history_buckets
+        self.clock = clock or bot_clock.time
+
+        self._windows = {}
+        for name, seconds in windows.items():
+            length = max(1, int(seconds // bucket_seconds))
+            if length > history_buckets:
+                raise ValueError(f"Окно {name} ({seconds}с) длиннее истории "
+                                 f"{history_buckets * bucket_seconds}с")
+            self._windows[name] = length
+
+        self._counts = np.zeros(history_buckets, dtype=np.int64)
+        self._sums = {name: 0 for name in self._windows}
+        self._current: Optional[int] = None
+        self.total = 0
+        # Два одновременных _advance вычли бы одну корзину дважды - суммы окон испорчены навсегда
+        self._lock = threading.Lock()
+
+    def _bucket(self, at: Optional[float]) -> int:
+        return int((self.clock() if at is None else at) // self.bucket_seconds)
+
+    def _advance(self, bucket: int):
+        """Сдвинуть текущую корзину вперёд, вычитая выпавшие из окон"""
+        if self._current is None:
+            self._current = bucket
+            return
+        steps = bucket - self._current
+        if steps <= 0:
+            return
+
+        if steps >= self.history_buckets:
+            # Простой дольше истории - всё устарело
+            self._counts[:] = 0
+            for name in self._sums:
+                self._sums[name] = 0
+        else:
+            for new in range(self._current + 1, bucket + 1):
+                for name, length in self._windows.items():
+                    self._sums[name] -= int(self._counts[(new - length) % self.history_buckets])
+                self._counts[new % self.history_buckets] = 0
+        self._current = bucket
+
+    def add(self, amount: int = 1, at: Optional[float] = None):
+        """Учесть amount событий в момент at (по умолчанию - сейчас)"""
+        bucket = self._bucket(at)
+        with self._lock:
+            self._advance(bucket)
+            self.total += amount
+
+            age = self._current - bucket
+            if age >= self.history_buckets:
+                return  # Старше истории - только в общий счётчик
+            self._counts[bucket % self.history_buckets] += amount
+            for name, length in self._windows.items():
+                if age < length:
+                    self._sums[name] += amount
+
+    def count(self, window: str = 'hour') -> int:
+        """Событий за окно window - O(1) (плюс сдвиг корзин, если время ушло вперёд)"""
+        with self._lock:
+            self._advance(self._bucket(None))
+            return self._sums[window]
+
+    def counts(self) -> Dict[str, int]:
+        """Суммы за все окна и за всё время"""
+        with self._lock:
+            self._advance(self._bucket(None))
+            return {**self._sums, 'total': self.total}
+
+    def history(self, buckets: int = 60) -> np.ndarray:
+        """Последние buckets корзин от старых к новым (текущая - последняя)"""
+        with self._lock:
+            self._advance(self._bucket(None))
+            buckets = min(buckets, self.history_buckets)
+            end = self._current + 1
+            index = np.arange(end - buckets, end) % self.history_buckets
+            return self._counts[index].copy()
+
+    def trend(self, points: int = 12, window: str = 'hour') -> np.ndarray:
+        """Окно window, сжатое в points точек (суммы соседних корзин)"""
+        length = self._windows[window]
+        values = self.history(length)
+        step = max(1, length // points)
+        values = values[len(values) % step:]
+        return values.reshape(-1, step).sum(axis=1)
+
+
+class CounterSet:
+    """Набор именованных WindowedCounter с общими настройками"""
+
+    def __init__(self, names: Iterable[str], **kwargs):
+        self._counters = {name: WindowedCounter(**kwargs) for name in names}
+
+    def add(self, name: str, amount: int = 1, at: Optional[float] = None):
+        self._counters[name].add(amount, at)
+
+    def count(self, name: str, window: str = 'hour') -> int:
+        return self._counters[name].count(window)
+
+    def __getitem__(self, name: str) -> WindowedCounter:
+        return self._counters[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """{счётчик: {окно: сумма, 'total': всего}}"""
+        return {name: counter.counts() for name, counter in self._counters.items()}
+
+
+def sparkline(values: Iterable[float]) -> str:
+    """Ряд значений -> строка из ▁▂▃▄▅▆▇█ для сообщения в Telegram"""
+    values = list(values)
+    if not values:
+        return ''
+    top = max(values)
+    if top <= 0:
+        return SPARK_CHARS[0] * len(values)
+    last = len(SPARK_CHARS) - 1
+    return ''.join(SPARK_CHARS[min(last, int(value / top * last + 0.5))] for value in values)
+
+
+# Пример использования
+if __name__ == "__main__":
+    import random
+    import time
+    from datetime import datetime
+
+    clock = bot_clock.SimulatedClock(datetime(2024, 1, 1))
+    counters = CounterSet(['errors', 'api_calls'], clock=clock.time)
+
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(200_000):
+        clock.sleep(rng.expovariate(1 / 2.0))
+        counters.add('api_calls')
+        if rng.random() < 0.02:
+            counters.add('errors')
+    elapsed = time.perf_counter() - started
+
+    query_started = time.perf_counter()
+    for _ in range(10_000):
+        counters.count('errors', 'hour')
+    query_us = (time.perf_counter() - query_started) / 10_000 * 1e6
+
+    print(f"⚡ 200к вызовов API за {elapsed:.2f}с, запрос окна {query_us:.2f} мкс")
+    print(f"📊 {counters.snapshot()}")
+    print(f"📈 Ошибки за час: {sparkline(counters['errors'].trend(12))}")